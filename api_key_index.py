@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+import uuid
+
+
+def generate_api_key():
+    return f"sk_{uuid.uuid4().hex[:32]}"
+
+
+def hash_api_key(api_key):
+    """API key chỉ được lưu dưới dạng SHA-256 hex digest"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def mask_api_key(api_key):
+    return api_key[:8] + '...' + api_key[-4:]
+
+
+def parse_permissions(value):
+    """'all' hoặc danh sách phân tách bằng dấu phẩy -> frozenset"""
+    if not value:
+        return frozenset(['all'])
+    return frozenset(p.strip() for p in value.split(',') if p.strip())
+
+
+class APIKeyEntry:
+    __slots__ = ('id', 'name', 'permissions')
+
+    def __init__(self, id, name, permissions):
+        self.id = id
+        self.name = name
+        self.permissions = permissions
+
+    def allows(self, permission):
+        return 'all' in self.permissions or permission in self.permissions
+
+
+class APIKeyIndex:
+    """Bảng digest -> APIKeyEntry trong bộ nhớ của mỗi worker.
+
+    Bảng được nạp lại khi bộ đếm app_meta.api_keys_generation (do trigger
+    trên api_keys tăng) thay đổi. Bộ đếm chỉ được đọc tối đa mỗi
+    `check_interval` giây, hoặc khi gặp digest lạ.
+    """
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._generation = None
+        self._next_check = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def lookup(self, repo, api_key):
+        digest = hash_api_key(api_key)
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._refresh(repo, now)
+        entry = self._entries.get(digest)
+        if entry is None:
+            # Thread khác có thể đang nạp lại (đã cập nhật _checked_at): chờ xong rồi đọc lại
+            with self._lock:
+                entry = self._entries.get(digest)
+        if entry is None and now - self._checked_at > 1.0:
+            # Key vừa được tạo ở worker khác: kiểm tra lại generation (tối đa 1 lần/giây)
+            self._refresh(repo, now)
+            entry = self._entries.get(digest)
+        return entry
+
+    @property
+    def generation(self):
+        """Giá trị app_meta.api_keys_generation lần nạp gần nhất"""
+        return self._generation
+
+    def invalidate(self):
+        """Buộc kiểm tra lại ở lần lookup tiếp theo (sau khi worker này sửa api_keys)"""
+        self._next_check = 0.0
+
+    def _refresh(self, repo, now):
+        with self._lock:
+            self._checked_at = now
+            self._next_check = now + self.check_interval
+            generation = repo.api_keys_generation()
+            if generation == self._generation:
+                return
+            self._entries = {
+                r['key']: APIKeyEntry(r['id'], r['name'], parse_permissions(r['permissions']))
+                for r in repo.load_active_api_keys()
+            }
+            self._generation = generation
+            self.reloads += 1
+
+    def stats(self):
+        return {
+            'keys': len(self._entries),
+            'generation': self._generation,
+            'reloads': self.reloads
+        }
@@ -1,106 +1,175 @@
 import os
 import sqlite3
 import json
-import uuid
 import hashlib
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, g, send_file
+from datetime import datetime, timedelta, timezone
+from flask import Flask, request, jsonify, g, abort, Response, stream_with_context
 from flask_cors import CORS
 from cryptography.fernet import Fernet
 import base64
 import argon2
+import atexit
+import csv
+import io
+import time
+from config import Config
+from license_cache import LicenseCache, CachedValue
+from license_record import (
+    STATUS_ACTIVE, STATUS_EXPIRED, epoch_to_iso, license_row_dict, to_epoch, utc_iso_to_epoch
+)
+from last_check_writer import LastCheckWriter
+from audit_log import get_audit_log
+from expiry_sweeper import ExpirySweeper
+from sqlite_db import SQLiteConnections
+from repository import BULK_FILTER_FIELDS, create_repository, set_repository
+from api_key_index import APIKeyIndex, generate_api_key, hash_api_key, mask_api_key
+from login_guard import LoginGuard, LoginBusy
+from auth import generate_license_token, license_public_key_pem, license_key_id, license_signing_key
+from rate_limiter import ClientRateLimiter, create_backend, client_ip
+from data_version import create_data_version
+from compression import ETAG_SUFFIXES, compress_response
+from static_assets import StaticAssets
+import json_codec
+import metrics
 
-app = Flask(__name__, static_folder='.', static_url_path='')
+# Không dùng static_folder: chỉ các asset trong build_assets.ASSET_SOURCES được phục vụ (static_assets.py)
+app = Flask(__name__, static_folder=None)
+# jsonify / request.json dùng orjson nếu có (json_codec), không thì stdlib
+app.json = json_codec.FastJSONProvider(app)
 CORS(app)
 
 # IMPORTANT: Use environment variable or default for Render
 app.secret_key = os.environ.get('SECRET_KEY', 'your-super-secret-key-change-this-in-production-12345')
 
 # Cấu hình database
-DATABASE = 'licenses.db'
+DATABASE = Config.SQLITE_DATABASE
 
-# Khởi tạo Argon2
-argon2_hasher = argon2.PasswordHasher()
+# Mỗi worker/thread giữ một kết nối SQLite lâu dài (WAL + pragma từ Config)
+db_connections = SQLiteConnections(
+    DATABASE,
+    journal_mode=Config.SQLITE_JOURNAL_MODE,
+    synchronous=Config.SQLITE_SYNCHRONOUS,
+    mmap_size=Config.SQLITE_MMAP_SIZE,
+    cache_size=Config.SQLITE_CACHE_SIZE,
+    busy_timeout=Config.SQLITE_BUSY_TIMEOUT,
+    cached_statements=Config.SQLITE_CACHED_STATEMENTS,
+    factory=metrics.InstrumentedConnection if Config.METRICS_ENABLED else sqlite3.Connection
+)
 
-# ============== DATABASE FUNCTIONS ==============
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
-    return db
+# Mọi truy vấn đi qua repository: SQLite (db_connections ở trên) hoặc PostgreSQL
+# (psycopg_pool) khi Config.DATABASE_URL là postgres://...
+repository = create_repository(db_connections)
+set_repository(repository)
+
+# Khởi tạo Argon2 (tham số lấy từ Config)
+argon2_hasher = argon2.PasswordHasher(
+    time_cost=Config.ARGON2_TIME_COST,
+    memory_cost=Config.ARGON2_MEMORY_COST,
+    parallelism=Config.ARGON2_PARALLELISM
+)
+
+# Giới hạn số phép Argon2 đồng thời mỗi process + khóa tạm theo (IP, username) / IP khi sai nhiều lần
+login_guard = LoginGuard(
+    argon2_hasher,
+    max_concurrent=Config.LOGIN_MAX_CONCURRENT,
+    queue_timeout=Config.LOGIN_QUEUE_TIMEOUT,
+    max_failures=Config.LOGIN_MAX_FAILURES,
+    max_failures_per_ip=Config.LOGIN_MAX_FAILURES_PER_IP,
+    window=Config.LOGIN_FAILURE_WINDOW,
+    lockout=Config.LOGIN_LOCKOUT
+)
+
+
+# Cache ngắn hạn cho /api/admin/stats
+stats_cache = CachedValue(Config.STATS_CACHE_TTL)
+
+# Asset trang quản trị đã fingerprint + nén sẵn (python build_assets.py)
+static_assets = StaticAssets()
+
+# Phiên bản dữ liệu dùng chung giữa các worker: ETag cho danh sách license / API key và thống kê
+# (khi ETAG_ENABLED), và tín hiệu bỏ cache license sau thay đổi của admin ở worker khác
+data_version = create_data_version(Config.DATA_VERSION_SHM_PATH)
+etag_versions = data_version if Config.ETAG_ENABLED else None
+
+# Cache license cho /api/client/validate (mỗi worker một bản, bỏ hết khi 'license_cache' đổi)
+license_cache = LicenseCache(
+    Config.LICENSE_CACHE_SIZE, Config.LICENSE_CACHE_TTL,
+    version=(lambda: data_version.version('license_cache')) if data_version is not None else None
+)
+
+# Bảng API key (SHA-256 digest) trong bộ nhớ, nạp lại theo app_meta.api_keys_generation
+api_key_index = APIKeyIndex(Config.API_KEY_INDEX_CHECK_INTERVAL)
+
+# Ghi last_check theo lô thay vì commit mỗi heartbeat
+# Không đổi phiên bản dữ liệu: heartbeat ghi mỗi vài giây, nếu đổi ETag thì danh sách
+# license không bao giờ được 304; last_check trong danh sách cũ tối đa LICENSE_ETAG_WINDOW giây
+last_check_writer = LastCheckWriter(
+    repository.update_last_checks,
+    interval=Config.LAST_CHECK_FLUSH_INTERVAL,
+    max_pending=Config.LAST_CHECK_FLUSH_SIZE
+)
+atexit.register(last_check_writer.close)
+
+# Audit log (thao tác admin + kết quả validate) qua hàng đợi, ghi activity_logs theo lô
+audit_log = get_audit_log()
+
+# Chuyển license quá hạn sang 'expired' ở thread nền (chỉ worker giữ lease quét)
+expiry_sweeper = ExpirySweeper(
+    repository,
+    on_expired=lambda license_keys: expire_licenses(license_keys),
+    interval=Config.EXPIRY_SWEEP_INTERVAL,
+    batch_size=Config.EXPIRY_SWEEP_BATCH_SIZE,
+    max_batches=Config.EXPIRY_SWEEP_MAX_BATCHES,
+    lease_ttl=Config.EXPIRY_SWEEP_LEASE_TTL
+)
+atexit.register(expiry_sweeper.close)
+
+# Rate limit /api/client/* theo IP và license_key (bucket dùng chung giữa các worker)
+client_rate_limiter = ClientRateLimiter(
+    create_backend(Config.RATE_LIMIT_SHM_PATH, Config.RATE_LIMIT_SLOTS, Config.RATE_LIMIT_SQLITE_PATH),
+    ip_rate=Config.RATE_LIMIT_IP_RATE,
+    ip_burst=Config.RATE_LIMIT_IP_BURST,
+    license_rate=Config.RATE_LIMIT_LICENSE_RATE,
+    license_burst=Config.RATE_LIMIT_LICENSE_BURST
+) if Config.RATE_LIMIT_ENABLED else None
+
+# Render (biến môi trường RENDER) luôn đặt một proxy trước app; thiếu TRUSTED_PROXY_HOPS thì
+# client_ip() trả IP proxy và cả fleet chung một bucket
+if client_rate_limiter is not None and os.environ.get('RENDER') and Config.TRUSTED_PROXY_HOPS == 0:
+    print("⚠️  Chạy trên Render nhưng TRUSTED_PROXY_HOPS=0: rate limit theo IP sẽ gộp mọi client (đặt TRUSTED_PROXY_HOPS=1)")
+
+# Nạp key ký offline token ngay khi khởi động: production thiếu key thì dừng ở đây, không phải ở request đầu tiên
+if Config.LICENSE_TOKEN_TTL > 0:
+    license_signing_key()
 
+# Prometheus /metrics: latency theo route, SQL mỗi request, commit, cache hit ratio
+if Config.METRICS_ENABLED:
+    metrics.init_app(app, Config.METRICS_TOKEN, authorize=lambda: validate_api_key(), public=Config.METRICS_PUBLIC)
+    metrics.register_cache('license', license_cache)
+    metrics.register_cache('stats', stats_cache)
+
+# ============== DATABASE FUNCTIONS ==============
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    # Không đóng kết nối, chỉ rollback transaction còn dở để dùng lại ở request sau
+    repository.release()
 
 def init_db():
-    with app.app_context():
-        db = get_db()
-        cursor = db.cursor()
-        
-        # Tạo bảng licenses
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS licenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                license_key TEXT UNIQUE NOT NULL,
-                hwid TEXT,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                last_check TIMESTAMP,
-                device_info TEXT,
-                note TEXT,
-                is_locked INTEGER DEFAULT 0,
-                lock_reason TEXT
-            )
-        ''')
-        
-        # Tạo bảng admin_users
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admin_users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tạo bảng api_keys
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS api_keys (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                key TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                permissions TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Thêm admin mặc định nếu chưa có
-        cursor.execute("SELECT COUNT(*) as count FROM admin_users")
-        if cursor.fetchone()[0] == 0:
-            password_hash = argon2_hasher.hash("admin123")
-            cursor.execute(
-                "INSERT INTO admin_users (username, password_hash) VALUES (?, ?)",
-                ("admin", password_hash)
-            )
-            print("✅ Default admin user created: admin / admin123")
-        
-        # ĐẢM BẢO LUÔN CÓ ÍT NHẤT 1 API KEY
-        cursor.execute("SELECT COUNT(*) as count FROM api_keys")
-        if cursor.fetchone()[0] == 0:
-            default_api_key = f"sk_{uuid.uuid4().hex[:32]}"
-            cursor.execute(
-                "INSERT INTO api_keys (key, name, permissions) VALUES (?, ?, ?)",
-                (default_api_key, "Default API Key", "all")
-            )
-            print(f"✅ Default API Key created: {default_api_key[:12]}...")
-        
-        db.commit()
-        print("✅ Database initialized successfully!")
+    # Tạo bảng + chạy các migration schema còn thiếu
+    repository.init_schema()
+    
+    # Thêm admin mặc định nếu chưa có
+    if repository.count_admin_users() == 0:
+        repository.upsert_admin_user("admin", argon2_hasher.hash("admin123"))
+        print("✅ Default admin user created: admin / admin123")
+    
+    # ĐẢM BẢO LUÔN CÓ ÍT NHẤT 1 API KEY
+    if repository.count_api_keys() == 0:
+        default_api_key = create_api_key_record("Default API Key")
+        print(f"✅ Default API Key created: {default_api_key[:12]}...")
+    
+    repository.release()
+    print("✅ Database initialized successfully!")
 
 # ============== HELPER FUNCTIONS ==============
 def validate_api_key():
@@ -108,21 +177,144 @@ def validate_api_key():
     if not api_key:
         return False
     
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM api_keys WHERE key = ?", (api_key,))
-    return cursor.fetchone() is not None
+    # Chỉ tốn một lần hash + tra dict, không truy vấn DB
+    entry = api_key_index.lookup(repository, api_key)
+    g.api_key = entry
+    return entry is not None
+
+def request_client_ip():
+    return client_ip(
+        request.headers.get('X-Forwarded-For'), request.remote_addr, Config.TRUSTED_PROXY_HOPS
+    )
+
+def audit(action, license_key=None, details=None):
+    """Ghi audit cho thao tác admin: API key đang dùng + IP, không chờ DB"""
+    entry = getattr(g, 'api_key', None)
+    audit_log.record(action, details, entry.id if entry else None, license_key, request_client_ip())
+
+def create_api_key_record(name, permissions='all', notes=None):
+    """Tạo API key mới, chỉ lưu digest; trả về key gốc (chỉ hiển thị một lần)"""
+    api_key = generate_api_key()
+    repository.insert_api_key(hash_api_key(api_key), mask_api_key(api_key), name, permissions, notes)
+    api_key_index.invalidate()
+    bump_data_version('api_keys')
+    return api_key
+
+LOGIN_KEY_NOTES = 'admin login'
+
+def prune_login_keys():
+    """Xóa API key cấp khi đăng nhập đã cũ hơn LOGIN_KEY_MAX_AGE_DAYS ngày"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=Config.LOGIN_KEY_MAX_AGE_DAYS)
+    if repository.delete_api_keys_before(LOGIN_KEY_NOTES, cutoff.strftime('%Y-%m-%d %H:%M:%S')):
+        api_key_index.invalidate()
+        bump_data_version('api_keys')
+
+def load_license(repo, license_key):
+    """Lấy LicenseRecord, ưu tiên từ cache"""
+    record = license_cache.get(license_key)
+    if record is not None:
+        return record
+    
+    seen = license_cache.current_version()
+    record = repo.get_license(license_key)
+    if record is None:
+        return None
+    
+    license_cache.put(license_key, record, seen)
+    return record
+
+def bump_data_version(*scopes):
+    if data_version is not None:
+        data_version.bump(*scopes)
+
+def licenses_changed(*scopes):
+    """Sau mọi thay đổi trên licenses: xóa cache thống kê và đổi ETag danh sách / thống kê"""
+    stats_cache.clear()
+    bump_data_version('licenses', 'stats', *scopes)
+
+def invalidate_license(license_key):
+    """Xóa cache liên quan sau khi admin thay đổi một license; worker khác bỏ cache khi thấy 'license_cache' đổi"""
+    license_cache.invalidate(license_key)
+    licenses_changed('license_cache')
+
+def invalidate_licenses(license_keys):
+    """Xóa cache cho nhiều license cùng lúc (thao tác hàng loạt)"""
+    license_cache.invalidate_many(license_keys)
+    licenses_changed('license_cache')
+
+def expire_licenses(license_keys):
+    """Callback của expiry_sweeper sau mỗi lô license vừa chuyển sang 'expired'"""
+    invalidate_licenses(license_keys)
+    audit_log.record_many('LICENSE_EXPIRE', license_keys)
+
+def encode_cursor(created_at, license_id):
+    raw = json.dumps([created_at, license_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, license_id = json.loads(raw)
+        return created_at, int(license_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def license_filters(args):
+    """Bộ lọc danh sách license từ query string: status, locked (0/1), expired (0/1), q"""
+    return {name: args.get(name) for name in ('status', 'locked', 'expired', 'q')}
 
 def generate_license_key():
-    return f"LIC-{uuid.uuid4().hex[:8].upper()}-{uuid.uuid4().hex[:8].upper()}-{uuid.uuid4().hex[:8].upper()}"
+    return generate_license_keys(1)[0]
+
+def generate_license_keys(count):
+    """Sinh `count` key dạng LIC-XXXXXXXX-XXXXXXXX-XXXXXXXX từ một lần đọc os.urandom"""
+    raw = os.urandom(12 * count).hex().upper()
+    return [
+        f"LIC-{raw[i:i + 8]}-{raw[i + 8:i + 16]}-{raw[i + 16:i + 24]}"
+        for i in range(0, 24 * count, 24)
+    ]
+
+def parse_days_valid(value):
+    """Chuyển days_valid sang int trong khoảng 1..3650 (mặc định 30)"""
+    try:
+        days_valid = int(value)
+    except (ValueError, TypeError):
+        return 30
+    if days_valid <= 0:
+        return 30
+    return min(days_valid, 3650)  # Max 10 years
+
+def not_modified(etag):
+    """Response 304 nếu If-None-Match chứa etag (bản gốc hoặc bản nén), None nếu phải trả dữ liệu"""
+    if etag is None or not request.if_none_match:
+        return None
+    for suffix in ETAG_SUFFIXES:
+        if request.if_none_match.contains(etag + suffix):
+            return with_etag(Response(status=304), etag + suffix)
+    return None
+
+def with_etag(response, etag):
+    """Gắn ETag; no-cache để trình duyệt luôn hỏi lại bằng If-None-Match"""
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.after_request
+def compress(response):
+    if Config.COMPRESS_ENABLED:
+        compress_response(
+            response, request.accept_encodings, Config.COMPRESS_MIN_SIZE,
+            Config.COMPRESS_LEVEL, Config.COMPRESS_BROTLI_QUALITY
+        )
+    return response
 
 # ============== ROUTES ==============
 @app.route('/')
 def index():
-    """Trả về file admin.html"""
-    try:
-        return send_file('admin.html')
-    except:
+    """Trả về admin.html (bản build nén sẵn nếu có)"""
+    response = static_assets.send('admin.html', request.accept_encodings)
+    if response is None:
         # Fallback nếu không có file
         return '''
         <!DOCTYPE html>
@@ -149,37 +341,50 @@ def index():
         </html>
         '''
 
+    return response
+
 @app.route('/admin')
 def admin():
     return index()
 
+@app.route('/style.css')
+@app.route('/script.js')
+def source_asset():
+    response = static_assets.send(request.path.lstrip('/'), request.accept_encodings)
+    if response is None:
+        abort(404)
+    return response
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    """Asset đã fingerprint, cache immutable"""
+    response = static_assets.send_fingerprinted(filename, request.accept_encodings)
+    if response is None:
+        abort(404)
+    return response
+
 # ============== DEBUG & SETUP ENDPOINTS ==============
 @app.route('/api/admin/debug', methods=['GET'])
 def debug_info():
     """Debug endpoint to check system status"""
-    db = get_db()
-    cursor = db.cursor()
-    
     # Check tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row['name'] for row in cursor.fetchall()]
+    tables = repository.table_names()
     
     # Count records
-    admin_count = cursor.execute("SELECT COUNT(*) FROM admin_users").fetchone()[0]
-    api_key_count = cursor.execute("SELECT COUNT(*) FROM api_keys").fetchone()[0]
-    license_count = cursor.execute("SELECT COUNT(*) FROM licenses").fetchone()[0]
+    admin_count = repository.count_admin_users()
+    api_key_count = repository.count_api_keys()
+    license_count = repository.count_licenses()
     
     # Get first API key (masked)
-    cursor.execute("SELECT key, name FROM api_keys LIMIT 1")
-    api_key_row = cursor.fetchone()
+    api_key_row = repository.first_api_key()
     api_key_info = None
     if api_key_row:
         api_key_info = {
             'name': api_key_row['name'],
-            'key_masked': api_key_row['key'][:8] + '...' + api_key_row['key'][-4:]
+            'key_masked': api_key_row['key_masked']
         }
     
-    return jsonify({
+    info = {
         'status': 'online',
         'database_tables': tables,
         'counts': {
@@ -189,7 +394,25 @@ def debug_info():
         },
         'api_key_info': api_key_info,
         'message': 'System is running correctly' if api_key_count > 0 else 'No API keys found!'
-    })
+    }
+    
+    # Số liệu nội bộ chỉ cho admin (trang quản trị gọi endpoint này cả trước khi đăng nhập)
+    if Config.DEBUG_INTERNALS_PUBLIC or validate_api_key():
+        info.update({
+            'license_cache': license_cache.stats(),
+            'last_check_writer': last_check_writer.stats(),
+            'audit_log': audit_log.stats(),
+            'expiry_sweeper': expiry_sweeper.stats(),
+            'database': repository.stats(),
+            'api_key_index': api_key_index.stats(),
+            'rate_limiter': client_rate_limiter.stats() if client_rate_limiter else None,
+            'data_version': data_version.stats() if data_version else None,
+            'static_assets': static_assets.stats(),
+            'schema_version': repository.schema_version(),
+            'json_backend': json_codec.BACKEND
+        })
+    
+    return jsonify(info)
 
 @app.route('/api/admin/setup', methods=['POST'])
 def setup_system():
@@ -197,17 +420,10 @@ def setup_system():
     data = request.json
     action = data.get('action', 'create_key')
     
-    db = get_db()
-    cursor = db.cursor()
-    
     if action == 'create_key':
         # Create new API key
-        new_api_key = f"sk_{uuid.uuid4().hex[:32]}"
-        cursor.execute(
-            "INSERT INTO api_keys (key, name, permissions) VALUES (?, ?, ?)",
-            (new_api_key, "Auto-generated Key", "all")
-        )
-        db.commit()
+        new_api_key = create_api_key_record("Auto-generated Key")
+        audit('SETUP_CREATE_KEY', details='Auto-generated Key')
         
         return jsonify({
             'success': True,
@@ -217,12 +433,12 @@ def setup_system():
     
     elif action == 'reset_admin':
         # Reset admin password
-        password_hash = argon2_hasher.hash("admin123")
-        cursor.execute(
-            "INSERT OR REPLACE INTO admin_users (username, password_hash) VALUES (?, ?)",
-            ("admin", password_hash)
-        )
-        db.commit()
+        try:
+            password_hash = login_guard.hash("admin123")
+        except LoginBusy:
+            return jsonify({'success': False, 'message': 'Server busy, retry later'}), 503
+        repository.upsert_admin_user("admin", password_hash)
+        audit('SETUP_RESET_ADMIN', details='admin')
         
         return jsonify({
             'success': True,
@@ -234,61 +450,114 @@ def setup_system():
 # ============== ADMIN API ==============
 @app.route('/api/admin/login', methods=['POST'])
 def admin_login():
-    """Login endpoint - returns API key directly"""
+    """Login endpoint - returns a fresh API key for this admin"""
     data = request.json
     username = data.get('username')
     password = data.get('password')
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
     
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM admin_users WHERE username = ?", (username,))
-    user = cursor.fetchone()
+    # Từ chối (IP, username) / IP đang bị khóa trước khi tính bất kỳ hash nào
+    guard_keys = login_guard.limits(request_client_ip(), username)
+    retry_after = login_guard.blocked_for(repository, guard_keys)
+    if retry_after:
+        response = jsonify({'success': False, 'message': 'Too many failed login attempts'})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
     
-    if user:
-        try:
-            if argon2_hasher.verify(user['password_hash'], password):
-                # Get or create API key
-                cursor.execute("SELECT key FROM api_keys LIMIT 1")
-                api_key_row = cursor.fetchone()
-                
-                if api_key_row:
-                    api_key = api_key_row['key']
-                else:
-                    # Create new API key if none exists
-                    api_key = f"sk_{uuid.uuid4().hex[:32]}"
-                    cursor.execute(
-                        "INSERT INTO api_keys (key, name, permissions) VALUES (?, ?, ?)",
-                        (api_key, "Auto-generated for login", "all")
-                    )
-                    db.commit()
-                
-                return jsonify({
-                    'success': True,
-                    'message': 'Login successful',
-                    'username': username,
-                    'api_key': api_key,  # Trả về API key luôn
-                    'api_key_masked': api_key[:8] + '...' + api_key[-4:]
-                })
-        except:
-            pass
-    
-    return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    user = repository.get_admin_user(username)
+    
+    try:
+        verified = user is not None and login_guard.verify(user['password_hash'], password)
+        if verified and login_guard.needs_rehash(user['password_hash']):
+            # Tham số Argon2 đã đổi -> lưu hash mới theo tham số hiện tại
+            repository.set_admin_password(user['id'], login_guard.hash(password))
+    except LoginBusy:
+        response = jsonify({'success': False, 'message': 'Server busy, retry later'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    if not verified:
+        login_guard.record_failure(repository, guard_keys)
+        audit('ADMIN_LOGIN_FAILED', details=username)
+        return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    
+    login_guard.record_success(repository, guard_keys)
+    
+    # Key chỉ lưu dạng digest nên không thể trả lại key cũ: mỗi lần login cấp key mới,
+    # key của các phiên khác vẫn dùng được cho tới khi quá LOGIN_KEY_MAX_AGE_DAYS
+    api_key = create_api_key_record(f"Admin login: {username}", notes=LOGIN_KEY_NOTES)
+    prune_login_keys()
+    audit('ADMIN_LOGIN', details=username)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Login successful',
+        'username': username,
+        'api_key': api_key,  # Trả về API key luôn
+        'api_key_masked': mask_api_key(api_key)
+    })
 
 @app.route('/api/admin/licenses', methods=['GET'])
 def get_all_licenses():
+    """Danh sách license phân trang theo keyset (created_at, id), hỗ trợ lọc và NDJSON
+    
+    Query params: limit, cursor, status, locked (0/1), expired (0/1), q, format=ndjson
+    """
     if not validate_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute('SELECT * FROM licenses ORDER BY created_at DESC')
+    filters = license_filters(request.args)
+    
+    # Stream toàn bộ kết quả dạng NDJSON, bộ nhớ không phụ thuộc kích thước bảng
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for rows in repository.iter_licenses(filters):
+                yield b''.join(json_codec.dumps(license_row_dict(row)) + b'\n' for row in rows)
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
     
-    licenses = []
-    for row in cursor.fetchall():
-        license_data = dict(row)
-        licenses.append(license_data)
+    try:
+        limit = int(request.args.get('limit', Config.LICENSE_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    limit = max(1, min(limit, Config.LICENSE_PAGE_MAX))
     
-    return jsonify({'licenses': licenses})
+    after = None
+    if request.args.get('cursor'):
+        try:
+            created_at, license_id = decode_cursor(request.args['cursor'])
+            # created_at là epoch giây; cursor cũ (chuỗi ISO) không còn dùng được
+            if not isinstance(created_at, int):
+                raise ValueError('Invalid cursor')
+            after = (created_at, license_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    # Đọc phiên bản trước khi query: thay đổi xảy ra trong lúc query làm ETag lần sau khác đi.
+    # Phiên bản chỉ đổi theo thay đổi admin thấy được (tạo / sửa / xóa / khóa / kích hoạt /
+    # sweeper); khung LICENSE_ETAG_WINDOW giây giới hạn độ cũ của last_check. Lọc expired
+    # so với thời điểm hiện tại nên không dùng ETag.
+    etag = None
+    if etag_versions is not None and filters.get('expired') not in ('0', '1'):
+        etag = etag_versions.etag('licenses', int(time.time() // Config.LICENSE_ETAG_WINDOW))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    # Lấy dư 1 dòng để biết còn trang sau hay không
+    rows = repository.list_licenses(filters, after, limit + 1)
+    licenses = rows[:limit]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        # Tuple theo LICENSE_COLUMNS: [0] = id, [4] = created_at
+        last = licenses[-1]
+        next_cursor = encode_cursor(last[4], last[0])
+    
+    return with_etag(
+        jsonify({'licenses': [license_row_dict(row) for row in licenses], 'next_cursor': next_cursor}), etag
+    )
 
 @app.route('/api/admin/licenses/create', methods=['POST'])
 def create_license():
@@ -300,42 +569,95 @@ def create_license():
     if not data:
         return jsonify({'success': False, 'error': 'No data received'}), 400
     
-    # FIX: Convert days_valid to integer safely
-    try:
-        days_valid = int(data.get('days_valid', 30))
-    except (ValueError, TypeError):
-        days_valid = 30
-    
-    # Ensure days_valid is positive
-    if days_valid <= 0:
-        days_valid = 30
-    if days_valid > 3650:  # Max 10 years
-        days_valid = 3650
-    
+    days_valid = parse_days_valid(data.get('days_valid', 30))
     note = data.get('note', '')
     
     license_key = generate_license_key()
-    expires_at = datetime.now() + timedelta(days=days_valid)
-    
-    db = get_db()
-    cursor = db.cursor()
+    expires_at = to_epoch(datetime.now() + timedelta(days=days_valid))
     
     try:
-        cursor.execute('''
-            INSERT INTO licenses (license_key, expires_at, note, status)
-            VALUES (?, ?, ?, 'active')
-        ''', (license_key, expires_at, note))
-        
-        db.commit()
+        repository.create_license(license_key, expires_at, note)
+        licenses_changed()
+        audit('LICENSE_CREATE', license_key, f'days_valid={days_valid}')
         return jsonify({
             'success': True,
             'license_key': license_key,
-            'expires_at': expires_at.isoformat(),
+            'expires_at': epoch_to_iso(expires_at, 'T'),
             'message': 'License created successfully'
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/admin/licenses/bulk_create', methods=['POST'])
+def bulk_create_licenses():
+    """Tạo nhiều license một lúc, insert theo từng chunk và stream key về dạng CSV/NDJSON
+    
+    Body: count, days_valid, note (có thể chứa {n} = số thứ tự), format ('csv' | 'ndjson')
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'No data received'}), 400
+    
+    try:
+        count = int(data.get('count', 0))
+    except (ValueError, TypeError):
+        count = 0
+    if count <= 0 or count > Config.BULK_CREATE_MAX:
+        return jsonify({
+            'success': False,
+            'error': f'count must be between 1 and {Config.BULK_CREATE_MAX}'
+        }), 400
+    
+    days_valid = parse_days_valid(data.get('days_valid', 30))
+    note_template = data.get('note', '')
+    output_format = data.get('format', 'csv')
+    if output_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+    
+    expires_at = to_epoch(datetime.now() + timedelta(days=days_valid))
+    expires_iso = epoch_to_iso(expires_at, 'T')
+    entry = g.api_key
+    ip_address = request_client_ip()
+    
+    def insert_chunk(start, size):
+        """Insert một chunk trong một transaction, trả về các (key, expires_at, note) đã ghi"""
+        # Key trùng với license đã có bị repository bỏ qua
+        return repository.insert_new_licenses([
+            (key, expires_at, note_template.replace('{n}', str(start + i)))
+            for i, key in enumerate(set(generate_license_keys(size)))
+        ])
+    
+    def generate():
+        if output_format == 'csv':
+            yield 'license_key,expires_at,note\n'
+        created = 0
+        while created < count:
+            # Key trùng (rất hiếm) bị loại khỏi chunk, vòng lặp sau sinh bù cả lô
+            rows = insert_chunk(created + 1, min(Config.BULK_CREATE_CHUNK_SIZE, count - created))
+            created += len(rows)
+            licenses_changed()
+            audit_log.record_many(
+                'LICENSE_BULK_CREATE', [row[0] for row in rows],
+                f'days_valid={days_valid}', entry.id, ip_address
+            )
+            
+            if output_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, lineterminator='\n')
+                writer.writerows((key, expires_iso, note) for key, _, note in rows)
+                yield buffer.getvalue()
+            else:
+                yield b''.join(
+                    json_codec.dumps({'license_key': key, 'expires_at': expires_iso, 'note': note}) + b'\n'
+                    for key, _, note in rows
+                )
+    
+    mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
 @app.route('/api/admin/licenses/reset', methods=['POST'])
 def reset_license():
     if not validate_api_key():
@@ -344,23 +666,12 @@ def reset_license():
     data = request.json
     license_key = data.get('license_key')
     
-    db = get_db()
-    cursor = db.cursor()
+    found = repository.apply_license_action('reset', license_key)
+    invalidate_license(license_key)
+    last_check_writer.discard(license_key)
     
-    cursor.execute('''
-        UPDATE licenses 
-        SET hwid = NULL, 
-            device_info = NULL,
-            last_check = NULL,
-            is_locked = 0,
-            lock_reason = NULL,
-            status = 'active'
-        WHERE license_key = ?
-    ''', (license_key,))
-    
-    db.commit()
-    
-    if cursor.rowcount > 0:
+    if found:
+        audit('LICENSE_RESET', license_key)
         return jsonify({
             'success': True,
             'message': 'License reset successfully'
@@ -377,20 +688,11 @@ def lock_license():
     license_key = data.get('license_key')
     reason = data.get('reason', 'Admin lock')
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute('''
-        UPDATE licenses 
-        SET is_locked = 1,
-            lock_reason = ?,
-            status = 'locked'
-        WHERE license_key = ?
-    ''', (reason, license_key))
-    
-    db.commit()
+    found = repository.apply_license_action('lock', license_key, reason)
+    invalidate_license(license_key)
     
-    if cursor.rowcount > 0:
+    if found:
+        audit('LICENSE_LOCK', license_key, reason)
         return jsonify({
             'success': True,
             'message': 'License locked successfully'
@@ -406,13 +708,11 @@ def delete_license():
     data = request.json
     license_key = data.get('license_key')
     
-    db = get_db()
-    cursor = db.cursor()
+    found = repository.apply_license_action('delete', license_key)
+    invalidate_license(license_key)
     
-    cursor.execute('DELETE FROM licenses WHERE license_key = ?', (license_key,))
-    db.commit()
-    
-    if cursor.rowcount > 0:
+    if found:
+        audit('LICENSE_DELETE', license_key)
         return jsonify({
             'success': True,
             'message': 'License deleted successfully'
@@ -428,20 +728,11 @@ def revoke_license():
     data = request.json
     license_key = data.get('license_key')
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute('''
-        UPDATE licenses 
-        SET status = 'revoked',
-            is_locked = 1,
-            lock_reason = 'Revoked by admin'
-        WHERE license_key = ?
-    ''', (license_key,))
-    
-    db.commit()
+    found = repository.apply_license_action('revoke', license_key)
+    invalidate_license(license_key)
     
-    if cursor.rowcount > 0:
+    if found:
+        audit('LICENSE_REVOKE', license_key)
         return jsonify({
             'success': True,
             'message': 'License revoked successfully'
@@ -449,137 +740,533 @@ def revoke_license():
     else:
         return jsonify({'success': False, 'message': 'License not found'}), 404
 
-# ============== CLIENT API ==============
-@app.route('/api/client/validate', methods=['POST'])
-def validate_license():
+BULK_LICENSE_ACTIONS = ('reset', 'lock', 'revoke', 'delete')
+
+@app.route('/api/admin/licenses/bulk', methods=['POST'])
+def bulk_license_action():
+    """Lock/revoke/reset/delete nhiều license trong một transaction
+    
+    Body: action, và license_keys (list) hoặc filter {note, hwid, created_from, created_to};
+    reason cho action lock.
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+    
     data = request.json
-    license_key = data.get('license_key')
-    hwid = data.get('hwid')
-    device_info = data.get('device_info', '')
+    if not data:
+        return jsonify({'success': False, 'error': 'No data received'}), 400
     
-    if not license_key or not hwid:
+    action = data.get('action')
+    if action not in BULK_LICENSE_ACTIONS:
         return jsonify({
-            'valid': False,
-            'message': 'License key and HWID are required'
+            'success': False,
+            'error': f'action must be one of: {", ".join(BULK_LICENSE_ACTIONS)}'
         }), 400
     
-    db = get_db()
-    cursor = db.cursor()
+    license_keys = data.get('license_keys')
+    filters = data.get('filter')
+    
+    if license_keys is not None:
+        if not isinstance(license_keys, list) or not all(isinstance(k, str) for k in license_keys):
+            return jsonify({'success': False, 'error': 'license_keys must be a list of strings'}), 400
+        license_keys = list(dict.fromkeys(license_keys))
+        filters = None
+    elif isinstance(filters, dict):
+        filters = {field: filters[field] for field in BULK_FILTER_FIELDS if filters.get(field)}
+        if not filters:
+            return jsonify({'success': False, 'error': 'filter must contain at least one field'}), 400
+        # created_at lưu dạng epoch giây: đổi mốc ISO (UTC) của client
+        try:
+            for field in ('created_from', 'created_to'):
+                if field in filters:
+                    filters[field] = utc_iso_to_epoch(str(filters[field]))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'created_from/created_to must be ISO dates'}), 400
+    else:
+        return jsonify({'success': False, 'error': 'license_keys or filter is required'}), 400
     
-    cursor.execute('''
-        SELECT * FROM licenses 
-        WHERE license_key = ? 
-        AND status = 'active'
-    ''', (license_key,))
+    matched = repository.bulk_license_action(
+        action, Config.BULK_OPERATION_MAX,
+        license_keys=license_keys, filters=filters,
+        reason=data.get('reason', 'Admin lock')
+    )
+    if matched is None:
+        return jsonify({
+            'success': False,
+            'error': f'Too many licenses matched (max {Config.BULK_OPERATION_MAX})'
+        }), 400
     
-    license_data = cursor.fetchone()
+    invalidate_licenses(matched)
+    if action == 'reset':
+        last_check_writer.discard_many(matched)
+    audit_log.record_many(
+        f'LICENSE_BULK_{action.upper()}', matched,
+        data.get('reason', 'Admin lock') if action == 'lock' else None,
+        g.api_key.id, request_client_ip()
+    )
     
-    if not license_data:
-        return jsonify({
-            'valid': False,
-            'message': 'Invalid license key'
-        })
+    outcome = 'deleted' if action == 'delete' else 'updated'
+    results = dict.fromkeys(matched, outcome)
+    if license_keys is not None:
+        for key in license_keys:
+            results.setdefault(key, 'not_found')
     
-    # Kiểm tra nếu bị locked
-    if license_data['is_locked']:
-        return jsonify({
-            'valid': False,
-            'message': f'License is locked: {license_data.get("lock_reason", "Unknown reason")}'
-        })
+    return jsonify({
+        'success': True,
+        'action': action,
+        'affected': len(matched),
+        'results': results
+    })
+
+# ============== CLIENT API ==============
+# Logic xử lý tách khỏi Flask (nhận repository + dict + IP client, trả về (payload, status))
+# để dùng chung cho route Flask và server ASGI trong asgi.py
+HWID_MISMATCH_MESSAGE = 'HWID mismatch. This license is bound to another device.'
+INVALID_FIELDS_MESSAGE = 'license_key, hwid and device_info must be strings'
+
+VALID_MESSAGES = {
+    'ACTIVATED': 'License activated successfully',
+    'OK': 'License is valid'
+}
+
+# Response cố định của /validate được encode sẵn một lần (process_validate trả bytes)
+REQUIRED_RESPONSE = json_codec.dumps({'valid': False, 'message': 'License key and HWID are required'})
+REJECTION_RESPONSES = {
+    message: json_codec.dumps({'valid': False, 'message': message})
+    for message in ('Invalid license key', 'License has expired', HWID_MISMATCH_MESSAGE)
+}
+
+def _valid_template(message):
+    """Phần đầu của response hợp lệ, chỉ còn thiếu giá trị expires_at và dấu '}'"""
+    body = json_codec.dumps({'valid': True, 'message': message, 'expires_at': None})
+    return body[:-len(b'null}')]
+
+VALID_TEMPLATES = {outcome: _valid_template(message) for outcome, message in VALID_MESSAGES.items()}
+
+def rejection_response(message):
+    encoded = REJECTION_RESPONSES.get(message)
+    if encoded is not None:
+        return encoded
+    return {'valid': False, 'message': message}
+
+def valid_response(repo, outcome, license_data, hwid, data):
+    """Response validate hợp lệ: template encode sẵn, hoặc dict kèm offline token nếu client yêu cầu"""
+    expires_at = epoch_to_iso(license_data.expires_at)
+    if data.get('token') and Config.LICENSE_TOKEN_TTL > 0:
+        return with_license_token(repo, {
+            'valid': True,
+            'message': VALID_MESSAGES[outcome],
+            'expires_at': expires_at
+        }, license_data, hwid, data)
+    return VALID_TEMPLATES[outcome] + json_codec.dumps(expires_at) + b'}'
+
+def audit_validate(outcome, license_key, ip_address, details=None):
+    audit_log.record(f'VALIDATE_{outcome}', details, None, license_key, ip_address)
+
+def audit_rejection(outcome, license_key, hwid, ip_address):
+    audit_validate(outcome, license_key, ip_address, f'hwid={hwid}' if outcome == 'HWID_MISMATCH' else None)
+
+def license_rejection(license_data):
+    """Các nhánh từ chối trước bước HWID.
+
+    Trả về (outcome, message) hoặc None nếu license còn dùng được.
+    """
+    if license_data and license_data.status == STATUS_EXPIRED:
+        return 'EXPIRED', 'License has expired'
+    
+    # Locked / revoked trả về như key không hợp lệ: client không được biết lý do khóa
+    if not license_data or license_data.status != STATUS_ACTIVE:
+        return 'INVALID', 'Invalid license key'
+    
+    # License quá hạn nhưng expiry_sweeper chưa chuyển sang 'expired' (so sánh epoch giây)
+    if license_data.expires_at is not None and license_data.expires_at <= time.time():
+        return 'EXPIRED', 'License has expired'
+    return None
+
+def validate_decision(license_data, hwid):
+    """Quyết định của /validate cho một license đã đọc (dùng chung validate / validate_batch).
+
+    Trả về (outcome, message): message khác None là từ chối (EXPIRED, INVALID,
+    HWID_MISMATCH); ('ACTIVATE', None) nếu license chưa bind HWID, ('OK', None)
+    nếu HWID khớp.
+    """
+    rejection = license_rejection(license_data)
+    if rejection:
+        return rejection
+    if not license_data.hwid:
+        return 'ACTIVATE', None
+    if license_data.hwid != hwid:
+        return 'HWID_MISMATCH', HWID_MISMATCH_MESSAGE
+    return 'OK', None
+
+def rebind_decision(license_data, hwid):
+    """Bind thất bại vì cache cũ (worker khác đã bind, khóa hoặc xóa license):
+    quyết định lại theo bản đọc từ DB"""
+    outcome, message = validate_decision(license_data, hwid)
+    if outcome == 'ACTIVATE':
+        return 'INVALID', 'Invalid license key'
+    return outcome, message
+
+def process_validate(repo, data, ip_address=None):
+    if not isinstance(data, dict):
+        data = {}
+    license_key = data.get('license_key')
+    hwid = data.get('hwid')
+    device_info = data.get('device_info', '')
     
-    # Kiểm tra hạn sử dụng
-    expires_at = license_data['expires_at']
-    if expires_at:
-        if isinstance(expires_at, str):
-            expires_at = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+    if not license_key or not hwid:
+        return REQUIRED_RESPONSE, 400
+    if not all(isinstance(value, str) for value in (license_key, hwid, device_info or '')):
+        return {'valid': False, 'message': INVALID_FIELDS_MESSAGE}, 400
+    
+    license_data = load_license(repo, license_key)
+    outcome, message = validate_decision(license_data, hwid)
+    
+    # License chưa có HWID (lần đầu kích hoạt)
+    if outcome == 'ACTIVATE':
+        activated = repo.activate_license(license_key, hwid, device_info, int(time.time()))
+        license_cache.invalidate(license_key)
         
-        if expires_at < datetime.now():
-            return jsonify({
-                'valid': False,
-                'message': 'License has expired'
-            })
-    
-    # Nếu license chưa có HWID (lần đầu kích hoạt)
-    if not license_data['hwid']:
-        cursor.execute('''
-            UPDATE licenses 
-            SET hwid = ?,
-                device_info = ?,
-                last_check = ?
-            WHERE license_key = ?
-        ''', (hwid, device_info, datetime.now(), license_key))
-        db.commit()
+        if activated:
+            licenses_changed()
+            audit_validate('ACTIVATED', license_key, ip_address, f'hwid={hwid}')
+            return valid_response(repo, 'ACTIVATED', license_data, hwid, data), 200
         
-        return jsonify({
-            'valid': True,
-            'message': 'License activated successfully',
-            'expires_at': license_data['expires_at']
-        })
+        # Cache cũ: license đã được bind (hoặc bị khóa / xóa) ở worker khác -> đọc lại từ DB
+        license_data = load_license(repo, license_key)
+        outcome, message = rebind_decision(license_data, hwid)
     
-    # Kiểm tra HWID có khớp không
-    if license_data['hwid'] != hwid:
-        return jsonify({
-            'valid': False,
-            'message': 'HWID mismatch. This license is bound to another device.'
-        })
+    if message is not None:
+        audit_rejection(outcome, license_key, hwid, ip_address)
+        return rejection_response(message), 200
     
-    # Cập nhật thời gian check cuối
-    cursor.execute('''
-        UPDATE licenses 
-        SET last_check = ?
-        WHERE license_key = ?
-    ''', (datetime.now(), license_key))
-    db.commit()
+    # Cập nhật thời gian check cuối (ghi theo lô ở thread nền)
+    last_check_writer.record(license_key, int(time.time()))
+    audit_validate('OK', license_key, ip_address)
     
-    return jsonify({
-        'valid': True,
-        'message': 'License is valid',
-        'expires_at': license_data['expires_at']
-    })
+    return valid_response(repo, 'OK', license_data, hwid, data), 200
 
-@app.route('/api/client/check', methods=['POST'])
-def check_license():
-    data = request.json
+def with_license_token(repo, payload, license_data, hwid, data, revocation_version=None):
+    """Thêm offline token vào response validate hợp lệ nếu client yêu cầu ("token": true)"""
+    if not data.get('token') or Config.LICENSE_TOKEN_TTL <= 0:
+        return payload
+    if revocation_version is None:
+        revocation_version = repo.revocation_version()
+    payload['token'] = generate_license_token(
+        license_data.license_key, hwid, 'active',
+        license_data.expires_at, revocation_version
+    )
+    payload['token_ttl'] = Config.LICENSE_TOKEN_TTL
+    payload['revocation_version'] = revocation_version
+    return payload
+
+def parse_validate_item(item):
+    """Một phần tử của validate_batch: [license_key, hwid, device_info?] hoặc object"""
+    if isinstance(item, dict):
+        return item.get('license_key'), item.get('hwid'), item.get('device_info', '')
+    if isinstance(item, (list, tuple)) and 2 <= len(item) <= 3:
+        return item[0], item[1], item[2] if len(item) == 3 else ''
+    return None, None, ''
+
+def process_validate_batch(repo, data, ip_address=None):
+    """Validate nhiều (license_key, hwid, device_info) trong một request.
+
+    Body là mảng các phần tử, hoặc {"items": [...], "token": true}. Quyết định
+    cho từng phần tử dùng chung validate_decision / rebind_decision với /validate,
+    như khi gọi /validate lần lượt theo thứ tự; key chưa có trong cache được đọc
+    bằng một query IN, mọi lần bind và last_check được ghi trong một transaction.
+    Kết quả trả về theo đúng thứ tự.
+    """
+    options = data if isinstance(data, dict) else {}
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return {'success': False, 'message': 'items must be a non-empty array'}, 400
+    if len(items) > Config.VALIDATE_BATCH_MAX:
+        return {
+            'success': False,
+            'message': f'Too many items (max {Config.VALIDATE_BATCH_MAX})'
+        }, 400
+    
+    items = [parse_validate_item(item) for item in items]
+    results = [None] * len(items)
+    
+    # Cache trước, các key còn thiếu lấy bằng một query
+    licenses = {}
+    missing = []
+    for license_key, _, _ in items:
+        if isinstance(license_key, str) and license_key and license_key not in licenses:
+            licenses[license_key] = license_cache.get(license_key)
+            if licenses[license_key] is None:
+                missing.append(license_key)
+    if missing:
+        seen = license_cache.current_version()
+        for license_key, record in repo.get_licenses(missing).items():
+            licenses[license_key] = record
+            license_cache.put(license_key, record, seen)
+    
+    def reject(index, outcome, message, license_key, hwid):
+        audit_rejection(outcome, license_key, hwid, ip_address)
+        results[index] = {'valid': False, 'message': message}
+    
+    accepted = []       # (index, outcome, license_data) chờ ghi xong mới trả token
+    pending = []        # index của phần tử thuộc license chưa bind HWID
+    activations = {}    # license_key -> (index, hwid, device_info) của phần tử bind đầu tiên
+    checks = {}         # (license_key, hwid) cần cập nhật last_check nếu HWID khớp
+    for index, (license_key, hwid, device_info) in enumerate(items):
+        if not license_key or not hwid:
+            results[index] = {'valid': False, 'message': 'License key and HWID are required'}
+            continue
+        # hwid là một phần khóa dict (license_key, hwid) và được ghi xuống DB: kiểu sai chỉ hỏng phần tử này
+        if not all(isinstance(value, str) for value in (license_key, hwid, device_info or '')):
+            results[index] = {'valid': False, 'message': INVALID_FIELDS_MESSAGE}
+            continue
+        # Bucket theo IP đã tính một lần cho cả request, bucket theo key tính cho từng phần tử
+        if client_rate_limiter is not None and client_rate_limiter.check(None, license_key):
+            if Config.METRICS_ENABLED:
+                metrics.RATE_LIMITED.labels('license').inc()
+            results[index] = {'valid': False, 'message': 'Too many requests, retry later'}
+            continue
+        
+        license_data = licenses.get(license_key)
+        outcome, message = validate_decision(license_data, hwid)
+        if message is not None:
+            reject(index, outcome, message, license_key, hwid)
+            continue
+        
+        checks[(license_key, hwid)] = None
+        if outcome == 'OK':
+            accepted.append((index, 'OK', license_data))
+        else:
+            activations.setdefault(license_key, (index, hwid, device_info or ''))
+            pending.append(index)
+    
+    if checks:
+        activated, reloaded = repo.record_validations(
+            [(license_key, hwid, device_info) for license_key, (_, hwid, device_info) in activations.items()],
+            list(checks), int(time.time())
+        )
+        license_cache.invalidate_many(activations)
+        # last_check của các key này đã ghi trực tiếp, bỏ giá trị cũ đang chờ trong writer
+        last_check_writer.discard_many({license_key for license_key, _ in checks})
+        if activated:
+            licenses_changed()
+    
+    for index in pending:
+        license_key, hwid, _ = items[index]
+        first_index, bound_hwid, device_info = activations[license_key]
+        if license_key not in activated:
+            # Đã bị bind (hoặc bị khóa / xóa) ở worker khác: dùng bản đọc lại trong transaction
+            license_data = reloaded.get(license_key)
+            outcome, message = rebind_decision(license_data, hwid)
+        elif index == first_index:
+            audit_validate('ACTIVATED', license_key, ip_address, f'hwid={hwid}')
+            accepted.append((index, 'ACTIVATED', licenses[license_key]))
+            continue
+        else:
+            # Phần tử sau trong cùng lô: license vừa được bind cho phần tử đầu tiên
+            license_data = licenses[license_key].bound_to(bound_hwid, device_info)
+            outcome, message = validate_decision(license_data, hwid)
+        if message is not None:
+            reject(index, outcome, message, license_key, hwid)
+        else:
+            accepted.append((index, 'OK', license_data))
+    
+    revocation_version = None
+    if accepted and options.get('token') and Config.LICENSE_TOKEN_TTL > 0:
+        revocation_version = repo.revocation_version()
+    for index, outcome, license_data in accepted:
+        hwid = items[index][1]
+        if outcome == 'OK':
+            audit_validate('OK', license_data.license_key, ip_address)
+        results[index] = with_license_token(repo, {
+            'valid': True,
+            'message': VALID_MESSAGES[outcome],
+            'expires_at': epoch_to_iso(license_data.expires_at)
+        }, license_data, hwid, options, revocation_version)
+    
+    return {'success': True, 'results': results}, 200
+
+def process_check(repo, data, ip_address=None):
+    if not isinstance(data, dict):
+        data = {}
     license_key = data.get('license_key')
     hwid = data.get('hwid')
     
     if not license_key or not hwid:
-        return jsonify({'valid': False, 'message': 'License key and HWID are required'}), 400
-    
-    db = get_db()
-    cursor = db.cursor()
+        return {'valid': False, 'message': 'License key and HWID are required'}, 400
     
-    cursor.execute('SELECT * FROM licenses WHERE license_key = ? AND hwid = ?', (license_key, hwid))
-    license_data = cursor.fetchone()
+    license_data = repo.check_license(license_key, hwid)
     
     if not license_data:
-        return jsonify({'valid': False, 'message': 'Invalid license or HWID'})
+        return {'valid': False, 'message': 'Invalid license or HWID'}, 200
+    
+    return {
+        'valid': license_data.status == STATUS_ACTIVE,
+        'status': license_data.status_name,
+        'is_locked': license_data.is_locked,
+        'lock_reason': license_data.lock_reason,
+        'expires_at': epoch_to_iso(license_data.expires_at)
+    }, 200
+
+def check_client_rate(ip, data):
+    """Kiểm tra rate limit trước mọi truy vấn DB; trả về (payload, 429, retry_after) nếu bị chặn"""
+    if client_rate_limiter is None:
+        return None
+    license_key = data.get('license_key') if isinstance(data, dict) else None
+    if not isinstance(license_key, str):
+        license_key = None  # Kiểu sai: handler trả lỗi 400, chỉ tính bucket theo IP
+    limited = client_rate_limiter.check(ip, license_key)
+    if limited is None:
+        return None
+    scope, retry_after = limited
+    if Config.METRICS_ENABLED:
+        metrics.RATE_LIMITED.labels(scope).inc()
+    return {'valid': False, 'message': 'Too many requests, retry later'}, 429, retry_after
+
+def client_response(payload, status):
+    """payload là bytes (response encode sẵn) thì trả thẳng, không qua jsonify"""
+    if isinstance(payload, bytes):
+        return Response(payload, status, mimetype='application/json')
+    return jsonify(payload), status
+
+def rate_limited_response(limited):
+    payload, status, retry_after = limited
+    response = jsonify(payload)
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+@app.route('/api/client/validate', methods=['POST'])
+def validate_license():
+    data = request.json
+    ip_address = request_client_ip()
+    limited = check_client_rate(ip_address, data)
+    if limited:
+        return rate_limited_response(limited)
+    payload, status = process_validate(repository, data, ip_address)
+    return client_response(payload, status)
+
+@app.route('/api/client/validate_batch', methods=['POST'])
+def validate_license_batch():
+    data = request.json
+    ip_address = request_client_ip()
+    limited = check_client_rate(ip_address, data)
+    if limited:
+        return rate_limited_response(limited)
+    payload, status = process_validate_batch(repository, data, ip_address)
+    return jsonify(payload), status
+
+@app.route('/api/client/check', methods=['POST'])
+def check_license():
+    data = request.json
+    ip_address = request_client_ip()
+    limited = check_client_rate(ip_address, data)
+    if limited:
+        return rate_limited_response(limited)
+    payload, status = process_check(repository, data, ip_address)
+    return jsonify(payload), status
+
+@app.route('/api/client/token_key', methods=['GET'])
+def license_token_key():
+    """Public key để client verify offline token (404 khi offline token bị tắt)"""
+    if Config.LICENSE_TOKEN_TTL <= 0:
+        return jsonify({'success': False, 'message': 'Offline tokens are disabled'}), 404
+    return jsonify({
+        'algorithm': 'EdDSA',
+        'kid': license_key_id(),
+        'public_key': license_public_key_pem(),
+        'token_ttl': Config.LICENSE_TOKEN_TTL
+    })
+
+_revocations_pruned_at = 0.0
+
+@app.route('/api/client/revocations', methods=['GET'])
+def get_revocations():
+    """Danh sách thu hồi tăng dần theo version: client gửi since=<version đã có>.
+
+    Mỗi mục là [license_key, version]; token của key đó có rv < version thì bỏ,
+    client phải validate online lại. Mục cũ hơn TTL của token được xóa vì mọi
+    token bị ảnh hưởng đã hết hạn.
+    """
+    global _revocations_pruned_at
+    try:
+        since = max(0, int(request.args.get('since', 0)))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid since'}), 400
+    
+    now = time.time()
+    if now - _revocations_pruned_at > 60:
+        _revocations_pruned_at = now
+        repository.prune_revocations(int(now) - Config.LICENSE_TOKEN_TTL - 60)
+    
+    rows = repository.revocations_since(since, Config.REVOCATION_PAGE_SIZE + 1)
+    has_more = len(rows) > Config.REVOCATION_PAGE_SIZE
+    rows = rows[:Config.REVOCATION_PAGE_SIZE]
+    version = rows[-1]['version'] if rows else repository.revocation_version()
     
     return jsonify({
-        'valid': license_data['status'] == 'active' and not license_data['is_locked'],
-        'status': license_data['status'],
-        'is_locked': bool(license_data['is_locked']),
-        'lock_reason': license_data['lock_reason'],
-        'expires_at': license_data['expires_at']
+        'version': version,
+        'revoked': [[row['license_key'], row['version']] for row in rows],
+        'has_more': has_more
     })
 
+# ============== AUDIT LOG ==============
+@app.route('/api/admin/activity', methods=['GET'])
+def get_activity():
+    """Audit log mới nhất trước, phân trang keyset theo (performed_at, id)
+
+    Query params: limit, cursor
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    try:
+        limit = int(request.args.get('limit', Config.LICENSE_PAGE_SIZE))
+        before = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(limit, Config.LICENSE_PAGE_MAX))
+
+    rows = repository.recent_activity(limit + 1, before)
+    logs = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(logs[-1]['performed_at'], logs[-1]['id'])
+
+    return jsonify({'logs': logs, 'next_cursor': next_cursor})
+
+@app.route('/api/admin/activity/daily', methods=['GET'])
+def get_daily_activity():
+    """Số sự kiện theo ngày / license / action của các kỳ audit log đã được gộp
+
+    Query params: days (mặc định 30), license_key
+    """
+    if not validate_api_key():
+        return jsonify({'error': 'Invalid API key'}), 401
+
+    try:
+        days = max(1, int(request.args.get('days', 30)))
+    except ValueError:
+        return jsonify({'error': 'Invalid days'}), 400
+
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat()
+    return jsonify({'daily': repository.daily_activity(since, request.args.get('license_key'))})
+
 # ============== API KEY MANAGEMENT ==============
 @app.route('/api/admin/apikeys', methods=['GET'])
 def get_api_keys():
     if not validate_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM api_keys ORDER BY created_at DESC")
+    # api_key_index.generation (trigger trên api_keys) bắt cả thay đổi từ process / máy khác
+    etag = etag_versions.etag('api_keys', api_key_index.generation) if etag_versions is not None else None
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     
-    keys = []
-    for row in cursor.fetchall():
-        key_data = dict(row)
-        key_data['key_masked'] = key_data['key'][:8] + '...' + key_data['key'][-4:]
-        keys.append(key_data)
+    keys = repository.list_api_keys(request.args.get('status'), request.args.get('q', '').strip())
     
-    return jsonify({'api_keys': keys})
+    return with_etag(jsonify({'api_keys': keys}), etag)
 
 @app.route('/api/admin/apikeys/create', methods=['POST'])
 def create_api_key():
@@ -589,16 +1276,8 @@ def create_api_key():
     data = request.json
     name = data.get('name', 'New API Key')
     
-    api_key = f"sk_{uuid.uuid4().hex[:32]}"
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute(
-        "INSERT INTO api_keys (key, name, permissions) VALUES (?, ?, ?)",
-        (api_key, name, 'all')
-    )
-    db.commit()
+    api_key = create_api_key_record(name)
+    audit('APIKEY_CREATE', details=name)
     
     return jsonify({
         'success': True,
@@ -613,36 +1292,53 @@ def get_stats():
     if not validate_api_key():
         return jsonify({'error': 'Invalid API key'}), 401
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute("SELECT COUNT(*) as total FROM licenses")
-    total = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) as active FROM licenses WHERE status = 'active'")
-    active = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) as locked FROM licenses WHERE is_locked = 1")
-    locked = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) as expired FROM licenses WHERE expires_at < datetime('now')")
-    expired = cursor.fetchone()[0]
+    # Số license sắp hết hạn đổi theo thời gian nên ETag còn gắn với khung STATS_ETAG_WINDOW giây
+    etag = None
+    if etag_versions is not None:
+        etag = etag_versions.etag('stats', int(time.time() // Config.STATS_ETAG_WINDOW))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    # Cache giữ kèm ETag: worker khác vừa đổi dữ liệu thì không trả số cũ dưới ETag mới
+    cached_stats = stats_cache.get()
+    if cached_stats is None or cached_stats[0] != etag:
+        stats = compute_stats(repository)
+        stats_cache.set((etag, stats))
+    else:
+        stats = cached_stats[1]
     
-    return jsonify({
-        'total_licenses': total,
-        'active_licenses': active,
-        'locked_licenses': locked,
-        'expired_licenses': expired
-    })
+    return with_etag(jsonify(stats), etag)
+
+def compute_stats(repo):
+    """Tổng hợp thống kê: bộ đếm do trigger duy trì + một range scan trên index (status, expires_at)"""
+    now = int(time.time())
+    return repo.license_stats(now, now + 86400, now + 7 * 86400, now + 30 * 86400)
 
 # ============== INITIALIZE & RUN ==============
-# Khởi tạo database khi ứng dụng start
-with app.app_context():
-    init_db()
+def init_worker():
+    """Phần khởi tạo riêng của mỗi process phục vụ request (thread nền: expiry sweeper).
+
+    Chỉ gọi từ entry point của server: gunicorn post_fork, lifespan startup của
+    asgi.py, hoặc __main__. Import app (benchmark.py, asgi.py, script, test)
+    không chạy sweeper, không giành lease.
+    """
+    # Không dùng lại kết nối SQLite của process cha (pool PostgreSQL tự tạo lại theo pid)
+    db_connections.reset()
+    if Config.EXPIRY_SWEEP_ENABLED:
+        expiry_sweeper.start()
+
+# Khởi tạo database khi ứng dụng start (preload: một lần trong master thay vì mỗi worker)
+init_db()
+
+if Config.PRELOAD_APP:
+    # Master không phục vụ request: đóng kết nối trước khi fork, worker mở lại khi cần
+    repository.close()
 
 if __name__ == '__main__':
     # Lấy port từ environment variable (Render cung cấp)
     port = int(os.environ.get('PORT', 8080))
     
     # Khởi động ứng dụng
+    init_worker()
     app.run(host='0.0.0.0', port=port, debug=False)
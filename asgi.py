@@ -0,0 +1,166 @@
+"""Chế độ ASGI cho traffic heartbeat của client.
+
+/api/client/validate và /api/client/check được xử lý trên event loop: mỗi
+kết nối keep-alive chỉ tốn một coroutine, còn việc truy vấn SQLite chạy trong
+một thread pool có giới hạn. Mọi route khác (admin, trang quản trị) được
+chuyển nguyên cho Flask app qua WsgiToAsgi nên dùng chung Config, cache và DB.
+
+Chạy:
+    uvicorn asgi:application --host 0.0.0.0 --port 10000 --workers 4
+hoặc
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+
+Metrics: chạy bằng gunicorn thì dùng PROMETHEUS_MULTIPROC_DIR của
+gunicorn.conf.py. Chạy trực tiếp bằng uvicorn thì các worker (cùng process cha)
+dùng chung thư mục /tmp/license-admin-metrics-asgi-<pid cha>, mỗi lần chạy một
+thư mục mới; đặt PROMETHEUS_MULTIPROC_DIR để tự chọn thư mục.
+"""
+import os
+
+# Phải đặt trước khi app import prometheus_client (metrics.py đọc biến khi import)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', f'/tmp/license-admin-metrics-asgi-{os.getppid()}')
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app as flask_app, repository, last_check_writer, audit_log, expiry_sweeper, init_worker,
+    process_validate, process_validate_batch, process_check, check_client_rate
+)
+from config import Config
+import json_codec
+import metrics
+from rate_limiter import client_ip
+
+CLIENT_ROUTES = {
+    '/api/client/validate': process_validate,
+    '/api/client/validate_batch': process_validate_batch,
+    '/api/client/check': process_check,
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.ASYNC_DB_THREADS,
+    thread_name_prefix='client-db'
+)
+_slots = None
+_pending = 0
+_flask = WsgiToAsgi(flask_app)
+
+
+def _run_client_handler(path, handler, data, ip_address):
+    # SQLite: mỗi thread trong pool giữ kết nối riêng (thread-local); PostgreSQL: mượn từ pool
+    if Config.METRICS_ENABLED:
+        metrics.begin_request()
+    status = 500
+    try:
+        payload, status = handler(repository, data, ip_address)
+        return payload, status
+    finally:
+        repository.release()
+        if Config.METRICS_ENABLED:
+            metrics.end_request(path, 'POST', status)
+
+
+def _scope_client_ip(scope):
+    forwarded_for = None
+    for name, value in scope.get('headers', ()):
+        if name == b'x-forwarded-for':
+            forwarded_for = value.decode('latin-1')
+    remote_addr = scope['client'][0] if scope.get('client') else None
+    return client_ip(forwarded_for, remote_addr, Config.TRUSTED_PROXY_HOPS)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > Config.ASYNC_MAX_BODY_SIZE:
+            return None
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, status, payload, headers=()):
+    # process_validate trả về bytes encode sẵn cho các response cố định
+    body = payload if isinstance(payload, bytes) else json_codec.dumps(payload)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _handle_client(scope, receive, send, handler):
+    global _slots, _pending
+    if _slots is None:
+        _slots = asyncio.Semaphore(Config.ASYNC_MAX_INFLIGHT)
+
+    body = await _read_body(receive)
+    if body is None:
+        return await _send_json(send, 413, {'valid': False, 'message': 'Request body too large'})
+    try:
+        data = json_codec.loads(body) if body else None
+    except ValueError:
+        return await _send_json(send, 400, {'valid': False, 'message': 'Invalid JSON body'})
+
+    # Rate limit trên event loop (shared memory, không chạm DB) trước khi vào pool
+    ip_address = _scope_client_ip(scope)
+    limited = check_client_rate(ip_address, data)
+    if limited:
+        payload, status, retry_after = limited
+        return await _send_json(send, status, payload, [(b'retry-after', str(retry_after).encode())])
+
+    # Giới hạn số request đang chờ DB; vượt quá thì từ chối ngay thay vì xếp hàng vô hạn
+    if _pending >= Config.ASYNC_MAX_INFLIGHT + Config.ASYNC_MAX_QUEUED:
+        return await _send_json(send, 503, {'valid': False, 'message': 'Server busy, retry later'})
+
+    _pending += 1
+    try:
+        async with _slots:
+            loop = asyncio.get_running_loop()
+            payload, status = await loop.run_in_executor(
+                _executor, _run_client_handler, scope['path'], handler, data, ip_address
+            )
+    finally:
+        _pending -= 1
+    await _send_json(send, status, payload)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Thread nền của process (expiry sweeper) chỉ chạy khi thực sự phục vụ request
+            init_worker()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Ghi nốt last_check và audit log còn trong bộ nhớ, nhả lease sweeper trước khi tắt
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(_executor, expiry_sweeper.close)
+            await loop.run_in_executor(_executor, last_check_writer.close)
+            await loop.run_in_executor(_executor, audit_log.close)
+            _executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        handler = CLIENT_ROUTES.get(scope['path'])
+        if handler is not None:
+            return await _handle_client(scope, receive, send, handler)
+
+    await _flask(scope, receive, send)
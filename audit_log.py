@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+def utc_now():
+    """Thời điểm UTC dạng 'YYYY-MM-DD HH:MM:SS.ffffff', cùng kiểu với CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat(' ')
+
+
+class AuditLog:
+    """Hàng đợi audit log trong bộ nhớ, ghi xuống activity_logs theo lô.
+
+    record() chỉ append một tuple vào deque (không đụng DB); một thread nền
+    gọi `write(rows)` (INSERT nhiều dòng trong một transaction) sau mỗi
+    `interval` giây hoặc khi hàng đợi đạt `batch_size`. Khi hàng đợi đầy
+    (`max_queue`, DB chậm hoặc lỗi) sự kiện mới bị bỏ và được đếm trong
+    `dropped`, request không bao giờ phải chờ writer.
+
+    Cùng thread đó gọi `maintain()` (gộp + xóa partition cũ) mỗi
+    `maintenance_interval` giây.
+
+    Mỗi dòng: (performed_at, key_id, license_key, action, details, ip_address).
+    """
+
+    def __init__(self, write, interval=1.0, batch_size=500, max_queue=50000,
+                 maintain=None, maintenance_interval=3600):
+        self.write = write
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.maintain = maintain
+        self.maintenance_interval = maintenance_interval
+        self._next_maintenance = 0.0
+        self.last_maintenance = None
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.recorded = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = {}
+
+    def record(self, action, details=None, key_id=None, license_key=None, ip_address=None):
+        return self.record_many(action, [license_key], details, key_id, ip_address)
+
+    def record_many(self, action, license_keys, details=None, key_id=None, ip_address=None):
+        """Một sự kiện cho mỗi license_key (thao tác hàng loạt); False nếu bị bỏ vì đầy"""
+        performed_at = utc_now()
+        rows = [
+            (performed_at, key_id, license_key, action, details, ip_address)
+            for license_key in license_keys
+        ]
+        with self._lock:
+            room = self.max_queue - len(self._queue)
+            if room < len(rows):
+                self.dropped[action] = self.dropped.get(action, 0) + len(rows) - max(room, 0)
+                rows = rows[:max(room, 0)]
+            self._queue.extend(rows)
+            self.recorded += len(rows)
+            pending = len(self._queue)
+        self._ensure_thread()
+        if pending >= self.batch_size:
+            # Backpressure: đánh thức writer sớm thay vì đợi hết interval
+            self._wakeup.set()
+        return bool(rows)
+
+    def flush(self):
+        """Ghi toàn bộ hàng đợi theo từng lô batch_size; trả về số dòng đã ghi"""
+        total = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        break
+                    count = min(self.batch_size, len(self._queue))
+                    batch = [self._queue.popleft() for _ in range(count)]
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"❌ Lỗi khi ghi audit log ({len(batch)} dòng): {e}")
+                    # Trả lô về đầu hàng đợi, phần vượt max_queue bị tính là drop
+                    with self._lock:
+                        self._queue.extendleft(reversed(batch))
+                        while len(self._queue) > self.max_queue:
+                            action = self._queue.pop()[3]
+                            self.dropped[action] = self.dropped.get(action, 0) + 1
+                    break
+                self.flushes += 1
+                self.written += len(batch)
+                total += len(batch)
+        return total
+
+    def close(self):
+        """Ghi nốt dữ liệu còn lại, gọi khi worker tắt"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._queue)
+            dropped = dict(self.dropped)
+        return {
+            'pending': pending,
+            'recorded': self.recorded,
+            'written': self.written,
+            'flushes': self.flushes,
+            'failures': self.failures,
+            'dropped': dropped,
+            'max_queue': self.max_queue,
+            'last_maintenance': self.last_maintenance
+        }
+
+    def _ensure_thread(self):
+        # Thread được tạo lười và tạo lại sau khi fork (gunicorn worker)
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Sự kiện của process cha do process cha ghi
+                self._queue.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='audit-log-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+            if self.maintain is not None and time.monotonic() >= self._next_maintenance:
+                self._next_maintenance = time.monotonic() + self.maintenance_interval
+                self.run_maintenance()
+
+    def run_maintenance(self):
+        try:
+            self.last_maintenance = self.maintain()
+        except Exception as e:
+            print(f"❌ Lỗi khi bảo trì audit log: {e}")
+        return self.last_maintenance
+
+
+_audit_log = None
+_audit_log_lock = threading.Lock()
+
+
+def get_audit_log():
+    """AuditLog dùng chung trong process (app.py, models.py), ghi qua repository"""
+    global _audit_log
+    if _audit_log is None:
+        with _audit_log_lock:
+            if _audit_log is None:
+                import atexit
+                from config import Config
+                from repository import get_repository
+                repo = get_repository()
+                _audit_log = AuditLog(
+                    repo.insert_activity_logs,
+                    interval=Config.AUDIT_LOG_FLUSH_INTERVAL,
+                    batch_size=Config.AUDIT_LOG_BATCH_SIZE,
+                    max_queue=Config.AUDIT_LOG_MAX_QUEUE,
+                    maintain=lambda: repo.maintain_activity_logs(
+                        Config.AUDIT_LOG_RETENTION_DAYS, Config.AUDIT_ROLLUP_RETENTION_DAYS
+                    ),
+                    maintenance_interval=Config.AUDIT_LOG_MAINTENANCE_INTERVAL
+                )
+                atexit.register(_audit_log.close)
+    return _audit_log
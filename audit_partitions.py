@@ -0,0 +1,139 @@
+"""Chia activity_logs theo thời gian (ngày hoặc tháng, Config.AUDIT_LOG_PARTITION).
+
+- SQLite: mỗi kỳ một file riêng cạnh file DB chính (licenses_audit_202610.db),
+  ATTACH vào kết nối khi cần với tên schema audit_202610. Xóa dữ liệu cũ =
+  xóa cả file, không phải DELETE quét bảng.
+- PostgreSQL: bảng activity_logs khai báo PARTITION BY RANGE (performed_at),
+  mỗi kỳ một partition activity_logs_p202610; xóa = DROP TABLE partition.
+
+Trước khi bị xóa, mỗi kỳ đã đóng được gộp thành số sự kiện theo
+(ngày, license_key, action) trong bảng activity_daily.
+"""
+import glob
+import os
+import re
+import sqlite3
+from datetime import date, timedelta
+
+# Bảng log trong mỗi file partition SQLite (cùng cột với activity_logs của DB chính)
+SQLITE_PARTITION_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key_id INTEGER,
+        action TEXT NOT NULL,
+        details TEXT,
+        performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ip_address TEXT,
+        license_key TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_performed_id ON activity_logs(performed_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_activity_logs_key_id ON activity_logs(key_id)",
+]
+
+_PERIOD = re.compile(r'^\d{6}(\d{2})?$')
+
+
+def period_of(performed_at, granularity):
+    """'2026-10-17 04:16:57.42' -> '202610' (month) hoặc '20261017' (day)"""
+    period = performed_at[0:4] + performed_at[5:7]
+    if granularity == 'day':
+        period += performed_at[8:10]
+    return period
+
+
+def period_for_date(day, granularity):
+    return period_of(day.isoformat(), granularity)
+
+
+def period_bounds(period):
+    """(ngày bắt đầu, ngày bắt đầu kỳ sau); kỳ 6 chữ số là tháng, 8 chữ số là ngày"""
+    start = date(int(period[0:4]), int(period[4:6]), int(period[6:8]) if len(period) == 8 else 1)
+    if len(period) == 8:
+        return start, start + timedelta(days=1)
+    if start.month == 12:
+        return start, date(start.year + 1, 1, 1)
+    return start, date(start.year, start.month + 1, 1)
+
+
+def postgres_partition_ddl(period):
+    start, end = period_bounds(period)
+    return (
+        f"CREATE TABLE IF NOT EXISTS activity_logs_p{period} PARTITION OF activity_logs "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+class SQLitePartitions:
+    """Quản lý file partition SQLite và việc ATTACH chúng vào từng kết nối"""
+
+    def __init__(self, database_path, granularity='month', max_attached=8):
+        stem, _ = os.path.splitext(os.path.abspath(database_path))
+        self.prefix = f'{stem}_audit_'
+        self.granularity = granularity
+        # SQLite mặc định chỉ cho ATTACH tối đa 10 database mỗi kết nối
+        self.max_attached = max_attached
+
+    def path(self, period):
+        return f'{self.prefix}{period}.db'
+
+    def periods(self):
+        """Các kỳ đang có file, mới nhất trước"""
+        periods = []
+        for path in glob.glob(glob.escape(self.prefix) + '*.db'):
+            period = path[len(self.prefix):-3]
+            if _PERIOD.match(period):
+                periods.append(period)
+        return sorted(periods, key=lambda p: period_bounds(p)[0], reverse=True)
+
+    def attached(self, conn):
+        return {
+            row[1]: row[2] for row in conn.execute("PRAGMA database_list")
+            if row[1].startswith('audit_')
+        }
+
+    def attach(self, conn, period, create=True):
+        """ATTACH file của kỳ vào kết nối (tạo bảng nếu create=True), trả về tên schema.
+
+        Trả về None nếu file không tồn tại và create=False.
+        """
+        schema = f'audit_{period}'
+        attached = self.attached(conn)
+        for name, path in list(attached.items()):
+            if not os.path.exists(path):
+                # File đã bị worker khác xóa (retention): bỏ bản đang giữ để giải phóng đĩa
+                self._detach(conn, name)
+                del attached[name]
+        if schema in attached:
+            return schema
+        path = self.path(period)
+        if not create and not os.path.exists(path):
+            return None
+        if len(attached) >= self.max_attached:
+            for name in sorted(attached)[:len(attached) - self.max_attached + 1]:
+                self._detach(conn, name)
+        conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+        if create:
+            conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+            for ddl in SQLITE_PARTITION_DDL:
+                conn.execute(ddl.format(schema=schema))
+            conn.commit()
+        return schema
+
+    def detach(self, conn, period):
+        self._detach(conn, f'audit_{period}')
+
+    def remove(self, period):
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path(period) + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _detach(self, conn, schema):
+        try:
+            conn.execute("DETACH DATABASE " + schema)
+        except sqlite3.OperationalError:
+            # Đang trong transaction: để lần sau
+            pass
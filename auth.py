@@ -1,8 +1,14 @@
 import jwt
+import hashlib
+import os
+import tempfile
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
 from config import Config
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 
 def generate_token(username):
     """Tạo JWT token"""
@@ -63,3 +69,115 @@ def login_required(f):
         return f(*args, **kwargs)
     
     return decorated_function
+
+# ============== OFFLINE LICENSE TOKEN ==============
+# Token license được client tự verify nên phải ký bất đối xứng (EdDSA/Ed25519):
+# client chỉ giữ public key, không thể tự tạo token như với secret HS256.
+_license_signing_key = None
+_license_key_id = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def default_key_file():
+    """File key cho development: ngoài thư mục app, không bao giờ nằm trong thư mục được phục vụ"""
+    return os.path.join(os.path.expanduser('~'), '.license-admin', 'license_token_key.pem')
+
+def _inside_app_dir(path):
+    return os.path.commonpath([APP_DIR, os.path.abspath(path)]) == APP_DIR
+
+def _load_or_create_key_file(path, create=True):
+    """Đọc private key PEM; tạo mới nếu chưa có (an toàn khi nhiều worker cùng tạo)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            raise RuntimeError(f'License token key file not found: {path}')
+    if _inside_app_dir(path):
+        raise RuntimeError(
+            f'Refusing to create the license token signing key inside the app directory: {path}'
+        )
+    
+    pem = Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pem)
+        try:
+            os.link(tmp_path, path)  # Thất bại nếu worker khác đã tạo trước
+            print(f"✅ License token signing key created: {path}")
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp_path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+def license_signing_key():
+    """Private key ký license token.
+    
+    Production bắt buộc LICENSE_TOKEN_PRIVATE_KEY (hoặc LICENSE_TOKEN_KEY_FILE đã có sẵn):
+    mọi instance phải ký bằng cùng một key, và key tự sinh trên mỗi container sẽ làm
+    token của instance này bị instance khác từ chối. Development tự tạo file key
+    ngoài thư mục app.
+    """
+    global _license_signing_key, _license_key_id
+    if _license_signing_key is None:
+        pem = Config.LICENSE_TOKEN_PRIVATE_KEY.replace('\\n', '\n').encode()
+        if not pem:
+            production = Config.ENVIRONMENT == 'production'
+            if production and not Config.LICENSE_TOKEN_KEY_FILE:
+                raise RuntimeError(
+                    'LICENSE_TOKEN_PRIVATE_KEY (or LICENSE_TOKEN_KEY_FILE) is required in production '
+                    '(or set LICENSE_TOKEN_TTL=0 to disable offline tokens)'
+                )
+            pem = _load_or_create_key_file(
+                Config.LICENSE_TOKEN_KEY_FILE or default_key_file(), create=not production
+            )
+        key = serialization.load_pem_private_key(pem, password=None)
+        _license_key_id = hashlib.sha256(license_public_key_pem(key).encode()).hexdigest()[:16]
+        _license_signing_key = key
+    return _license_signing_key
+
+def license_public_key_pem(key=None):
+    """Public key (PEM) để client verify token offline"""
+    key = key or license_signing_key()
+    return key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+def license_key_id():
+    license_signing_key()
+    return _license_key_id
+
+def generate_license_token(license_key, hwid, status, expires_epoch, revocation_version, ttl=None):
+    """Tạo token license ngắn hạn; hết hạn sớm hơn nếu license hết hạn trước TTL"""
+    now = int(time.time())
+    exp = now + (ttl or Config.LICENSE_TOKEN_TTL)
+    if expires_epoch is not None:
+        exp = min(exp, expires_epoch)
+    payload = {
+        'sub': license_key,
+        'hwid': hwid,
+        'status': status,
+        'lic_exp': expires_epoch,
+        'rv': revocation_version,  # Chỉ các mục thu hồi có version > rv mới áp dụng cho token này
+        'iat': now,
+        'exp': exp
+    }
+    return jwt.encode(payload, license_signing_key(), algorithm='EdDSA',
+                      headers={'kid': license_key_id()})
+
+def verify_license_token(token):
+    """Xác thực license token (phía server; client làm tương tự với public key)"""
+    try:
+        return jwt.decode(token, license_signing_key().public_key(), algorithms=['EdDSA'])
+    except jwt.InvalidTokenError:
+        return None
@@ -0,0 +1,309 @@
+"""Benchmark cho client API và admin API.
+
+Seed một database SQLite riêng với số license cấu hình được, rồi bắn request
+đồng thời vào /api/client/validate, /api/client/check, /api/admin/licenses và
+/api/admin/stats qua Flask test client (in-process) hoặc qua HTTP tới một
+server đang chạy / gunicorn do script tự khởi động. Kết quả (p50/p95/p99,
+throughput) in ra dạng JSON để so sánh giữa các commit.
+
+Ví dụ:
+    python benchmark.py --licenses 100000 --bound-ratio 0.8 --concurrency 16
+    python benchmark.py --target gunicorn --licenses 1000000 --output bench.json
+    python benchmark.py --target http://127.0.0.1:10000 --duration 30
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ENDPOINTS = ('validate', 'check', 'admin_licenses', 'admin_stats')
+
+
+def hwid_for(license_key):
+    # HWID cố định theo key: key đã bind và key chưa bind đều validate hợp lệ
+    return 'HWID-' + license_key
+
+
+def seed_database(path, total, bound_ratio, chunk_size=10000):
+    """Tạo schema qua app.init_db rồi chèn `total` license, tỉ lệ bound_ratio đã bind HWID"""
+    os.environ['SQLITE_DATABASE'] = path
+    import app  # init_db chạy khi import, tạo bảng + migration trên file mới
+
+    conn = sqlite3.connect(path)
+    existing = conn.execute("SELECT COUNT(*) FROM licenses").fetchone()[0]
+    now = int(time.time())
+    started = time.perf_counter()
+    for offset in range(existing, total, chunk_size):
+        size = min(chunk_size, total - offset)
+        rows = []
+        for key in app.generate_license_keys(size):
+            bound = random.random() < bound_ratio
+            rows.append((
+                key,
+                hwid_for(key) if bound else None,
+                now + random.randint(1, 365) * 86400,
+                now if bound else None,
+                'benchmark'
+            ))
+        conn.executemany(
+            "INSERT INTO licenses (license_key, hwid, expires_at, last_check, note) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+    if total > existing:
+        print(f"Seeded {total - existing} licenses in {time.perf_counter() - started:.1f}s",
+              file=sys.stderr)
+    conn.close()
+
+
+def sample_keys(path, size):
+    conn = sqlite3.connect(path)
+    max_id = conn.execute("SELECT MAX(id) FROM licenses").fetchone()[0] or 0
+    ids = random.sample(range(1, max_id + 1), min(size, max_id))
+    keys = [
+        row[0] for row in conn.execute(
+            "SELECT license_key FROM licenses WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(ids),)
+        )
+    ]
+    conn.close()
+    return keys
+
+
+class FlaskTarget:
+    """Gọi app trực tiếp qua Flask test client (không tính chi phí mạng)"""
+
+    def __init__(self):
+        import app
+        self.app = app.app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers or {})
+        data = response.get_data()
+        return response.status_code, data
+
+
+class HTTPTarget:
+    """Gọi server thật qua HTTP keep-alive, mỗi thread một kết nối"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def login(target):
+    status, body = target.request('POST', '/api/admin/login',
+                                  {'username': 'admin', 'password': 'admin123'})
+    if status != 200:
+        raise RuntimeError(f"Admin login failed ({status}): {body[:200]!r}")
+    return json.loads(body)['api_key']
+
+
+def make_request(endpoint, keys, api_key):
+    if endpoint in ('validate', 'check'):
+        key = random.choice(keys)
+        return 'POST', f'/api/client/{endpoint}', {'license_key': key, 'hwid': hwid_for(key)}, None
+    headers = {'X-API-Key': api_key}
+    if endpoint == 'admin_licenses':
+        return 'GET', '/api/admin/licenses?limit=100', None, headers
+    return 'GET', '/api/admin/stats', None, headers
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_endpoint(target, endpoint, keys, api_key, concurrency, duration, requests):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    remaining = [requests]
+
+    def worker():
+        local = []
+        local_errors = 0
+        while True:
+            if requests:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            elif time.perf_counter() >= deadline:
+                break
+            method, path, body, headers = make_request(endpoint, keys, api_key)
+            started = time.perf_counter()
+            try:
+                status, _ = target.request(method, path, body, headers)
+                if status >= 400:
+                    local_errors += 1
+            except Exception:
+                local_errors += 1
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None)
+    }
+
+
+def start_gunicorn(db_path, port):
+    env = dict(os.environ, SQLITE_DATABASE=db_path)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env
+    )
+    target = HTTPTarget(f'http://127.0.0.1:{port}')
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            target.request('GET', '/api/admin/debug')
+            return process, target
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark license admin / client API')
+    parser.add_argument('--db', default='benchmark.db', help='SQLite file dùng cho benchmark')
+    parser.add_argument('--licenses', type=int, default=10000)
+    parser.add_argument('--bound-ratio', type=float, default=0.8)
+    parser.add_argument('--target', default='flask',
+                        help="'flask' (test client), 'gunicorn' (tự khởi động) hoặc URL server")
+    parser.add_argument('--port', type=int, default=18000, help='port cho --target gunicorn')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='giây cho mỗi endpoint')
+    parser.add_argument('--requests', type=int, default=0,
+                        help='số request cố định mỗi endpoint (thay cho --duration)')
+    parser.add_argument('--sample', type=int, default=5000, help='số license key dùng để gọi')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='ghi JSON kết quả ra file')
+    parser.add_argument('--rate-limit', action='store_true',
+                        help='giữ rate limit /api/client/* (mặc định tắt: mọi request đến từ một IP)')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    db_path = os.path.abspath(args.db)
+    os.environ['SQLITE_DATABASE'] = db_path
+    if not args.rate_limit:
+        os.environ['RATE_LIMIT_ENABLED'] = '0'
+    seed_database(db_path, args.licenses, args.bound_ratio)
+    keys = sample_keys(db_path, args.sample)
+
+    process = None
+    if args.target == 'flask':
+        target = FlaskTarget()
+    elif args.target == 'gunicorn':
+        process, target = start_gunicorn(db_path, args.port)
+    else:
+        target = HTTPTarget(args.target)
+
+    try:
+        api_key = login(target)
+        results = {}
+        for endpoint in args.endpoints.split(','):
+            if endpoint not in ENDPOINTS:
+                parser.error(f'unknown endpoint: {endpoint}')
+            results[endpoint] = run_endpoint(
+                target, endpoint, keys, api_key,
+                args.concurrency, args.duration, args.requests
+            )
+            print(f"{endpoint}: {results[endpoint]}", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'target': args.target,
+            'licenses': args.licenses,
+            'bound_ratio': args.bound_ratio,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'requests': args.requests,
+            'rate_limit': args.rate_limit
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
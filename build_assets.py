@@ -0,0 +1,95 @@
+"""Build asset tĩnh cho trang quản trị: fingerprint + nén sẵn.
+
+    python build_assets.py
+
+Mỗi file trong ASSET_SOURCES được chép vào Config.ASSET_BUILD_DIR dưới tên
+có hash nội dung (vd: style.3f2a9c1b.css) kèm bản .gz và .br (nếu có module
+brotli); manifest.json ánh xạ tên gốc -> tên đã fingerprint. Trong admin.html
+các tham chiếu tới style.css / script.js được đổi sang /assets/<tên mới> nên
+hai file này được cache vĩnh viễn (immutable); admin.html vẫn ở URL / và luôn
+được hỏi lại bằng ETag (static_assets.py).
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# admin.html đứng cuối để thay được tên đã fingerprint của css / js
+ASSET_SOURCES = ('style.css', 'script.js', 'admin.html')
+MANIFEST = 'manifest.json'
+
+
+def build_dir():
+    return os.path.join(BASE_DIR, Config.ASSET_BUILD_DIR)
+
+
+def _fingerprint(name, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest}{ext}', digest
+
+
+def _rewrite_references(html, files):
+    """href="style.css" / src="/script.js" -> /assets/<tên đã fingerprint>"""
+    for name, entry in files.items():
+        html = re.sub(
+            r'(["\'(])/?' + re.escape(name) + r'(?=["\')?#])',
+            lambda match: f"{match.group(1)}/assets/{entry['file']}",
+            html
+        )
+    return html
+
+
+def build(output_dir=None):
+    output_dir = output_dir or build_dir()
+    # Build vào thư mục tạm rồi đổi tên: worker đang chạy không thấy bản build dở dang
+    staging = output_dir + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    files = {}
+    for name in ASSET_SOURCES:
+        path = os.path.join(BASE_DIR, name)
+        if not os.path.isfile(path):
+            print(f"⚠️  Bỏ qua {name}: không tìm thấy file")
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if name.endswith('.html'):
+            data = _rewrite_references(data.decode('utf-8'), files).encode('utf-8')
+
+        filename, digest = _fingerprint(name, data)
+        encodings = ['gzip']
+        with open(os.path.join(staging, filename), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(staging, filename + '.gz'), 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            encodings.insert(0, 'br')
+            with open(os.path.join(staging, filename + '.br'), 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+        files[name] = {'file': filename, 'hash': digest, 'encodings': encodings}
+        print(f"✅ {name} -> {filename} ({', '.join(encodings)})")
+
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump({'files': files}, f, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(staging, output_dir)
+    return files
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,89 @@
+"""Nén response theo Accept-Encoding: br nếu đã cài module brotli, không thì gzip.
+
+Body thường chỉ được nén khi đạt ngưỡng kích thước; response stream (NDJSON,
+CSV) được nén từng chunk và flush sau mỗi chunk nên client vẫn nhận dữ liệu
+dần dần. File tĩnh (send_file, direct_passthrough) không đi qua đây.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset((
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/csv', 'text/css', 'text/html', 'text/javascript', 'text/plain'
+))
+
+# ETag của bản nén = ETag gốc + hậu tố encoding
+ETAG_SUFFIXES = ('', '-gzip', '-br')
+
+
+def choose_encoding(accept_encodings):
+    """Encoding tốt nhất client chấp nhận (werkzeug Accept), None nếu không nén"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6, brotli_quality=5):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return zlib.compress(data, level, wbits=31)  # wbits 31 = định dạng gzip
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self, mode=None):
+        if mode is None:
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_stream(chunks, encoding, level=6, brotli_quality=5):
+    if encoding == 'br':
+        compressor = _BrotliStream(brotli_quality)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response, accept_encodings, min_size=1024, level=6, brotli_quality=5):
+    """Nén response Flask tại chỗ nếu phù hợp (gọi trong after_request)"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level, brotli_quality)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding, level, brotli_quality))
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
@@ -11,6 +11,13 @@ class Config:
     # Database - ƯU TIÊN BIẾN MÔI TRƯỜNG TRỰC TIẾP
     DATABASE_URL = os.environ.get('DATABASE_URL', '')
     
+    # PostgreSQL connection pool (psycopg_pool, mỗi worker một pool)
+    PG_POOL_MIN_SIZE = int(os.environ.get('PG_POOL_MIN_SIZE', 2))
+    PG_POOL_MAX_SIZE = int(os.environ.get('PG_POOL_MAX_SIZE', 10))
+    PG_POOL_MAX_LIFETIME = float(os.environ.get('PG_POOL_MAX_LIFETIME', 3600))
+    PG_POOL_MAX_IDLE = float(os.environ.get('PG_POOL_MAX_IDLE', 600))
+    PG_POOL_TIMEOUT = float(os.environ.get('PG_POOL_TIMEOUT', 30))
+    
     # Admin Credentials
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
@@ -24,3 +31,142 @@ class Config:
     
     # CORS
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
+    
+    # License cache (cache kết quả validate theo license_key, mỗi worker một bản). Thay đổi của admin
+    # bỏ cache mọi worker cùng máy qua shared memory (data_version); TTL giới hạn độ cũ giữa các host
+    LICENSE_CACHE_SIZE = int(os.environ.get('LICENSE_CACHE_SIZE', 10000))
+    LICENSE_CACHE_TTL = float(os.environ.get('LICENSE_CACHE_TTL', 30))
+    
+    # Ghi last_check theo lô (giây / số key tối đa trước khi ghi)
+    LAST_CHECK_FLUSH_INTERVAL = float(os.environ.get('LAST_CHECK_FLUSH_INTERVAL', 5))
+    LAST_CHECK_FLUSH_SIZE = int(os.environ.get('LAST_CHECK_FLUSH_SIZE', 1000))
+    
+    # Audit log: hàng đợi trong bộ nhớ, ghi activity_logs theo lô (giây / dòng mỗi lô / dòng tối đa chờ ghi)
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 1))
+    AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 500))
+    AUDIT_LOG_MAX_QUEUE = int(os.environ.get('AUDIT_LOG_MAX_QUEUE', 50000))
+    
+    # Audit log chia partition theo 'day' hoặc 'month'; log chi tiết giữ AUDIT_LOG_RETENTION_DAYS ngày
+    # (xóa cả partition), số liệu gộp theo ngày giữ AUDIT_ROLLUP_RETENTION_DAYS ngày (0 = vô hạn)
+    AUDIT_LOG_PARTITION = os.environ.get('AUDIT_LOG_PARTITION', 'month')
+    AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', 90))
+    AUDIT_ROLLUP_RETENTION_DAYS = int(os.environ.get('AUDIT_ROLLUP_RETENTION_DAYS', 730))
+    AUDIT_LOG_MAINTENANCE_INTERVAL = float(os.environ.get('AUDIT_LOG_MAINTENANCE_INTERVAL', 3600))
+    
+    # Sweeper chuyển license quá hạn sang 'expired' (một worker giữ lease chạy mỗi
+    # EXPIRY_SWEEP_INTERVAL giây, tối đa BATCH_SIZE * MAX_BATCHES license mỗi vòng)
+    EXPIRY_SWEEP_ENABLED = os.environ.get('EXPIRY_SWEEP_ENABLED', '1') == '1'
+    EXPIRY_SWEEP_INTERVAL = float(os.environ.get('EXPIRY_SWEEP_INTERVAL', 60))
+    EXPIRY_SWEEP_BATCH_SIZE = int(os.environ.get('EXPIRY_SWEEP_BATCH_SIZE', 500))
+    EXPIRY_SWEEP_MAX_BATCHES = int(os.environ.get('EXPIRY_SWEEP_MAX_BATCHES', 20))
+    EXPIRY_SWEEP_LEASE_TTL = float(os.environ.get('EXPIRY_SWEEP_LEASE_TTL', 180))
+    
+    # Múi giờ của expires_at / last_check cũ dạng chuỗi (datetime.now() không kèm múi giờ):
+    # migration sang epoch giây của SQLite và PostgreSQL cùng đổi theo múi giờ này, và API
+    # trả expires_at / last_check dạng chuỗi không múi giờ theo múi giờ này như trước
+    LEGACY_TIMEZONE = os.environ.get('LEGACY_TIMEZONE', 'UTC')
+    
+    # SQLite (kết nối lâu dài mỗi worker + pragma)
+    SQLITE_DATABASE = os.environ.get('SQLITE_DATABASE', 'licenses.db')
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # âm = KiB
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    SQLITE_CACHED_STATEMENTS = int(os.environ.get('SQLITE_CACHED_STATEMENTS', 256))
+    
+    # Phân trang danh sách license
+    LICENSE_PAGE_SIZE = int(os.environ.get('LICENSE_PAGE_SIZE', 100))
+    LICENSE_PAGE_MAX = int(os.environ.get('LICENSE_PAGE_MAX', 1000))
+    
+    # Cache kết quả /api/admin/stats (giây)
+    STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 5))
+    
+    # ETag / 304 cho danh sách license, API key và thống kê theo bộ đếm phiên bản dữ liệu
+    # trong shared memory (chỉ đúng khi mọi worker cùng một máy; nhiều host thì tắt)
+    ETAG_ENABLED = os.environ.get('ETAG_ENABLED', '1') == '1'
+    DATA_VERSION_SHM_PATH = os.environ.get('DATA_VERSION_SHM_PATH', '')  # trống = /dev/shm hoặc thư mục tmp
+    STATS_ETAG_WINDOW = int(os.environ.get('STATS_ETAG_WINDOW', 60))
+    # last_check (heartbeat) không đổi phiên bản dữ liệu: ETag danh sách license đổi ít nhất mỗi chừng này giây
+    LICENSE_ETAG_WINDOW = int(os.environ.get('LICENSE_ETAG_WINDOW', 60))
+    
+    # Nén response (br nếu có module brotli, không thì gzip) từ COMPRESS_MIN_SIZE byte; stream nén theo chunk
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+    
+    # gunicorn.conf.py đặt PRELOAD_APP=1 khi preload_app: app.py chạy init_db() một lần trong
+    # master và đóng kết nối trước khi fork. Thread nền chỉ chạy qua init_worker() (post_fork)
+    PRELOAD_APP = os.environ.get('PRELOAD_APP', '0') == '1'
+    
+    # Thư mục output của build_assets.py (tương đối với thư mục app)
+    ASSET_BUILD_DIR = os.environ.get('ASSET_BUILD_DIR', 'static_build')
+    
+    # Chu kỳ (giây) kiểm tra app_meta.api_keys_generation để nạp lại bảng API key
+    API_KEY_INDEX_CHECK_INTERVAL = float(os.environ.get('API_KEY_INDEX_CHECK_INTERVAL', 2))
+    
+    # Tạo license hàng loạt
+    BULK_CREATE_MAX = int(os.environ.get('BULK_CREATE_MAX', 100000))
+    BULK_CREATE_CHUNK_SIZE = int(os.environ.get('BULK_CREATE_CHUNK_SIZE', 5000))
+    BULK_OPERATION_MAX = int(os.environ.get('BULK_OPERATION_MAX', 100000))
+    
+    # Chế độ ASGI (asgi.py) cho /api/client/*
+    ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', 8))
+    ASYNC_MAX_INFLIGHT = int(os.environ.get('ASYNC_MAX_INFLIGHT', 64))
+    ASYNC_MAX_QUEUED = int(os.environ.get('ASYNC_MAX_QUEUED', 2000))
+    ASYNC_MAX_BODY_SIZE = int(os.environ.get('ASYNC_MAX_BODY_SIZE', 64 * 1024))
+    
+    # Prometheus metrics (/metrics): cần Bearer METRICS_TOKEN hoặc X-API-Key admin;
+    # METRICS_PUBLIC=1 để scrape không xác thực (chỉ khi /metrics không ra Internet)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+    
+    # /api/admin/debug: trạng thái cơ bản (trang quản trị đọc trước khi đăng nhập) luôn công khai;
+    # số liệu nội bộ (cache, DB pool, rate limiter...) cần X-API-Key admin trừ khi DEBUG_INTERNALS_PUBLIC=1
+    DEBUG_INTERNALS_PUBLIC = os.environ.get('DEBUG_INTERNALS_PUBLIC', '0') == '1'
+    
+    # Argon2 cho mật khẩu admin (memory_cost tính bằng KiB); đổi tham số thì hash
+    # cũ được hash lại ở lần đăng nhập thành công tiếp theo
+    ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 3))
+    ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 65536))
+    ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 4))
+    
+    # Đăng nhập admin: số phép Argon2 đồng thời MỖI PROCESS (worker sync chỉ chạy một request
+    # mỗi lúc; có tác dụng với gthread / ASGI) và giới hạn đăng nhập sai theo (IP, username) / IP
+    LOGIN_MAX_CONCURRENT = int(os.environ.get('LOGIN_MAX_CONCURRENT', 2))
+    LOGIN_QUEUE_TIMEOUT = float(os.environ.get('LOGIN_QUEUE_TIMEOUT', 2))
+    LOGIN_MAX_FAILURES = int(os.environ.get('LOGIN_MAX_FAILURES', 10))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 30))
+    LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 300))
+    LOGIN_LOCKOUT = int(os.environ.get('LOGIN_LOCKOUT', 300))
+    # Mỗi lần đăng nhập cấp một API key mới (các phiên khác vẫn dùng được key của mình);
+    # key đăng nhập cũ hơn LOGIN_KEY_MAX_AGE_DAYS ngày bị xóa ở lần đăng nhập sau
+    LOGIN_KEY_MAX_AGE_DAYS = int(os.environ.get('LOGIN_KEY_MAX_AGE_DAYS', 7))
+    
+    # Offline license token (Ed25519) trả kèm /api/client/validate: tắt mặc định, bật bằng
+    # LICENSE_TOKEN_TTL > 0 (giây, ví dụ 3600). Khi bật, LICENSE_TOKEN_PRIVATE_KEY là PEM, bắt buộc
+    # trong production (mọi instance dùng chung một key) trừ khi LICENSE_TOKEN_KEY_FILE trỏ tới
+    # file key có sẵn. Development: để trống thì tạo file ~/.license-admin/license_token_key.pem
+    # (không bao giờ trong thư mục app)
+    LICENSE_TOKEN_TTL = int(os.environ.get('LICENSE_TOKEN_TTL', 0))
+    LICENSE_TOKEN_PRIVATE_KEY = os.environ.get('LICENSE_TOKEN_PRIVATE_KEY', '')
+    LICENSE_TOKEN_KEY_FILE = os.environ.get('LICENSE_TOKEN_KEY_FILE', '')
+    REVOCATION_PAGE_SIZE = int(os.environ.get('REVOCATION_PAGE_SIZE', 5000))
+    # Số phần tử tối đa trong một request /api/client/validate_batch
+    VALIDATE_BATCH_MAX = int(os.environ.get('VALIDATE_BATCH_MAX', 500))
+    
+    # Rate limit /api/client/* (token bucket: rate = request/giây, burst = dung lượng; rate 0 = tắt)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMIT_IP_RATE = float(os.environ.get('RATE_LIMIT_IP_RATE', 20))
+    RATE_LIMIT_IP_BURST = float(os.environ.get('RATE_LIMIT_IP_BURST', 60))
+    RATE_LIMIT_LICENSE_RATE = float(os.environ.get('RATE_LIMIT_LICENSE_RATE', 1))
+    RATE_LIMIT_LICENSE_BURST = float(os.environ.get('RATE_LIMIT_LICENSE_BURST', 10))
+    RATE_LIMIT_SHM_PATH = os.environ.get('RATE_LIMIT_SHM_PATH', '')  # trống = /dev/shm hoặc thư mục tmp
+    RATE_LIMIT_SLOTS = int(os.environ.get('RATE_LIMIT_SLOTS', 65536))
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH', 'ratelimit.db')
+    
+    # Số reverse proxy tin cậy phía trước app (Render: 1, đặt trong render.yaml); 0 = dùng địa chỉ
+    # kết nối trực tiếp. Chạy sau proxy mà để 0 thì mọi client chung một bucket IP (app cảnh báo)
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
@@ -0,0 +1,84 @@
+"""Bộ đếm phiên bản dữ liệu dùng chung giữa các worker, làm ETag cho API admin.
+
+Route admin thay đổi dữ liệu (cùng client kích hoạt license và expiry_sweeper)
+gọi bump(scope); GET danh sách / thống kê dựng ETag từ generation + version
+của scope nên request có If-None-Match trùng được trả 304 mà không chạy query
+nào. Ghi last_check theo heartbeat không bump (xem LICENSE_ETAG_WINDOW).
+Scope 'license_cache' chỉ đổi khi admin khóa / thu hồi / reset / xóa license:
+LicenseCache của mọi worker so bộ đếm này để bỏ bản cache cũ.
+
+Bộ đếm nằm trong file mmap (mặc định trên /dev/shm, như rate limiter): ghi
+dưới fcntl.lockf, đọc không cần khóa. generation là số ngẫu nhiên ghi lúc tạo
+file nên ETag cũ không trùng sau khi file bị tạo lại (reboot). Chỉ đúng khi
+mọi worker chạy trên cùng một máy; nhiều host dùng chung PostgreSQL thì tắt
+ETAG_ENABLED (cache license khi đó chỉ dựa vào LICENSE_CACHE_TTL giữa các host).
+"""
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+SCOPES = ('licenses', 'stats', 'api_keys', 'license_cache')
+_COUNTER = struct.Struct('<Q')
+
+
+def default_shm_path():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'license-admin-data-version')
+
+
+class DataVersion:
+    def __init__(self, path, scopes=SCOPES):
+        import fcntl  # Không có trên Windows -> ImportError, tắt ETag
+        self._fcntl = fcntl
+        self.path = path
+        # Ô 0: generation, ô i + 1: version của scopes[i]
+        self._offsets = {scope: (i + 1) * _COUNTER.size for i, scope in enumerate(scopes)}
+        size = (len(scopes) + 1) * _COUNTER.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, os.urandom(_COUNTER.size), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+        self.generation = _COUNTER.unpack_from(self._map, 0)[0]
+        self.bumps = 0
+
+    def bump(self, *scopes):
+        with self._lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX)
+            try:
+                for scope in scopes:
+                    offset = self._offsets[scope]
+                    _COUNTER.pack_into(self._map, offset, _COUNTER.unpack_from(self._map, offset)[0] + 1)
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN)
+            self.bumps += 1
+
+    def version(self, scope):
+        return _COUNTER.unpack_from(self._map, self._offsets[scope])[0]
+
+    def etag(self, scope, *parts):
+        """ETag (chưa có dấu nháy) cho scope; parts: thành phần phụ (vd: khung thời gian)"""
+        return '-'.join([scope, f'{self.generation:x}', str(self.version(scope)), *map(str, parts)])
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'versions': {scope: self.version(scope) for scope in self._offsets},
+            'bumps': self.bumps
+        }
+
+
+def create_data_version(shm_path):
+    try:
+        return DataVersion(shm_path or default_shm_path())
+    except (ImportError, OSError, ValueError) as e:
+        print(f"⚠️ Shared-memory data version unavailable ({e}), ETag disabled")
+        return None
@@ -1,145 +1,120 @@
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
 import psycopg
+from psycopg_pool import ConnectionPool
 from config import Config
-import os
-import time
-
-_connection = None
-_db_initialized = False
-
-def get_db():
-    """Kết nối đến PostgreSQL database"""
-    global _connection
-    
-    if _connection is None or _connection.closed:
-        max_retries = 3
-        retry_delay = 2
-        
-        for attempt in range(max_retries):
-            try:
-                # Parse DATABASE_URL
-                db_url = Config.DATABASE_URL
-                
-                if not db_url:
-                    # Thử lấy từ biến môi trường trực tiếp
-                    db_url = os.environ.get('DATABASE_URL')
-                    
-                if not db_url:
-                    print("⚠️  Cảnh báo: DATABASE_URL không được cấu hình")
-                    print("Ứng dụng sẽ chạy ở chế độ không có database")
-                    return None
-                
-                # Kết nối với psycopg3
-                _connection = psycopg.connect(
-                    db_url,
-                    autocommit=False
-                )
-                print(f"✅ Đã kết nối đến PostgreSQL database (lần thử {attempt + 1})")
-                break
-                
-            except Exception as e:
-                print(f"❌ Lỗi kết nối database (lần thử {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    print(f"⏳ Thử lại sau {retry_delay} giây...")
-                    time.sleep(retry_delay)
-                else:
-                    print("⚠️  Không thể kết nối database, ứng dụng sẽ chạy ở chế độ limited")
-                    _connection = None
-    
-    return _connection
 
-def init_database():
-    """Khởi tạo database tables - CHỈ GỌI KHI CÓ KẾT NỐI"""
-    global _db_initialized
-    
-    if _db_initialized:
-        return
-    
-    conn = None
-    cursor = None
-    try:
-        conn = get_db()
-        if conn is None:
-            print("⚠️  Không có kết nối database, bỏ qua khởi tạo tables")
-            return
-        
-        cursor = conn.cursor()
-        
-        # Tạo bảng api_keys
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS api_keys (
-                id SERIAL PRIMARY KEY,
-                key_name VARCHAR(255) NOT NULL,
-                server_key VARCHAR(512) UNIQUE NOT NULL,
-                api_key VARCHAR(512) UNIQUE NOT NULL,
-                status VARCHAR(50) DEFAULT 'active',
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_reset_at TIMESTAMP
-            )
-        """)
-        
-        # Tạo bảng activity_logs
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS activity_logs (
-                id SERIAL PRIMARY KEY,
-                key_id INTEGER,
-                action VARCHAR(100) NOT NULL,
-                details TEXT,
-                performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ip_address VARCHAR(45)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def text_dict_row(cursor):
+    """Row factory trả về dict, timestamp/date đổi sang chuỗi ISO giống sqlite3"""
+    if cursor.description is None:
+        return None
+    names = [column.name for column in cursor.description]
+
+    def make_row(values):
+        return {
+            name: _iso(value) if isinstance(value, date) else value
+            for name, value in zip(names, values)
+        }
+    return make_row
+
+# OID kiểu date / timestamp / timestamptz của PostgreSQL
+_DATE_OIDS = frozenset((1082, 1114, 1184))
+
+def text_tuple_row(cursor):
+    """Như text_dict_row nhưng trả về tuple; chỉ cột date/timestamp phải đổi sang chuỗi"""
+    if cursor.description is None:
+        return None
+    dates = [i for i, column in enumerate(cursor.description) if column.type_code in _DATE_OIDS]
+    if not dates:
+        return tuple
+
+    def make_row(values):
+        row = list(values)
+        for i in dates:
+            if row[i] is not None:
+                row[i] = _iso(row[i])
+        return tuple(row)
+    return make_row
+
+def _iso(value):
+    return value.isoformat(' ') if isinstance(value, datetime) else value.isoformat()
+
+def get_database_url():
+    return Config.DATABASE_URL or os.environ.get('DATABASE_URL', '')
+
+def get_pool():
+    """Pool kết nối PostgreSQL của process hiện tại (tạo lười, tạo lại sau fork)"""
+    global _pool, _pool_pid
+
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            db_url = get_database_url()
+            if not db_url:
+                print("⚠️  Cảnh báo: DATABASE_URL không được cấu hình")
+                return None
+
+            # Thread nền của pool không sống sót qua fork -> mỗi worker một pool riêng
+            _pool = ConnectionPool(
+                db_url,
+                min_size=Config.PG_POOL_MIN_SIZE,
+                max_size=Config.PG_POOL_MAX_SIZE,
+                max_lifetime=Config.PG_POOL_MAX_LIFETIME,
+                max_idle=Config.PG_POOL_MAX_IDLE,
+                timeout=Config.PG_POOL_TIMEOUT,
+                check=ConnectionPool.check_connection,  # Kiểm tra kết nối trước khi giao cho request
+                kwargs={'row_factory': text_dict_row},
+                name='license-admin',
+                open=True
             )
-        """)
-        
-        # Tạo indexes
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_api_keys_status 
-            ON api_keys(status)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_api_keys_created 
-            ON api_keys(created_at DESC)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_activity_logs_key_id 
-            ON activity_logs(key_id)
-        """)
-        
-        conn.commit()
-        print("✅ Database tables đã được khởi tạo")
-        _db_initialized = True
-        
-    except Exception as e:
-        print(f"❌ Lỗi khi khởi tạo database: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if cursor:
-            cursor.close()
+            _pool_pid = os.getpid()
+            print(f"✅ PostgreSQL pool ready (min={Config.PG_POOL_MIN_SIZE}, max={Config.PG_POOL_MAX_SIZE})")
+    return _pool
+
+@contextmanager
+def get_db_connection():
+    """Mượn một kết nối từ pool; commit khi thành công, rollback khi lỗi"""
+    pool = get_pool()
+    if pool is None:
+        raise RuntimeError("DATABASE_URL is not configured")
+    with pool.connection() as conn:
+        yield conn
+
+def init_database():
+    """Khởi tạo tables + migration qua repository đang được cấu hình"""
+    from repository import get_repository
+    get_repository().init_schema()
+    print("✅ Database tables đã được khởi tạo")
 
 def close_db():
-    """Đóng kết nối database"""
-    global _connection, _db_initialized
-    if _connection and not _connection.closed:
-        _connection.close()
-        _connection = None
-        _db_initialized = False
-        print("Database connection closed")
+    """Đóng pool kết nối database"""
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
+        print("Database connection pool closed")
+    _pool = None
+    _pool_pid = None
+
+def pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return _pool.get_stats()
 
 # Helper function để kiểm tra database connection
 def check_db_connection():
     """Kiểm tra kết nối database"""
     try:
-        conn = get_db()
-        if conn is None:
-            return False, "No database connection"
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        cursor.close()
+        with get_db_connection() as conn:
+            conn.execute("SELECT 1").fetchone()
         return True, "Database connected"
-    except Exception as e:
+    except (psycopg.Error, RuntimeError) as e:
         return False, str(e)
@@ -0,0 +1,120 @@
+import os
+import socket
+import threading
+import time
+
+
+class ExpirySweeper:
+    """Thread nền chuyển license quá hạn sang status 'expired' theo lô.
+
+    Mỗi worker có một thread, nhưng chỉ worker đang giữ lease `name` (bảng
+    app_leases, gia hạn mỗi vòng) mới quét; leader chết thì lease hết hạn sau
+    `lease_ttl` giây và worker khác thay thế. Mỗi vòng chuyển tối đa
+    `max_batches` lô `batch_size` license theo index (status, expires_at) rồi
+    gọi `on_expired(keys)` để xóa cache của worker này. Worker khác thấy thay
+    đổi khi cache hết TTL; validate vẫn tự so expires_at nên không chấp nhận
+    license quá hạn trong khoảng giữa hai lần quét.
+    """
+
+    def __init__(self, repo, on_expired=None, interval=60, batch_size=500, max_batches=20,
+                 lease_ttl=None, name='expiry_sweeper'):
+        self.repo = repo
+        self.on_expired = on_expired
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.lease_ttl = lease_ttl or interval * 3
+        self.name = name
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._started = False
+        self._closed = False
+        self._fork_hook = False
+        self.is_leader = False
+        self.sweeps = 0
+        self.expired = 0
+        self.failures = 0
+        self.last_sweep = None
+
+    @property
+    def holder(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def start(self):
+        """Chạy thread nền (gọi lại sau fork sẽ tạo thread mới cho process con)"""
+        with self._lock:
+            self._started = True
+            if not self._fork_hook:
+                # gunicorn --preload: thread của process cha không sang được worker
+                os.register_at_fork(after_in_child=self._after_fork)
+                self._fork_hook = True
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self.is_leader = False
+            self._thread = threading.Thread(target=self._run, name='expiry-sweeper', daemon=True)
+            self._thread.start()
+
+    def sweep(self, now=None):
+        """Một vòng quét; trả về số license đã chuyển, None nếu worker khác đang là leader"""
+        now = now or time.time()
+        if not self.repo.acquire_lease(self.name, self.holder, self.lease_ttl, now):
+            self.is_leader = False
+            return None
+        self.is_leader = True
+        total = 0
+        for _ in range(self.max_batches):
+            keys = self.repo.expire_licenses(int(now), self.batch_size)
+            if keys and self.on_expired is not None:
+                self.on_expired(keys)
+            total += len(keys)
+            if len(keys) < self.batch_size:
+                break
+        self.sweeps += 1
+        self.expired += total
+        self.last_sweep = now
+        return total
+
+    def close(self):
+        """Dừng thread và nhả lease để worker khác nhận ngay, gọi khi worker tắt"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        if self.is_leader:
+            try:
+                self.repo.release_lease(self.name, self.holder)
+            except Exception as e:
+                print(f"⚠️  Không nhả được lease {self.name}: {e}")
+            self.is_leader = False
+
+    def stats(self):
+        return {
+            'leader': self.is_leader,
+            'sweeps': self.sweeps,
+            'expired': self.expired,
+            'failures': self.failures,
+            'last_sweep': self.last_sweep,
+            'interval': self.interval
+        }
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        if self._started and not self._closed:
+            self.start()
+
+    def _run(self):
+        while not self._closed:
+            try:
+                self.sweep()
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Lỗi khi quét license hết hạn: {e}")
+            finally:
+                self.repo.release()
+            self._wakeup.wait(self.interval)
@@ -1,7 +1,186 @@
+"""Cấu hình gunicorn cho production.
+
+- preload_app: app.py được import một lần trong master (init_db / migration
+  chạy một lần, code dùng chung qua copy-on-write); master đóng kết nối DB
+  trước khi fork. Có preload hay không, mỗi worker gọi app.init_worker()
+  trong post_fork (import app không tự chạy thread nền).
+- max_requests + jitter: worker được thay dần (fork lại từ master đã preload
+  nên rất nhanh) để bộ nhớ không phình theo thời gian.
+- Số worker / thread tính từ số CPU thật (affinity, cgroup quota), thời gian
+  một lần hash Argon2 (login, CPU-bound; GUNICORN_ARGON2_MS, mặc định 250ms,
+  hoặc đo khi GUNICORN_MEASURE_ARGON2=1; bỏ qua khi có WEB_CONCURRENCY) và tỉ lệ thời gian
+  validate chờ I/O (GUNICORN_IO_WAIT, đo bằng benchmark.py: 1 - CPU time /
+  wall time của worker), rồi chặn theo ngân sách bộ nhớ. WEB_CONCURRENCY /
+  GUNICORN_THREADS ghi đè kết quả.
+- GUNICORN_WORKER_CLASS=gthread: mỗi worker nhiều thread, ít process hơn cho
+  cùng mức đồng thời (tiết kiệm bộ nhớ, dùng chung cache license).
+"""
+import math
 import multiprocessing
+import os
+import re
+import time
+
+# File mmap prometheus_client ghi cho mỗi worker: counter_<pid>.db, gauge_livesum_<pid>.db, ...
+PROMETHEUS_FILE = re.compile(r'^(counter|histogram|summary|gauge_[a-z]+)_\d+\.db$')
+
+
+def prepare_metrics_dir(path):
+    """Xóa số liệu của lần chạy trước; bỏ qua nếu thư mục có file không phải của prometheus_client"""
+    os.makedirs(path, exist_ok=True)
+    names = os.listdir(path)
+    foreign = [name for name in names if not PROMETHEUS_FILE.match(name)]
+    if foreign:
+        print(f"⚠️  {path} chứa file khác ngoài metrics ({', '.join(foreign[:3])}...), không dọn thư mục")
+        return
+    for name in names:
+        os.remove(os.path.join(path, name))
+
+
+# Prometheus multiprocess: mỗi worker ghi metrics vào thư mục chung, /metrics gộp lại.
+# Thư mục chỉ được dọn trong on_starting: file config này chạy lại ở mỗi lần
+# reload (SIGHUP) trong khi worker cũ vẫn đang ghi metrics.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/license-admin-metrics')
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def available_cpus():
+    """Số CPU process được dùng: affinity và quota cgroup v2 (container) nếu có"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def available_memory_mb():
+    """Giới hạn bộ nhớ cgroup v2, không có thì RAM vật lý"""
+    try:
+        with open('/sys/fs/cgroup/memory.max') as f:
+            limit = f.read().strip()
+        if limit != 'max':
+            return int(limit) // (1024 * 1024)
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def argon2_seconds():
+    """Thời gian một lần hash Argon2: GUNICORN_ARGON2_MS (mặc định 250ms).
+
+    GUNICORN_MEASURE_ARGON2=1 thì đo thật lúc load config; số đo phụ thuộc tải
+    máy lúc khởi động và chạy lại ở mỗi lần reload của master nên số worker
+    không cố định; dùng để lấy giá trị (dòng log 'argon2=...ms') rồi đặt
+    GUNICORN_ARGON2_MS.
+    """
+    if os.environ.get('GUNICORN_MEASURE_ARGON2') == '1':
+        return measure_argon2_seconds()
+    return float(os.environ.get('GUNICORN_ARGON2_MS', 250)) / 1000
+
+
+def measure_argon2_seconds():
+    """Thời gian một lần hash Argon2 với tham số thật của app"""
+    import argon2
+    from config import Config
+    hasher = argon2.PasswordHasher(
+        time_cost=Config.ARGON2_TIME_COST,
+        memory_cost=Config.ARGON2_MEMORY_COST,
+        parallelism=Config.ARGON2_PARALLELISM
+    )
+    started = time.perf_counter()
+    hasher.hash('gunicorn-sizing')
+    return time.perf_counter() - started
 
-bind = "0.0.0.0:10000"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+
+def plan_workers(worker_class):
+    """(workers, threads) cho mức đồng thời mà CPU và bộ nhớ chịu được"""
+    from config import Config
+    cpus = available_cpus()
+    io_wait = min(max(float(os.environ.get('GUNICORN_IO_WAIT', 0.5)), 0.0), 0.95)
+    login_rate = float(os.environ.get('GUNICORN_LOGIN_RATE', 0.5))  # login/giây lúc cao điểm
+    argon2_time = argon2_seconds()
+
+    # Argon2 giữ trọn một core trong suốt lần hash: số core login chiếm ở cao điểm
+    login_cores = min(max(cpus - 1, 0), login_rate * argon2_time)
+    # Phần còn lại phục vụ validate; mỗi core chạy được 1 / (1 - io_wait) request đang chờ DB
+    per_core = round(1 / (1 - io_wait), 6)
+    validate_cores = max(1.0, cpus - login_cores)
+    concurrency = math.ceil(validate_cores * per_core) + math.ceil(login_cores)
+
+    if worker_class == 'gthread':
+        threads = max(2, min(8, math.ceil(per_core)))
+        workers = max(2, math.ceil(concurrency / threads))
+    else:
+        threads = 1
+        workers = max(2, concurrency)
+
+    # Mỗi worker: phần riêng (cache, kết nối) + Argon2 memory_cost cho mỗi login đồng thời
+    # (LOGIN_MAX_CONCURRENT là giới hạn mỗi process, không vượt số thread của worker)
+    worker_mb = float(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 60))
+    worker_mb += Config.ARGON2_MEMORY_COST / 1024 * min(Config.LOGIN_MAX_CONCURRENT, threads)
+    budget_mb = float(os.environ.get('GUNICORN_MEMORY_BUDGET_MB', 0)) or (available_memory_mb() or 0) * 0.75
+    if budget_mb:
+        workers = max(1, min(workers, int(budget_mb // worker_mb)))
+
+    print(
+        f"✅ gunicorn: {workers} {worker_class} worker(s) x {threads} thread(s) "
+        f"(cpus={cpus}, io_wait={io_wait}, argon2={argon2_time * 1000:.0f}ms, "
+        f"memory/worker≈{worker_mb:.0f}MB, budget={budget_mb:.0f}MB)"
+    )
+    return workers, threads
+
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+if preload_app:
+    # Phải đặt trước lần import config.py đầu tiên (Config đọc env khi import)
+    os.environ['PRELOAD_APP'] = '1'
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:10000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+if os.environ.get('WEB_CONCURRENCY'):
+    workers = int(os.environ['WEB_CONCURRENCY'])
+    threads = int(os.environ.get('GUNICORN_THREADS', 1))
+else:
+    workers, threads = plan_workers(worker_class)
+    threads = int(os.environ.get('GUNICORN_THREADS', threads))
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
 timeout = 120
+graceful_timeout = 30
 keepalive = 5
+
+def on_starting(server):
+    # Chạy một lần khi master khởi động (không chạy lại khi reload). Với preload_app
+    # master đã import app, nhưng file metrics của master chỉ chứa giá trị 0: worker
+    # sau fork ghi vào file theo pid của chính nó.
+    prepare_metrics_dir(metrics_dir)
+
+def post_fork(server, worker):
+    # Kết nối DB, thread nền (expiry sweeper) của riêng worker; không preload thì import app ở đây
+    from app import init_worker
+    init_worker()
+
+def worker_exit(server, worker):
+    # Ghi nốt last_check và audit log còn trong bộ nhớ, nhả lease sweeper để worker khác nhận ngay.
+    # Worker gunicorn thoát bằng os._exit nên atexit (audit_log.close) không chạy.
+    from app import last_check_writer, expiry_sweeper, audit_log
+    expiry_sweeper.close()
+    last_check_writer.close()
+    audit_log.close()
+
+def child_exit(server, worker):
+    # Dọn file metrics của worker đã thoát
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
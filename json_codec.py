@@ -0,0 +1,59 @@
+"""Encode/decode JSON cho response API.
+
+Dùng orjson nếu đã cài (nhanh hơn nhiều, ra thẳng bytes UTF-8), ngược lại
+quay về json của stdlib; cả hai ra JSON compact, giữ thứ tự key. Kiểu không
+phải JSON gốc (date, Decimal, UUID, dataclass) đi qua
+DefaultJSONProvider.default (API công khai của Flask) như jsonify trước đây.
+
+FastJSONProvider gắn vào app.json nên jsonify, request.json của Flask cũng
+dùng encoder này.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+_default = DefaultJSONProvider.default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(obj):
+        """obj -> bytes JSON"""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        """obj -> bytes JSON"""
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    loads = json.loads
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+class FastJSONProvider(JSONProvider):
+    """JSON provider của Flask (app.json) dùng dumps/loads ở trên"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # Cùng quy tắc với jsonify: một đối số -> chính nó, nhiều đối số -> list, kwargs -> dict
+        if args and kwargs:
+            raise TypeError('app.json.response() takes either args or kwargs, not both')
+        if len(args) == 1:
+            obj = args[0]
+        else:
+            obj = list(args) or kwargs or None
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
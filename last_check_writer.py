@@ -0,0 +1,103 @@
+import os
+import threading
+
+
+class LastCheckWriter:
+    """Gom các lần cập nhật last_check rồi ghi theo lô.
+
+    Mỗi license_key chỉ giữ timestamp mới nhất; một thread nền gọi
+    `write([(checked_at, license_key), ...])` (một executemany trong một
+    transaction) sau mỗi `interval` giây hoặc khi số key chờ ghi đạt
+    `max_pending`.
+    """
+
+    def __init__(self, write, interval=5.0, max_pending=1000):
+        self.write = write
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.flushes = 0
+        self.written = 0
+
+    def record(self, license_key, checked_at):
+        with self._lock:
+            self._pending[license_key] = checked_at
+            pending = len(self._pending)
+        self._ensure_thread()
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def discard(self, license_key):
+        """Bỏ timestamp đang chờ (vd: khi admin reset license)"""
+        with self._lock:
+            self._pending.pop(license_key, None)
+
+    def discard_many(self, license_keys):
+        with self._lock:
+            for license_key in license_keys:
+                self._pending.pop(license_key, None)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+
+        with self._flush_lock:
+            try:
+                self.write([(checked_at, key) for key, checked_at in batch.items()])
+            except Exception as e:
+                print(f"❌ Lỗi khi ghi last_check ({len(batch)} keys): {e}")
+                # Trả lại các key chưa có timestamp mới hơn để lần sau ghi tiếp
+                with self._lock:
+                    for key, checked_at in batch.items():
+                        self._pending.setdefault(key, checked_at)
+                return 0
+
+        self.flushes += 1
+        self.written += len(batch)
+        return len(batch)
+
+    def close(self):
+        """Ghi nốt dữ liệu còn lại, gọi khi worker tắt"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'written': self.written,
+            'interval': self.interval,
+            'max_pending': self.max_pending
+        }
+
+    def _ensure_thread(self):
+        # Thread được tạo lười và tạo lại sau khi fork (gunicorn worker)
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='last-check-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
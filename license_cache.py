@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LicenseCache:
+    """LRU + TTL cache cho LicenseRecord, dùng riêng trong mỗi worker.
+
+    Các route admin gọi invalidate() khi thay đổi một key. `version` (hàm trả
+    về bộ đếm dùng chung giữa các worker, vd DataVersion trong shared memory)
+    được bump sau mỗi thay đổi đó: worker nào thấy bộ đếm khác lần trước thì
+    bỏ toàn bộ cache của mình, nên khóa / thu hồi / reset có hiệu lực ngay trên
+    mọi worker. Không có `version` (hoặc nhiều host) thì worker khác chỉ thấy
+    thay đổi sau khi entry hết TTL.
+    """
+
+    def __init__(self, max_size=10000, ttl=30, version=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = version
+        self._seen = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.resets = 0
+
+    def current_version(self):
+        """Đọc trước khi query DB rồi truyền cho put(): bản đọc trước một lần bump không được cache"""
+        return self.version() if self.version is not None else None
+
+    def _sync(self, current):
+        # Gọi khi đang giữ _lock
+        if current != self._seen:
+            if self._entries:
+                self._entries.clear()
+                self.resets += 1
+            self._seen = current
+
+    def get(self, license_key):
+        current = self.current_version()
+        with self._lock:
+            self._sync(current)
+            entry = self._entries.get(license_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, record = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[license_key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(license_key)
+            self.hits += 1
+            return record
+
+    def put(self, license_key, record, seen=None):
+        """seen: current_version() đọc trước khi lấy record từ DB"""
+        if self.max_size <= 0:
+            return
+        current = self.current_version()
+        with self._lock:
+            self._sync(current)
+            if seen is not None and seen != current:
+                return  # DB đã đổi sau khi record được đọc
+            self._entries[license_key] = (time.monotonic(), record)
+            self._entries.move_to_end(license_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, license_key):
+        with self._lock:
+            self._entries.pop(license_key, None)
+
+    def invalidate_many(self, license_keys):
+        with self._lock:
+            for license_key in license_keys:
+                self._entries.pop(license_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'resets': self.resets,
+                'version': self._seen
+            }
+
+
+class CachedValue:
+    """Giữ một giá trị tính sẵn trong `ttl` giây (vd: kết quả /api/admin/stats)"""
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._value = None
+        self._stored_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._stored_at <= self.ttl:
+                self.hits += 1
+                return self._value
+            self.misses += 1
+            return None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._stored_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._value = None
@@ -0,0 +1,151 @@
+"""Dạng lưu gọn của bảng licenses và bộ giải mã dòng.
+
+- status: số nguyên nhỏ (STATUS_*); is_locked không còn là cột riêng mà suy
+  ra từ status (locked / revoked).
+- created_at, expires_at, last_check: epoch giây (thời điểm tuyệt đối).
+
+Định dạng trên API giữ như trước khi đổi schema: created_at là chuỗi
+'YYYY-MM-DD HH:MM:SS' UTC như CURRENT_TIMESTAMP; expires_at / last_check là
+chuỗi không kèm múi giờ 'YYYY-MM-DD HH:MM:SS.ffffff' theo Config.LEGACY_TIMEZONE,
+đúng dạng datetime.now() cũ lưu trong DB (client so sánh thẳng với
+datetime.now()); riêng endpoint tạo license dùng 'T' như isoformat() trước đây.
+
+Cursor đọc licenses dùng row factory trả thẳng LicenseRecord (__slots__),
+không đi qua sqlite3.Row -> dict; to_dict() dựng lại dạng JSON cũ cho API
+(tên status, chuỗi ISO, is_locked 0/1). Trang danh sách / export đọc tuple
+thô và dựng JSON bằng license_row_dict(), không tạo đối tượng cho từng dòng.
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+STATUS_ACTIVE = 0
+STATUS_LOCKED = 1
+STATUS_REVOKED = 2
+STATUS_EXPIRED = 3
+
+STATUS_NAMES = ('active', 'locked', 'revoked', 'expired')
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+# Trạng thái mà trước đây có is_locked = 1
+LOCKED_STATUSES = (STATUS_LOCKED, STATUS_REVOKED)
+
+# Thứ tự cột trong SELECT khớp với LicenseRecord.__slots__
+LICENSE_COLUMNS = 'id, license_key, hwid, status, created_at, expires_at, last_check, device_info, note, lock_reason'
+
+
+def to_epoch(value):
+    """datetime (giờ địa phương, như datetime.now()) -> epoch giây"""
+    if value is None:
+        return None
+    return int(value.timestamp())
+
+
+@lru_cache(maxsize=1)
+def legacy_zone():
+    """Múi giờ của expires_at / last_check trên API (Config.LEGACY_TIMEZONE, như dữ liệu cũ)"""
+    from config import Config
+    zone = Config.LEGACY_TIMEZONE
+    return timezone.utc if zone.upper() == 'UTC' else ZoneInfo(zone)
+
+
+# License tạo hàng loạt dùng chung created_at / expires_at nên cache theo giá trị epoch
+@lru_cache(maxsize=4096)
+def epoch_to_iso(value, sep=' '):
+    """epoch giây -> 'YYYY-MM-DD HH:MM:SS.ffffff' không múi giờ theo legacy_zone() (expires_at, last_check)"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, legacy_zone()).replace(tzinfo=None).isoformat(sep, 'microseconds')
+
+
+@lru_cache(maxsize=4096)
+def epoch_to_utc_iso(value):
+    """epoch giây -> chuỗi ISO UTC, cùng dạng CURRENT_TIMESTAMP (created_at)"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None).isoformat(' ')
+
+
+def utc_iso_to_epoch(value):
+    """'YYYY-MM-DD[ HH:MM:SS]' (UTC, như created_at trả về) -> epoch giây; ValueError nếu sai"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class LicenseRecord:
+    """Một dòng licenses; cache license giữ thẳng đối tượng này"""
+
+    __slots__ = (
+        'id', 'license_key', 'hwid', 'status', 'created_at', 'expires_at',
+        'last_check', 'device_info', 'note', 'lock_reason'
+    )
+
+    def __init__(self, id, license_key, hwid, status, created_at, expires_at,
+                 last_check, device_info, note, lock_reason):
+        self.id = id
+        self.license_key = license_key
+        self.hwid = hwid
+        self.status = status
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.last_check = last_check
+        self.device_info = device_info
+        self.note = note
+        self.lock_reason = lock_reason
+
+    @property
+    def status_name(self):
+        return STATUS_NAMES[self.status]
+
+    @property
+    def is_locked(self):
+        return self.status in LOCKED_STATUSES
+
+    def bound_to(self, hwid, device_info):
+        """Bản sao sau khi bind HWID (license vừa được kích hoạt, chưa đọc lại từ DB)"""
+        return LicenseRecord(
+            self.id, self.license_key, hwid, self.status, self.created_at, self.expires_at,
+            self.last_check, device_info, self.note, self.lock_reason
+        )
+
+    def to_dict(self):
+        """Dạng JSON của API (giống dict(sqlite3.Row) trước khi đổi schema)"""
+        return license_row_dict((
+            self.id, self.license_key, self.hwid, self.status, self.created_at, self.expires_at,
+            self.last_check, self.device_info, self.note, self.lock_reason
+        ))
+
+
+def license_row_dict(values):
+    """Tuple theo LICENSE_COLUMNS -> dạng JSON của API"""
+    (license_id, license_key, hwid, status, created_at, expires_at,
+     last_check, device_info, note, lock_reason) = values
+    return {
+        'id': license_id,
+        'license_key': license_key,
+        'hwid': hwid,
+        'status': STATUS_NAMES[status],
+        'created_at': epoch_to_utc_iso(created_at),
+        'expires_at': epoch_to_iso(expires_at),
+        'last_check': epoch_to_iso(last_check),
+        'device_info': device_info,
+        'note': note,
+        'is_locked': int(status in LOCKED_STATUSES),
+        'lock_reason': lock_reason
+    }
+
+
+def sqlite_license_row(cursor, row):
+    """row_factory cho sqlite3 cursor"""
+    return LicenseRecord(*row)
+
+
+def _license_from_values(values):
+    return LicenseRecord(*values)
+
+
+def postgres_license_row(cursor):
+    """row_factory cho psycopg cursor"""
+    return _license_from_values
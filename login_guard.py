@@ -0,0 +1,81 @@
+import threading
+import time
+
+import argon2
+
+
+class LoginBusy(Exception):
+    """Số phép verify Argon2 đang chạy đã đạt giới hạn"""
+
+
+class LoginGuard:
+    """Giới hạn chi phí đăng nhập admin.
+
+    - Đếm lần đăng nhập sai trong bảng login_failures (dùng chung cho mọi
+      worker) theo cặp (IP, username) và theo IP với ngưỡng cao hơn; vượt
+      ngưỡng thì bị khóa `lockout` giây và request bị từ chối trước khi tính
+      hash. Không khóa theo riêng username: người ngoài gửi sai mật khẩu không
+      khóa được tài khoản admin từ IP khác.
+    - Verify/hash Argon2 chạy ngay trên thread của request, tối đa
+      `max_concurrent` phép tính cùng lúc trong một process (giới hạn theo
+      process, không phải toàn server: worker sync chỉ có một request mỗi lúc
+      nên giới hạn chỉ có tác dụng với gthread / ASGI). Tổng bộ nhớ Argon2 lúc
+      cao điểm là số worker x min(max_concurrent, số thread) x memory_cost.
+    """
+
+    def __init__(self, hasher, max_concurrent=2, queue_timeout=2.0,
+                 max_failures=10, max_failures_per_ip=30, window=300, lockout=300):
+        self.hasher = hasher
+        self.queue_timeout = queue_timeout
+        self.max_failures = max_failures
+        self.max_failures_per_ip = max_failures_per_ip
+        self.window = window
+        self.lockout = lockout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    # ============== FAILURE LIMITER ==============
+    def limits(self, ip, username):
+        """{khóa trong login_failures: số lần sai tối đa} cho một lần đăng nhập"""
+        return {
+            f"ip:{ip}": self.max_failures_per_ip,
+            f"ip_user:{ip}:{username}": self.max_failures
+        }
+
+    def blocked_for(self, repo, limits):
+        """Số giây còn bị khóa (0 nếu không bị khóa)"""
+        remaining = repo.login_locked_until(list(limits)) - time.time()
+        return int(remaining) + 1 if remaining > 0 else 0
+
+    def record_failure(self, repo, limits):
+        repo.record_login_failures(limits, time.time(), self.window, self.lockout)
+
+    def record_success(self, repo, limits):
+        repo.clear_login_failures(list(limits))
+
+    # ============== ARGON2 ==============
+    def verify(self, password_hash, password):
+        """True nếu đúng mật khẩu; raise LoginBusy nếu đã đủ số phép Argon2 đồng thời"""
+        try:
+            return self._run(self.hasher.verify, password_hash, password)
+        except (argon2.exceptions.VerifyMismatchError,
+                argon2.exceptions.VerificationError,
+                argon2.exceptions.InvalidHashError):
+            return False
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Hash được tạo với tham số cũ (time/memory/parallelism) thì cần hash lại"""
+        try:
+            return self.hasher.check_needs_rehash(password_hash)
+        except argon2.exceptions.InvalidHashError:
+            return True
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise LoginBusy()
+        try:
+            return fn(*args)
+        finally:
+            self._slots.release()
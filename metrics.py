@@ -0,0 +1,172 @@
+"""Đo latency theo route, số câu SQL / thời gian SQLite mỗi request, số commit
+và tỉ lệ hit của cache; xuất ra dạng Prometheus text ở /metrics.
+
+Khi biến môi trường PROMETHEUS_MULTIPROC_DIR được đặt (gunicorn.conf.py và asgi.py tự đặt),
+mỗi worker ghi số liệu vào file mmap trong thư mục đó và /metrics gộp số liệu
+của tất cả worker bằng MultiProcessCollector.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from flask import Response, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by route',
+    ['endpoint', 'method', 'status'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    'http_request_db_statements', 'SQL statements executed per request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 100)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time spent in SQLite per request',
+    ['endpoint'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+)
+DB_STATEMENTS = Counter('db_statements_total', 'SQL statements executed')
+DB_COMMITS = Counter('db_commits_total', 'SQLite commits')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups', ['cache', 'result'])
+RATE_LIMITED = Counter('rate_limited_requests_total', 'Client requests shed with 429', ['scope'])
+
+_request = threading.local()
+_caches = {}
+_cache_seen = {}
+_cache_lock = threading.Lock()
+
+
+# ============== SQLITE INSTRUMENTATION ==============
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            _record_statement(time.perf_counter() - started)
+
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            _record_statement(time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Truyền vào sqlite3.connect(factory=...) để đếm câu lệnh, thời gian và commit.
+
+    Connection.execute/executemany của sqlite3 tạo cursor qua self.cursor(),
+    nên chỉ cần thay cursor factory.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            DB_COMMITS.inc()
+            if getattr(_request, 'active', False):
+                _request.db_time += time.perf_counter() - started
+
+
+def _record_statement(elapsed):
+    DB_STATEMENTS.inc()
+    if getattr(_request, 'active', False):
+        _request.statements += 1
+        _request.db_time += elapsed
+
+
+# ============== CACHE HIT RATIO ==============
+def register_cache(name, cache):
+    """Đăng ký cache có thuộc tính hits/misses; số liệu được đồng bộ sau mỗi request"""
+    _caches[name] = cache
+    _cache_seen[name] = (0, 0)
+
+
+def _sync_caches():
+    with _cache_lock:
+        for name, cache in _caches.items():
+            hits, misses = cache.hits, cache.misses
+            seen_hits, seen_misses = _cache_seen[name]
+            if hits < seen_hits or misses < seen_misses:
+                # Cache được tạo lại (vd: sau fork) -> đếm lại từ đầu
+                seen_hits = seen_misses = 0
+            if hits != seen_hits:
+                CACHE_REQUESTS.labels(name, 'hit').inc(hits - seen_hits)
+            if misses != seen_misses:
+                CACHE_REQUESTS.labels(name, 'miss').inc(misses - seen_misses)
+            _cache_seen[name] = (hits, misses)
+
+
+# ============== REQUEST TRACKING ==============
+def begin_request():
+    _request.active = True
+    _request.started = time.perf_counter()
+    _request.statements = 0
+    _request.db_time = 0.0
+
+
+def end_request(endpoint, method, status):
+    if not getattr(_request, 'active', False):
+        return
+    _request.active = False
+    REQUEST_LATENCY.labels(endpoint, method, str(status)).observe(
+        time.perf_counter() - _request.started
+    )
+    REQUEST_DB_STATEMENTS.labels(endpoint).observe(_request.statements)
+    REQUEST_DB_SECONDS.labels(endpoint).observe(_request.db_time)
+    _sync_caches()
+
+
+def init_app(app, token='', authorize=None, public=False):
+    """Gắn before/after_request và route /metrics vào Flask app.
+
+    /metrics cần `Authorization: Bearer <token>` hoặc authorize() trả True
+    (API key admin); public=True thì không cần xác thực.
+    """
+
+    @app.before_request
+    def _start_request_timer():
+        begin_request()
+
+    @app.after_request
+    def _record_request(response):
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        end_request(rule, request.method, response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        allowed = (
+            public
+            or (token and request.headers.get('Authorization') == f'Bearer {token}')
+            or (authorize is not None and authorize())
+        )
+        if not allowed:
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        _sync_caches()
+        return Response(render(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def render():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead(pid):
+    """Gọi từ gunicorn child_exit để dọn file mmap của worker đã chết"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
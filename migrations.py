@@ -0,0 +1,1084 @@
+"""Migration schema có đánh số phiên bản cho SQLite (app.py) và PostgreSQL (database.py).
+
+Mỗi bước là (version, name, steps); steps là danh sách câu SQL hoặc hàm nhận
+connection. Các bước chạy theo thứ tự khi khởi động, mỗi bước một transaction,
+và được ghi vào bảng schema_version để không chạy lại.
+"""
+import math
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+def add_column_if_missing(table, column, definition):
+    """Bước migration thêm cột, bỏ qua nếu cột đã tồn tại"""
+    def step(conn):
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+def _rename_legacy_api_keys(conn):
+    """api_keys kiểu cũ (key_name/server_key/api_key) -> api_keys_legacy, tạo bảng mới.
+
+    Key cũ không được chuyển sang bảng mới: chúng chưa từng là admin key nên
+    không tự động cấp quyền admin; dữ liệu vẫn còn trong api_keys_legacy.
+    """
+    from psycopg.rows import tuple_row
+    cursor = conn.cursor(row_factory=tuple_row)
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'api_keys' AND column_name = 'server_key'"
+    )
+    if cursor.fetchone() is None:
+        return
+    cursor.execute("ALTER TABLE api_keys RENAME TO api_keys_legacy")
+    for index in ('idx_api_keys_status', 'idx_api_keys_created', 'idx_api_keys_status_created'):
+        cursor.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy")
+    cursor.execute(POSTGRES_TABLES[2])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_status ON api_keys(status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_created ON api_keys(created_at DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_status_created ON api_keys(status, created_at DESC)")
+    print("⚠️  Legacy api_keys table renamed to api_keys_legacy")
+
+
+def _partition_activity_logs(conn):
+    """activity_logs thường -> bảng PARTITION BY RANGE (performed_at), chuyển log cũ sang"""
+    from psycopg.rows import tuple_row
+    from audit_partitions import period_of, postgres_partition_ddl
+    from config import Config
+    cursor = conn.cursor(row_factory=tuple_row)
+    cursor.execute(
+        "SELECT relkind FROM pg_class WHERE relname = 'activity_logs' AND relnamespace = current_schema()::regnamespace"
+    )
+    row = cursor.fetchone()
+    if row is not None and row[0] == 'p':
+        return
+    if row is not None:
+        cursor.execute("ALTER TABLE activity_logs RENAME TO activity_logs_legacy")
+        cursor.execute("ALTER SEQUENCE IF EXISTS activity_logs_id_seq RENAME TO activity_logs_legacy_id_seq")
+        for index in ('idx_activity_logs_key_id', 'idx_activity_logs_performed', 'idx_activity_logs_performed_id'):
+            cursor.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy")
+
+    # Không có partition DEFAULT: repository tạo partition cho từng kỳ trước khi ghi
+    cursor.execute('''
+        CREATE TABLE activity_logs (
+            id BIGSERIAL,
+            key_id INTEGER,
+            action VARCHAR(100) NOT NULL,
+            details TEXT,
+            performed_at TIMESTAMP NOT NULL DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            ip_address VARCHAR(45),
+            license_key TEXT
+        ) PARTITION BY RANGE (performed_at)
+    ''')
+    cursor.execute("CREATE INDEX idx_activity_logs_performed_id ON activity_logs(performed_at DESC, id DESC)")
+    cursor.execute("CREATE INDEX idx_activity_logs_key_id ON activity_logs(key_id)")
+    if row is None:
+        return
+
+    cursor.execute("SELECT DISTINCT date_trunc('day', performed_at) FROM activity_logs_legacy WHERE performed_at IS NOT NULL")
+    for period in {period_of(day.isoformat(' '), Config.AUDIT_LOG_PARTITION) for (day,) in cursor.fetchall()}:
+        cursor.execute(postgres_partition_ddl(period))
+    cursor.execute('''
+        INSERT INTO activity_logs (key_id, action, details, performed_at, ip_address, license_key)
+        SELECT key_id, action, details, performed_at, ip_address, license_key
+        FROM activity_logs_legacy
+        WHERE performed_at IS NOT NULL
+        ORDER BY id
+    ''')
+    print(f"✅ Moved {cursor.rowcount} activity logs into partitioned activity_logs")
+    cursor.execute("DROP TABLE activity_logs_legacy")
+
+
+# expires_at / last_check cũ là datetime.now() không kèm múi giờ. Cả hai backend đổi sang epoch
+# theo cùng một múi giờ khai báo (Config.LEGACY_TIMEZONE), không theo giờ địa phương của
+# process (SQLite 'utc' modifier) hay TimeZone của session PostgreSQL
+def legacy_timezone():
+    from config import Config
+    return Config.LEGACY_TIMEZONE
+
+
+def legacy_epoch(value, zone):
+    """Chuỗi ISO không kèm múi giờ (hiểu theo zone) -> epoch giây; số giữ nguyên, chuỗi lỗi -> None"""
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc if zone.upper() == 'UTC' else ZoneInfo(zone))
+    return math.floor(parsed.timestamp())
+
+
+def _register_legacy_epoch(conn):
+    """Hàm SQL legacy_epoch(column) cho migration SQLite (strftime chỉ biết UTC / giờ địa phương)"""
+    zone = legacy_timezone()
+    conn.create_function('legacy_epoch', 1, lambda value: legacy_epoch(value, zone), deterministic=True)
+
+
+def _sqlite_expires_epoch(conn):
+    """expires_at: chuỗi ISO -> epoch giây, so sánh số nguyên trên index"""
+    _register_legacy_epoch(conn)
+    conn.execute("UPDATE licenses SET expires_at = legacy_epoch(expires_at) WHERE typeof(expires_at) = 'text'")
+
+
+def _postgres_legacy_epoch(column):
+    """TIMESTAMP (không múi giờ) -> epoch giây theo Config.LEGACY_TIMEZONE; DDL không nhận tham số bind"""
+    from psycopg import sql
+    return sql.SQL("FLOOR(EXTRACT(EPOCH FROM {column} AT TIME ZONE {zone}))::BIGINT").format(
+        column=sql.Identifier(column), zone=sql.Literal(legacy_timezone())
+    )
+
+
+def _licenses_expires_epoch(conn):
+    """licenses.expires_at TIMESTAMP -> BIGINT epoch giây (theo Config.LEGACY_TIMEZONE)"""
+    from psycopg import sql
+    from psycopg.rows import tuple_row
+    cursor = conn.cursor(row_factory=tuple_row)
+    cursor.execute(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'licenses' AND column_name = 'expires_at'"
+    )
+    row = cursor.fetchone()
+    if row is None or row[0] == 'bigint':
+        return
+    cursor.execute(sql.SQL("ALTER TABLE licenses ALTER COLUMN expires_at TYPE BIGINT USING {}").format(
+        _postgres_legacy_epoch('expires_at')
+    ))
+
+
+# Bảng licenses dạng gọn (license_record.py): status là số nguyên nhỏ, is_locked
+# suy ra từ status, mọi timestamp là epoch giây
+SQLITE_COMPACT_LICENSES = '''
+    CREATE TABLE licenses_compact (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        license_key TEXT UNIQUE NOT NULL,
+        hwid TEXT,
+        status INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        expires_at INTEGER,
+        last_check INTEGER,
+        device_info TEXT,
+        note TEXT,
+        lock_reason TEXT
+    )
+'''
+
+# 'active' -> 0, 'locked' (hoặc is_locked = 1) -> 1, 'revoked' -> 2, 'expired' -> 3;
+# status lạ trước đây bị coi là không hợp lệ nên chuyển thành locked
+LEGACY_STATUS_CODE_SQL = '''
+    CASE
+        WHEN status = 'revoked' THEN 2
+        WHEN is_locked = 1 OR status = 'locked' THEN 1
+        WHEN status = 'expired' THEN 3
+        WHEN status = 'active' THEN 0
+        ELSE 1
+    END
+'''
+
+SQLITE_COMPACT_LICENSE_TRIGGERS = [
+    '''
+    CREATE TRIGGER trg_licenses_counters_insert
+    AFTER INSERT ON licenses
+    BEGIN
+        UPDATE license_counters SET value = value + CASE name
+            WHEN 'total' THEN 1
+            WHEN 'active' THEN (NEW.status = 0)
+            WHEN 'locked' THEN (NEW.status IN (1, 2))
+            WHEN 'expired' THEN (NEW.status = 3)
+            ELSE 0
+        END;
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_licenses_counters_delete
+    AFTER DELETE ON licenses
+    BEGIN
+        UPDATE license_counters SET value = value - CASE name
+            WHEN 'total' THEN 1
+            WHEN 'active' THEN (OLD.status = 0)
+            WHEN 'locked' THEN (OLD.status IN (1, 2))
+            WHEN 'expired' THEN (OLD.status = 3)
+            ELSE 0
+        END;
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_licenses_counters_update
+    AFTER UPDATE OF status ON licenses
+    BEGIN
+        UPDATE license_counters SET value = value + CASE name
+            WHEN 'total' THEN 0
+            WHEN 'active' THEN (NEW.status = 0) - (OLD.status = 0)
+            WHEN 'locked' THEN (NEW.status IN (1, 2)) - (OLD.status IN (1, 2))
+            WHEN 'expired' THEN (NEW.status = 3) - (OLD.status = 3)
+            ELSE 0
+        END;
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_license_revocations_update
+    AFTER UPDATE OF status, hwid ON licenses
+    WHEN (NEW.status IN (1, 2) AND OLD.status NOT IN (1, 2))
+      OR (OLD.status = 0 AND NEW.status != 0)
+      OR (COALESCE(OLD.hwid, '') != '' AND COALESCE(NEW.hwid, '') != OLD.hwid)
+    BEGIN
+        INSERT INTO license_revocations (license_key, reason, created_at)
+        VALUES (
+            NEW.license_key,
+            CASE
+                WHEN NEW.status IN (1, 2) AND OLD.status NOT IN (1, 2) THEN 'locked'
+                WHEN OLD.status = 0 AND NEW.status != 0 THEN 'expired'
+                ELSE 'hwid_reset'
+            END,
+            CAST(strftime('%s', 'now') AS INTEGER)
+        );
+    END
+    ''',
+    '''
+    CREATE TRIGGER trg_license_revocations_delete
+    AFTER DELETE ON licenses
+    BEGIN
+        INSERT INTO license_revocations (license_key, reason, created_at)
+        VALUES (OLD.license_key, 'deleted', CAST(strftime('%s', 'now') AS INTEGER));
+    END
+    ''',
+]
+
+LICENSE_COUNTERS_RESEED = '''
+    SELECT 'total', COUNT(*) FROM licenses
+    UNION ALL SELECT 'active', COUNT(*) FROM licenses WHERE status = 0
+    UNION ALL SELECT 'locked', COUNT(*) FROM licenses WHERE status IN (1, 2)
+    UNION ALL SELECT 'expired', COUNT(*) FROM licenses WHERE status = 3
+'''
+
+
+def _sqlite_epoch(column):
+    # Chuỗi ISO UTC (CURRENT_TIMESTAMP) -> epoch giây; giá trị đã là số được giữ nguyên
+    return (
+        f"CASE WHEN typeof({column}) = 'text' "
+        f"THEN CAST(strftime('%s', {column}) AS INTEGER) ELSE {column} END"
+    )
+
+
+def _compact_sqlite_licenses(conn):
+    """Dựng lại bảng licenses theo dạng gọn, chuyển dữ liệu cũ trong cùng transaction"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(licenses)")]
+    if 'is_locked' not in columns:
+        return
+    _register_legacy_epoch(conn)
+    conn.execute(SQLITE_COMPACT_LICENSES)
+    conn.execute(f'''
+        INSERT INTO licenses_compact (
+            id, license_key, hwid, status, created_at, expires_at, last_check, device_info, note, lock_reason
+        )
+        SELECT
+            id, license_key, hwid, {LEGACY_STATUS_CODE_SQL},
+            COALESCE({_sqlite_epoch('created_at')}, CAST(strftime('%s', 'now') AS INTEGER)),
+            legacy_epoch(expires_at),
+            legacy_epoch(last_check),
+            device_info, note, lock_reason
+        FROM licenses
+    ''')
+    # DROP TABLE xóa luôn index và trigger cũ (tham chiếu is_locked / status dạng chuỗi)
+    conn.execute("DROP TABLE licenses")
+    conn.execute("ALTER TABLE licenses_compact RENAME TO licenses")
+    for ddl in (
+        "CREATE INDEX idx_licenses_created ON licenses(created_at DESC, id DESC)",
+        # Thay cho idx_licenses_status / idx_licenses_locked: status = ? và status IN (...) dùng phần đầu
+        "CREATE INDEX idx_licenses_status_expires ON licenses(status, expires_at)",
+        "CREATE INDEX idx_licenses_expires ON licenses(expires_at)",
+        *SQLITE_COMPACT_LICENSE_TRIGGERS,
+        "INSERT OR REPLACE INTO license_counters (name, value) " + LICENSE_COUNTERS_RESEED,
+    ):
+        conn.execute(ddl)
+
+
+def _compact_postgres_licenses(conn):
+    """status TEXT + is_locked -> SMALLINT, created_at / last_check TIMESTAMP -> BIGINT epoch"""
+    from psycopg import sql
+    from psycopg.rows import tuple_row
+    cursor = conn.cursor(row_factory=tuple_row)
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'licenses' AND column_name = 'is_locked'"
+    )
+    if cursor.fetchone() is None:
+        return
+    # Trigger có danh sách cột và index trên is_locked chặn ALTER TYPE / DROP COLUMN
+    cursor.execute("DROP TRIGGER IF EXISTS trg_license_revocations_update ON licenses")
+    cursor.execute("DROP INDEX IF EXISTS idx_licenses_locked")
+    cursor.execute("DROP INDEX IF EXISTS idx_licenses_status")
+    cursor.execute(sql.SQL(f'''
+        ALTER TABLE licenses
+            ALTER COLUMN status DROP DEFAULT,
+            ALTER COLUMN status TYPE SMALLINT USING {LEGACY_STATUS_CODE_SQL},
+            ALTER COLUMN status SET DEFAULT 0,
+            ALTER COLUMN status SET NOT NULL,
+            ALTER COLUMN created_at DROP DEFAULT,
+            ALTER COLUMN created_at TYPE BIGINT USING COALESCE(
+                FLOOR(EXTRACT(EPOCH FROM created_at AT TIME ZONE 'UTC'))::BIGINT,
+                FLOOR(EXTRACT(EPOCH FROM now()))::BIGINT
+            ),
+            ALTER COLUMN created_at SET DEFAULT FLOOR(EXTRACT(EPOCH FROM now()))::BIGINT,
+            ALTER COLUMN created_at SET NOT NULL,
+            ALTER COLUMN last_check TYPE BIGINT USING {{last_check}}
+    ''').format(last_check=_postgres_legacy_epoch('last_check')))
+    cursor.execute("ALTER TABLE licenses DROP COLUMN is_locked")
+
+
+def _hash_plaintext_api_keys(conn):
+    from api_key_index import hash_api_key, mask_api_key
+    rows = conn.execute(
+        "SELECT id, key FROM api_keys WHERE key_masked IS NULL"
+    ).fetchall()
+    conn.executemany(
+        "UPDATE api_keys SET key = ?, key_masked = ? WHERE id = ?",
+        [(hash_api_key(key), mask_api_key(key), key_id) for key_id, key in rows]
+    )
+
+
+SQLITE_MIGRATIONS = [
+    (1, 'licenses_access_path_indexes', [
+        # get_all_licenses: ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_licenses_created ON licenses(created_at DESC, id DESC)",
+        # get_stats: lọc theo status / is_locked / expires_at
+        "CREATE INDEX IF NOT EXISTS idx_licenses_status ON licenses(status)",
+        "CREATE INDEX IF NOT EXISTS idx_licenses_locked ON licenses(is_locked)",
+        "CREATE INDEX IF NOT EXISTS idx_licenses_expires ON licenses(expires_at)",
+    ]),
+    (2, 'license_counters', [
+        # Bộ đếm cho /api/admin/stats, được trigger cập nhật trong cùng transaction
+        '''
+        CREATE TABLE IF NOT EXISTS license_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO license_counters (name, value)
+        SELECT 'total', COUNT(*) FROM licenses
+        UNION ALL SELECT 'active', COALESCE(SUM(status = 'active'), 0) FROM licenses
+        UNION ALL SELECT 'locked', COALESCE(SUM(is_locked = 1), 0) FROM licenses
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_licenses_counters_insert
+        AFTER INSERT ON licenses
+        BEGIN
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN 1
+                WHEN 'active' THEN (NEW.status = 'active')
+                WHEN 'locked' THEN (NEW.is_locked = 1)
+            END;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_licenses_counters_delete
+        AFTER DELETE ON licenses
+        BEGIN
+            UPDATE license_counters SET value = value - CASE name
+                WHEN 'total' THEN 1
+                WHEN 'active' THEN (OLD.status = 'active')
+                WHEN 'locked' THEN (OLD.is_locked = 1)
+            END;
+        END
+        ''',
+        # Chỉ chạy khi status/is_locked đổi, không ảnh hưởng cập nhật last_check
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_licenses_counters_update
+        AFTER UPDATE OF status, is_locked ON licenses
+        BEGIN
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN 0
+                WHEN 'active' THEN (NEW.status = 'active') - (OLD.status = 'active')
+                WHEN 'locked' THEN (NEW.is_locked = 1) - (OLD.is_locked = 1)
+            END;
+        END
+        ''',
+    ]),
+    (3, 'hashed_api_keys', [
+        # app_meta giữ các bộ đếm generation để worker biết khi nào phải nạp lại cache
+        '''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO app_meta (name, value) VALUES ('api_keys_generation', 0)",
+        # Cột key giờ chứa SHA-256 digest, key_masked để hiển thị
+        add_column_if_missing('api_keys', 'key_masked', 'TEXT'),
+        _hash_plaintext_api_keys,
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_api_keys_generation_insert
+        AFTER INSERT ON api_keys
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE name = 'api_keys_generation';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_api_keys_generation_update
+        AFTER UPDATE ON api_keys
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE name = 'api_keys_generation';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_api_keys_generation_delete
+        AFTER DELETE ON api_keys
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE name = 'api_keys_generation';
+        END
+        ''',
+    ]),
+    (4, 'login_failures', [
+        # Đếm đăng nhập sai theo 'ip:<addr>' / 'user:<name>' (login_guard.py)
+        '''
+        CREATE TABLE IF NOT EXISTS login_failures (
+            key TEXT PRIMARY KEY,
+            failures INTEGER NOT NULL DEFAULT 0,
+            first_failure REAL NOT NULL,
+            locked_until REAL
+        )
+        ''',
+    ]),
+    (5, 'license_revocations', [
+        # Nhật ký thu hồi cho offline license token: version tăng dần, client
+        # lấy phần mới qua /api/client/revocations?since=<version>
+        '''
+        CREATE TABLE IF NOT EXISTS license_revocations (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            license_key TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_license_revocations_created ON license_revocations(created_at)",
+        # Lock, chuyển khỏi 'active', đổi/reset HWID và xóa đều làm token đã cấp mất hiệu lực
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_license_revocations_update
+        AFTER UPDATE OF status, is_locked, hwid ON licenses
+        WHEN (NEW.is_locked = 1 AND OLD.is_locked != 1)
+          OR (OLD.status = 'active' AND NEW.status != 'active')
+          OR (COALESCE(OLD.hwid, '') != '' AND COALESCE(NEW.hwid, '') != OLD.hwid)
+        BEGIN
+            INSERT INTO license_revocations (license_key, reason, created_at)
+            VALUES (
+                NEW.license_key,
+                CASE
+                    WHEN NEW.is_locked = 1 AND OLD.is_locked != 1 THEN 'locked'
+                    WHEN OLD.status = 'active' AND NEW.status != 'active' THEN NEW.status
+                    ELSE 'hwid_reset'
+                END,
+                CAST(strftime('%s', 'now') AS INTEGER)
+            );
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_license_revocations_delete
+        AFTER DELETE ON licenses
+        BEGIN
+            INSERT INTO license_revocations (license_key, reason, created_at)
+            VALUES (OLD.license_key, 'deleted', CAST(strftime('%s', 'now') AS INTEGER));
+        END
+        ''',
+    ]),
+    (6, 'api_key_status_activity_logs', [
+        # Cùng schema với PostgreSQL để repository.py dùng chung câu SQL
+        add_column_if_missing('api_keys', 'status', "TEXT DEFAULT 'active'"),
+        add_column_if_missing('api_keys', 'notes', 'TEXT'),
+        '''
+        CREATE TABLE IF NOT EXISTS activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key_id INTEGER,
+            action TEXT NOT NULL,
+            details TEXT,
+            performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_api_keys_status_created ON api_keys(status, created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_key_id ON activity_logs(key_id)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_performed ON activity_logs(performed_at DESC)",
+    ]),
+    (7, 'audit_log_pipeline', [
+        # Audit log ghi cả sự kiện license (admin + validate)
+        add_column_if_missing('activity_logs', 'license_key', 'TEXT'),
+        # ActivityLog.get_recent: keyset (performed_at, id) giảm dần
+        "DROP INDEX IF EXISTS idx_activity_logs_performed",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_performed_id ON activity_logs(performed_at DESC, id DESC)",
+    ]),
+    (8, 'audit_log_partitions', [
+        # Log theo sự kiện nằm trong file partition (audit_partitions.py);
+        # kỳ đã đóng được gộp vào đây theo ngày / license / action
+        '''
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            day TEXT NOT NULL,
+            license_key TEXT NOT NULL DEFAULT '',
+            action TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (day, license_key, action)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_activity_daily_license ON activity_daily(license_key, day)",
+        '''
+        CREATE TABLE IF NOT EXISTS activity_rollups (
+            period TEXT PRIMARY KEY,
+            daily_rows INTEGER NOT NULL,
+            rolled_up_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (9, 'license_expiry_sweeper', [
+        _sqlite_expires_epoch,
+        # expiry_sweeper.py: status = 'active' AND expires_at < now, theo thứ tự expires_at
+        "CREATE INDEX IF NOT EXISTS idx_licenses_status_expires ON licenses(status, expires_at)",
+        # Bộ đếm 'expired' cho /api/admin/stats thay cho query đếm license hết hạn
+        '''
+        INSERT OR REPLACE INTO license_counters (name, value)
+        SELECT 'expired', COALESCE(SUM(status = 'expired'), 0) FROM licenses
+        ''',
+        "DROP TRIGGER IF EXISTS trg_licenses_counters_insert",
+        '''
+        CREATE TRIGGER trg_licenses_counters_insert
+        AFTER INSERT ON licenses
+        BEGIN
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN 1
+                WHEN 'active' THEN (NEW.status = 'active')
+                WHEN 'locked' THEN (NEW.is_locked = 1)
+                WHEN 'expired' THEN (NEW.status = 'expired')
+                ELSE 0
+            END;
+        END
+        ''',
+        "DROP TRIGGER IF EXISTS trg_licenses_counters_delete",
+        '''
+        CREATE TRIGGER trg_licenses_counters_delete
+        AFTER DELETE ON licenses
+        BEGIN
+            UPDATE license_counters SET value = value - CASE name
+                WHEN 'total' THEN 1
+                WHEN 'active' THEN (OLD.status = 'active')
+                WHEN 'locked' THEN (OLD.is_locked = 1)
+                WHEN 'expired' THEN (OLD.status = 'expired')
+                ELSE 0
+            END;
+        END
+        ''',
+        "DROP TRIGGER IF EXISTS trg_licenses_counters_update",
+        '''
+        CREATE TRIGGER trg_licenses_counters_update
+        AFTER UPDATE OF status, is_locked ON licenses
+        BEGIN
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN 0
+                WHEN 'active' THEN (NEW.status = 'active') - (OLD.status = 'active')
+                WHEN 'locked' THEN (NEW.is_locked = 1) - (OLD.is_locked = 1)
+                WHEN 'expired' THEN (NEW.status = 'expired') - (OLD.status = 'expired')
+                ELSE 0
+            END;
+        END
+        ''',
+        # Lease cho tác vụ nền chỉ một worker được chạy (leader)
+        '''
+        CREATE TABLE IF NOT EXISTS app_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    (10, 'compact_licenses', [
+        _compact_sqlite_licenses,
+    ]),
+]
+
+# Bảng gốc cho PostgreSQL (repository.PostgresRepository.init_schema), cùng cột với SQLite;
+# licenses được migration 8 chuyển sang dạng gọn
+POSTGRES_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS licenses (
+        id BIGSERIAL PRIMARY KEY,
+        license_key TEXT UNIQUE NOT NULL,
+        hwid TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+        expires_at BIGINT,
+        last_check TIMESTAMP,
+        device_info TEXT,
+        note TEXT,
+        is_locked INTEGER DEFAULT 0,
+        lock_reason TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS admin_users (
+        id SERIAL PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS api_keys (
+        id SERIAL PRIMARY KEY,
+        key TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        permissions TEXT,
+        key_masked TEXT,
+        status TEXT DEFAULT 'active',
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id SERIAL PRIMARY KEY,
+        key_id INTEGER,
+        action VARCHAR(100) NOT NULL,
+        details TEXT,
+        performed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ip_address VARCHAR(45)
+    )
+    ''',
+]
+
+POSTGRES_MIGRATIONS = [
+    (1, 'initial_indexes', [
+        "CREATE INDEX IF NOT EXISTS idx_api_keys_status ON api_keys(status)",
+        "CREATE INDEX IF NOT EXISTS idx_api_keys_created ON api_keys(created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_key_id ON activity_logs(key_id)",
+    ]),
+    (2, 'access_path_indexes', [
+        # APIKey.get_all: lọc status rồi ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_api_keys_status_created ON api_keys(status, created_at DESC)",
+        # ActivityLog.get_recent: ORDER BY performed_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_performed ON activity_logs(performed_at DESC)",
+    ]),
+    (3, 'unified_api_keys', [
+        _rename_legacy_api_keys,
+    ]),
+    (4, 'license_store', [
+        # Tương đương SQLite migration 1-5 để repository.py chạy được trên PostgreSQL
+        "CREATE INDEX IF NOT EXISTS idx_licenses_created ON licenses(created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_licenses_status ON licenses(status)",
+        "CREATE INDEX IF NOT EXISTS idx_licenses_locked ON licenses(is_locked)",
+        "CREATE INDEX IF NOT EXISTS idx_licenses_expires ON licenses(expires_at)",
+        '''
+        CREATE TABLE IF NOT EXISTS license_counters (
+            name TEXT PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT INTO license_counters (name, value)
+        SELECT 'total', COUNT(*) FROM licenses
+        UNION ALL SELECT 'active', COUNT(*) FILTER (WHERE status = 'active') FROM licenses
+        UNION ALL SELECT 'locked', COUNT(*) FILTER (WHERE is_locked = 1) FROM licenses
+        ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+        ''',
+        # Trigger theo statement với transition table: insert/xóa hàng loạt chỉ cập nhật bộ đếm một lần
+        '''
+        CREATE OR REPLACE FUNCTION license_counters_apply() RETURNS trigger AS $$
+        DECLARE
+            d_total BIGINT := 0;
+            d_active BIGINT := 0;
+            d_locked BIGINT := 0;
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT d_total + COUNT(*),
+                       d_active + COUNT(*) FILTER (WHERE status = 'active'),
+                       d_locked + COUNT(*) FILTER (WHERE is_locked = 1)
+                INTO d_total, d_active, d_locked FROM new_rows;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT d_total - COUNT(*),
+                       d_active - COUNT(*) FILTER (WHERE status = 'active'),
+                       d_locked - COUNT(*) FILTER (WHERE is_locked = 1)
+                INTO d_total, d_active, d_locked FROM old_rows;
+            END IF;
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN d_total
+                WHEN 'active' THEN d_active
+                WHEN 'locked' THEN d_locked
+            END
+            WHERE (name = 'total' AND d_total <> 0)
+               OR (name = 'active' AND d_active <> 0)
+               OR (name = 'locked' AND d_locked <> 0);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_licenses_counters_insert ON licenses",
+        '''
+        CREATE TRIGGER trg_licenses_counters_insert AFTER INSERT ON licenses
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION license_counters_apply()
+        ''',
+        "DROP TRIGGER IF EXISTS trg_licenses_counters_delete ON licenses",
+        '''
+        CREATE TRIGGER trg_licenses_counters_delete AFTER DELETE ON licenses
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION license_counters_apply()
+        ''',
+        "DROP TRIGGER IF EXISTS trg_licenses_counters_update ON licenses",
+        '''
+        CREATE TRIGGER trg_licenses_counters_update AFTER UPDATE ON licenses
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION license_counters_apply()
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            name TEXT PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT INTO app_meta (name, value) VALUES ('api_keys_generation', 0) ON CONFLICT DO NOTHING",
+        '''
+        CREATE OR REPLACE FUNCTION api_keys_bump_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE app_meta SET value = value + 1 WHERE name = 'api_keys_generation';
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_api_keys_generation ON api_keys",
+        '''
+        CREATE TRIGGER trg_api_keys_generation AFTER INSERT OR UPDATE OR DELETE ON api_keys
+        FOR EACH STATEMENT EXECUTE FUNCTION api_keys_bump_generation()
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS login_failures (
+            key TEXT PRIMARY KEY,
+            failures INTEGER NOT NULL DEFAULT 0,
+            first_failure DOUBLE PRECISION NOT NULL,
+            locked_until DOUBLE PRECISION
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS license_revocations (
+            version BIGSERIAL PRIMARY KEY,
+            license_key TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            created_at BIGINT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_license_revocations_created ON license_revocations(created_at)",
+        # Advisory lock giữ tới commit: version được cấp theo đúng thứ tự commit,
+        # client đọc since=<version> không bỏ sót mục của transaction commit muộn
+        '''
+        CREATE OR REPLACE FUNCTION license_revocations_record() RETURNS trigger AS $$
+        DECLARE
+            v_reason TEXT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                v_reason := 'deleted';
+            ELSIF NEW.is_locked = 1 AND OLD.is_locked IS DISTINCT FROM 1 THEN
+                v_reason := 'locked';
+            ELSIF OLD.status = 'active' AND NEW.status IS DISTINCT FROM 'active' THEN
+                v_reason := NEW.status;
+            ELSIF COALESCE(OLD.hwid, '') <> '' AND COALESCE(NEW.hwid, '') <> OLD.hwid THEN
+                v_reason := 'hwid_reset';
+            ELSE
+                RETURN NULL;
+            END IF;
+            PERFORM pg_advisory_xact_lock(6044525);
+            INSERT INTO license_revocations (license_key, reason, created_at)
+            VALUES (OLD.license_key, v_reason, EXTRACT(EPOCH FROM now())::BIGINT);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_license_revocations_update ON licenses",
+        '''
+        CREATE TRIGGER trg_license_revocations_update
+        AFTER UPDATE OF status, is_locked, hwid ON licenses
+        FOR EACH ROW EXECUTE FUNCTION license_revocations_record()
+        ''',
+        "DROP TRIGGER IF EXISTS trg_license_revocations_delete ON licenses",
+        '''
+        CREATE TRIGGER trg_license_revocations_delete AFTER DELETE ON licenses
+        FOR EACH ROW EXECUTE FUNCTION license_revocations_record()
+        ''',
+    ]),
+    (5, 'audit_log_pipeline', [
+        "ALTER TABLE activity_logs ADD COLUMN IF NOT EXISTS license_key TEXT",
+        "DROP INDEX IF EXISTS idx_activity_logs_performed",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_performed_id ON activity_logs(performed_at DESC, id DESC)",
+    ]),
+    (6, 'audit_log_partitions', [
+        _partition_activity_logs,
+        '''
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            day DATE NOT NULL,
+            license_key TEXT NOT NULL DEFAULT '',
+            action VARCHAR(100) NOT NULL,
+            events BIGINT NOT NULL,
+            PRIMARY KEY (day, license_key, action)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_activity_daily_license ON activity_daily(license_key, day)",
+        '''
+        CREATE TABLE IF NOT EXISTS activity_rollups (
+            period TEXT PRIMARY KEY,
+            daily_rows BIGINT NOT NULL,
+            rolled_up_at TIMESTAMP DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        )
+        ''',
+    ]),
+    (7, 'license_expiry_sweeper', [
+        _licenses_expires_epoch,
+        "CREATE INDEX IF NOT EXISTS idx_licenses_status_expires ON licenses(status, expires_at)",
+        '''
+        INSERT INTO license_counters (name, value)
+        SELECT 'expired', COUNT(*) FILTER (WHERE status = 'expired') FROM licenses
+        ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION license_counters_apply() RETURNS trigger AS $$
+        DECLARE
+            d_total BIGINT := 0;
+            d_active BIGINT := 0;
+            d_locked BIGINT := 0;
+            d_expired BIGINT := 0;
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT d_total + COUNT(*),
+                       d_active + COUNT(*) FILTER (WHERE status = 'active'),
+                       d_locked + COUNT(*) FILTER (WHERE is_locked = 1),
+                       d_expired + COUNT(*) FILTER (WHERE status = 'expired')
+                INTO d_total, d_active, d_locked, d_expired FROM new_rows;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT d_total - COUNT(*),
+                       d_active - COUNT(*) FILTER (WHERE status = 'active'),
+                       d_locked - COUNT(*) FILTER (WHERE is_locked = 1),
+                       d_expired - COUNT(*) FILTER (WHERE status = 'expired')
+                INTO d_total, d_active, d_locked, d_expired FROM old_rows;
+            END IF;
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN d_total
+                WHEN 'active' THEN d_active
+                WHEN 'locked' THEN d_locked
+                WHEN 'expired' THEN d_expired
+            END
+            WHERE (name = 'total' AND d_total <> 0)
+               OR (name = 'active' AND d_active <> 0)
+               OR (name = 'locked' AND d_locked <> 0)
+               OR (name = 'expired' AND d_expired <> 0);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS app_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at DOUBLE PRECISION NOT NULL
+        )
+        ''',
+    ]),
+    (8, 'compact_licenses', [
+        _compact_postgres_licenses,
+        '''
+        CREATE OR REPLACE FUNCTION license_counters_apply() RETURNS trigger AS $$
+        DECLARE
+            d_total BIGINT := 0;
+            d_active BIGINT := 0;
+            d_locked BIGINT := 0;
+            d_expired BIGINT := 0;
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT d_total + COUNT(*),
+                       d_active + COUNT(*) FILTER (WHERE status = 0),
+                       d_locked + COUNT(*) FILTER (WHERE status IN (1, 2)),
+                       d_expired + COUNT(*) FILTER (WHERE status = 3)
+                INTO d_total, d_active, d_locked, d_expired FROM new_rows;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT d_total - COUNT(*),
+                       d_active - COUNT(*) FILTER (WHERE status = 0),
+                       d_locked - COUNT(*) FILTER (WHERE status IN (1, 2)),
+                       d_expired - COUNT(*) FILTER (WHERE status = 3)
+                INTO d_total, d_active, d_locked, d_expired FROM old_rows;
+            END IF;
+            UPDATE license_counters SET value = value + CASE name
+                WHEN 'total' THEN d_total
+                WHEN 'active' THEN d_active
+                WHEN 'locked' THEN d_locked
+                WHEN 'expired' THEN d_expired
+            END
+            WHERE (name = 'total' AND d_total <> 0)
+               OR (name = 'active' AND d_active <> 0)
+               OR (name = 'locked' AND d_locked <> 0)
+               OR (name = 'expired' AND d_expired <> 0);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "INSERT INTO license_counters (name, value) " + LICENSE_COUNTERS_RESEED
+        + " ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value",
+        '''
+        CREATE OR REPLACE FUNCTION license_revocations_record() RETURNS trigger AS $$
+        DECLARE
+            v_reason TEXT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                v_reason := 'deleted';
+            ELSIF NEW.status IN (1, 2) AND OLD.status NOT IN (1, 2) THEN
+                v_reason := 'locked';
+            ELSIF OLD.status = 0 AND NEW.status <> 0 THEN
+                v_reason := 'expired';
+            ELSIF COALESCE(OLD.hwid, '') <> '' AND COALESCE(NEW.hwid, '') <> OLD.hwid THEN
+                v_reason := 'hwid_reset';
+            ELSE
+                RETURN NULL;
+            END IF;
+            PERFORM pg_advisory_xact_lock(6044525);
+            INSERT INTO license_revocations (license_key, reason, created_at)
+            VALUES (OLD.license_key, v_reason, EXTRACT(EPOCH FROM now())::BIGINT);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        "DROP TRIGGER IF EXISTS trg_license_revocations_update ON licenses",
+        '''
+        CREATE TRIGGER trg_license_revocations_update
+        AFTER UPDATE OF status, hwid ON licenses
+        FOR EACH ROW EXECUTE FUNCTION license_revocations_record()
+        ''',
+    ]),
+]
+
+# Các access path chính của app.py, dùng để kiểm tra bằng EXPLAIN QUERY PLAN
+SQLITE_QUERY_CHECKS = {
+    'list_licenses': ("SELECT * FROM licenses ORDER BY created_at DESC, id DESC LIMIT 50", ()),
+    'filter_status': ("SELECT * FROM licenses WHERE status = 0 ORDER BY created_at DESC, id DESC LIMIT 50", ()),
+    'filter_locked': ("SELECT COUNT(*) FROM licenses WHERE status IN (1, 2)", ()),
+    'stats_expiry': ("SELECT COUNT(*) FROM licenses WHERE status IN (0, 1, 2) AND expires_at < ?", (4102444800,)),
+    'expiry_sweep': (
+        "SELECT id FROM licenses WHERE status = 0 AND expires_at <= ? ORDER BY expires_at LIMIT 500",
+        (4102444800,)
+    ),
+    'validate': ("SELECT * FROM licenses WHERE license_key = ?", ('LIC-X',)),
+    'check': ("SELECT * FROM licenses WHERE license_key = ? AND hwid = ?", ('LIC-X', 'HWID')),
+    'api_key': ("SELECT * FROM api_keys WHERE key = ?", ('sk_x',)),
+    'activity_recent': ("SELECT * FROM activity_logs ORDER BY performed_at DESC, id DESC LIMIT 50", ()),
+}
+
+
+def _apply_steps(conn, steps):
+    for step in steps:
+        if callable(step):
+            step(conn)
+        else:
+            conn.execute(step)
+
+
+def get_schema_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_sqlite_migrations(conn, migrations=SQLITE_MIGRATIONS):
+    """Chạy các migration SQLite còn thiếu, trả về danh sách version đã áp dụng"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, name, steps in migrations:
+        # BEGIN IMMEDIATE giữ write lock: worker khác chờ rồi thấy version đã chạy
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+            ).fetchone():
+                conn.rollback()
+                continue
+            _apply_steps(conn, steps)
+            conn.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (version, name)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"✅ Migration {version} ({name}) applied")
+    return applied
+
+
+def run_postgres_migrations(conn, migrations=POSTGRES_MIGRATIONS):
+    """Chạy các migration PostgreSQL còn thiếu, trả về danh sách version đã áp dụng"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+
+        applied = []
+        for version, name, steps in migrations:
+            # Advisory lock để nhiều instance khởi động cùng lúc không chạy trùng
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (0x5C4E3A,))
+            cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+            try:
+                _apply_steps(conn, steps)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+            print(f"✅ Migration {version} ({name}) applied")
+        return applied
+    finally:
+        cursor.close()
+
+
+def explain_sqlite_queries(conn, checks=SQLITE_QUERY_CHECKS):
+    """Trả về query plan cho từng access path và đánh dấu full table scan"""
+    report = {}
+    for name, (sql, params) in checks.items():
+        details = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        report[name] = {
+            'plan': details,
+            'full_scan': any(
+                d.startswith('SCAN') and 'USING' not in d for d in details
+            )
+        }
+    return report
+
+
+if __name__ == '__main__':
+    import sqlite3
+    import sys
+    from config import Config
+
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else Config.SQLITE_DATABASE)
+    run_sqlite_migrations(conn)
+    print(f"Schema version: {get_schema_version(conn)}")
+    failed = False
+    for name, result in explain_sqlite_queries(conn).items():
+        marker = '❌' if result['full_scan'] else '✅'
+        failed = failed or result['full_scan']
+        print(f"{marker} {name}: {' | '.join(result['plan'])}")
+    sys.exit(1 if failed else 0)
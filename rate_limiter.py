@@ -0,0 +1,229 @@
+"""Token bucket rate limiter dùng chung giữa các worker.
+
+Bản chính giữ bucket trong một file mmap (mặc định trên /dev/shm): bảng băm
+kích thước cố định, chia thành nhóm 8 slot; mỗi lần hit chỉ khóa đúng nhóm
+của key (threading.Lock trong process + fcntl.lockf trên vùng byte của nhóm
+giữa các process). Không đụng tới database nên 429 gần như không tốn gì.
+
+Nếu không dùng được mmap/fcntl (vd: Windows, không ghi được file) thì dùng
+SQLiteRateLimiter với file SQLite riêng, tránh tranh write lock với licenses.db.
+"""
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+
+SLOT = struct.Struct('<Qdd')  # key hash, tokens, thời điểm cập nhật
+GROUP_SLOTS = 8
+GROUP_SIZE = SLOT.size * GROUP_SLOTS
+THREAD_LOCKS = 64
+
+
+def default_shm_path():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'license-admin-ratelimit')
+
+
+_untrusted_forwarded_warned = False
+
+
+def client_ip(forwarded_for, remote_addr, trusted_hops=0):
+    """IP client thật: bỏ qua `trusted_hops` proxy cuối trong X-Forwarded-For.
+
+    Phần đầu của header do client tự gửi nên không tin được; chỉ địa chỉ do
+    proxy của mình thêm vào (tính từ cuối) mới dùng để rate limit.
+    """
+    global _untrusted_forwarded_warned
+    if trusted_hops > 0 and forwarded_for:
+        hops = [part.strip() for part in forwarded_for.split(',') if part.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    elif forwarded_for and not _untrusted_forwarded_warned:
+        # Có proxy phía trước nhưng TRUSTED_PROXY_HOPS = 0: mọi client dùng chung IP của proxy
+        _untrusted_forwarded_warned = True
+        print(
+            f"⚠️  Request có X-Forwarded-For nhưng TRUSTED_PROXY_HOPS=0: rate limit theo IP "
+            f"proxy {remote_addr} cho mọi client. Đặt TRUSTED_PROXY_HOPS bằng số proxy phía trước app"
+        )
+    return remote_addr
+
+
+def _key_hash(key):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') | 1  # 0 = slot trống
+
+
+def _refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+def _retry_after(tokens, rate):
+    return max(1, math.ceil((1 - tokens) / rate)) if rate > 0 else 60
+
+
+class SharedMemoryRateLimiter:
+    def __init__(self, path, slots=65536):
+        import fcntl  # Không có trên Windows -> ImportError, dùng bản SQLite
+        self._fcntl = fcntl
+        self.path = path
+        self.groups = max(1, slots // GROUP_SLOTS)
+        size = self.groups * GROUP_SIZE
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                # File mới hoặc đổi số slot -> khởi tạo lại toàn bộ
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(THREAD_LOCKS)]
+
+    def hit(self, key, rate, burst):
+        """Lấy một token; trả về (allowed, retry_after_giây)"""
+        h = _key_hash(key)
+        group = h % self.groups
+        offset = group * GROUP_SIZE
+        now = time.time()
+        fcntl = self._fcntl
+        with self._locks[group % THREAD_LOCKS]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, GROUP_SIZE, offset)
+            try:
+                slot_offset = None
+                victim_offset, victim_rank = offset, None
+                for i in range(GROUP_SLOTS):
+                    pos = offset + i * SLOT.size
+                    slot_hash, tokens, updated = SLOT.unpack_from(self._map, pos)
+                    if slot_hash == h:
+                        slot_offset = pos
+                        tokens = _refill(tokens, updated, now, rate, burst)
+                        break
+                    # Ưu tiên slot trống, sau đó thay bucket lâu không dùng nhất
+                    rank = -1.0 if slot_hash == 0 else updated
+                    if victim_rank is None or rank < victim_rank:
+                        victim_offset, victim_rank = pos, rank
+                if slot_offset is None:
+                    slot_offset, tokens = victim_offset, float(burst)
+
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                SLOT.pack_into(self._map, slot_offset, h, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, GROUP_SIZE, offset)
+        return allowed, 0 if allowed else _retry_after(tokens, rate)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class SQLiteRateLimiter:
+    """Fallback: bucket lưu trong file SQLite riêng, mỗi thread một kết nối"""
+
+    PRUNE_EVERY = 10000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def hit(self, key, rate, burst):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = _refill(row[0], row[1], now, rate, burst) if row else float(burst)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                # Bucket không dùng trong 1 giờ chắc chắn đã đầy lại -> xóa
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (now - 3600,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0 if allowed else _retry_after(tokens, rate)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class ClientRateLimiter:
+    """Giới hạn /api/client/* theo IP và theo license_key, đếm số request bị từ chối"""
+
+    def __init__(self, backend, ip_rate, ip_burst, license_rate, license_burst):
+        self.backend = backend
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.license_rate = license_rate
+        self.license_burst = license_burst
+        self.allowed = 0
+        self.shed = {'ip': 0, 'license': 0}
+
+    def check(self, ip, license_key):
+        """Trả về None nếu cho qua, hoặc (scope, retry_after) nếu phải trả 429"""
+        if ip and self.ip_rate > 0:
+            allowed, retry_after = self.backend.hit(f"ip:{ip}", self.ip_rate, self.ip_burst)
+            if not allowed:
+                self.shed['ip'] += 1
+                return 'ip', retry_after
+        if isinstance(license_key, str) and license_key and self.license_rate > 0:
+            allowed, retry_after = self.backend.hit(
+                f"license:{license_key}", self.license_rate, self.license_burst
+            )
+            if not allowed:
+                self.shed['license'] += 1
+                return 'license', retry_after
+        self.allowed += 1
+        return None
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'allowed': self.allowed,
+            'shed': dict(self.shed)
+        }
+
+
+def create_backend(shm_path, slots, sqlite_path):
+    try:
+        return SharedMemoryRateLimiter(shm_path or default_shm_path(), slots)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"⚠️ Shared-memory rate limiter unavailable ({e}), using SQLite: {sqlite_path}")
+        return SQLiteRateLimiter(sqlite_path)
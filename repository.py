@@ -0,0 +1,978 @@
+"""Tầng repository cho licenses, api_keys, admin_users, activity_logs và các
+bảng phụ (login_failures, license_revocations, license_counters, app_meta,
+app_leases).
+
+Route chỉ gọi method của repository, không cầm connection trực tiếp:
+- SQLiteRepository: kết nối thread-local của sqlite_db.SQLiteConnections.
+- PostgresRepository: psycopg_pool.ConnectionPool (database.py), mỗi thao
+  tác mượn một kết nối rồi trả lại pool.
+
+Câu SQL chung được viết theo cú pháp SQLite (? và :name); bản PostgreSQL đổi
+placeholder sang %s / %(name)s và chỉ override phần khác nhau (DDL, tập key,
+insert hàng loạt, stream). create_repository() chọn backend theo
+Config.DATABASE_URL.
+"""
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+from license_record import (
+    LICENSE_COLUMNS, LOCKED_STATUSES, STATUS_ACTIVE, STATUS_CODES, STATUS_EXPIRED, STATUS_LOCKED, STATUS_REVOKED,
+    postgres_license_row, sqlite_license_row
+)
+from migrations import run_sqlite_migrations, run_postgres_migrations, POSTGRES_TABLES
+from audit_partitions import SQLitePartitions, period_bounds, period_for_date, period_of, postgres_partition_ddl
+
+# Cột trả về cho danh sách API key (dict dựng bằng zip với tuple của cursor)
+API_KEY_LIST_COLUMNS = ('id', 'name', 'permissions', 'created_at', 'key_masked', 'status', 'notes')
+
+# Các query cố định trên hot path (sqlite3 cache statement theo text SQL)
+SELECT_LICENSE_SQL = f'SELECT {LICENSE_COLUMNS} FROM licenses WHERE license_key = ?'
+ACTIVATE_LICENSE_SQL = '''
+    UPDATE licenses
+    SET hwid = ?,
+        device_info = ?,
+        last_check = ?
+    WHERE license_key = ? AND (hwid IS NULL OR hwid = '')
+'''
+CHECK_LICENSE_SQL = f'SELECT {LICENSE_COLUMNS} FROM licenses WHERE license_key = ? AND hwid = ?'
+# validate_batch: chỉ ghi last_check nếu license đang bind đúng HWID của item
+TOUCH_LICENSE_SQL = 'UPDATE licenses SET last_check = ? WHERE license_key = ? AND hwid = ?'
+INSERT_LICENSE_SQL = f"INSERT INTO licenses (license_key, expires_at, note, status) VALUES (?, ?, ?, {STATUS_ACTIVE})"
+
+# Thao tác admin trên license; thêm WHERE cho một key hoặc một tập key
+LICENSE_ACTIONS = {
+    'reset': f'''
+        UPDATE licenses
+        SET hwid = NULL,
+            device_info = NULL,
+            last_check = NULL,
+            lock_reason = NULL,
+            status = {STATUS_ACTIVE}
+    ''',
+    'lock': f'''
+        UPDATE licenses
+        SET lock_reason = :reason,
+            status = {STATUS_LOCKED}
+    ''',
+    'revoke': f'''
+        UPDATE licenses
+        SET status = {STATUS_REVOKED},
+            lock_reason = 'Revoked by admin'
+    ''',
+    'delete': 'DELETE FROM licenses'
+}
+
+# expiry_sweeper.py: chuyển một lô license quá hạn sang 'expired' theo index (status, expires_at).
+# Điều kiện status lặp lại ở ngoài để PostgreSQL kiểm tra lại dòng vừa bị admin đổi song song.
+EXPIRE_LICENSES_SQL = f'''
+    UPDATE licenses SET status = {STATUS_EXPIRED}
+    WHERE status = {STATUS_ACTIVE} AND id IN (
+        SELECT id FROM licenses
+        WHERE status = {STATUS_ACTIVE} AND expires_at <= :now
+        ORDER BY expires_at
+        LIMIT :limit
+    )
+    RETURNING license_key
+'''
+
+# Lấy hoặc gia hạn lease: thành công nếu chưa ai giữ, chính mình đang giữ, hoặc lease cũ đã hết hạn
+ACQUIRE_LEASE_SQL = '''
+    INSERT INTO app_leases (name, holder, expires_at) VALUES (:name, :holder, :until)
+    ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+    WHERE app_leases.holder = excluded.holder OR app_leases.expires_at < :now
+'''
+
+# Trường lọc cho thao tác hàng loạt theo filter (created_from/created_to: epoch giây)
+BULK_FILTER_FIELDS = {
+    'note': 'note = :note',
+    'hwid': 'hwid = :hwid',
+    'created_from': 'created_at >= :created_from',
+    'created_to': 'created_at <= :created_to',
+}
+
+RECORD_LOGIN_FAILURE_SQL = '''
+    INSERT INTO login_failures (key, failures, first_failure, locked_until)
+    VALUES (:key, 1, :now, CASE WHEN :max <= 1 THEN :now + :lockout END)
+    ON CONFLICT(key) DO UPDATE SET
+        failures = CASE WHEN login_failures.first_failure < :now - :window THEN 1 ELSE login_failures.failures + 1 END,
+        first_failure = CASE WHEN login_failures.first_failure < :now - :window THEN :now ELSE login_failures.first_failure END,
+        locked_until = CASE
+            WHEN (CASE WHEN login_failures.first_failure < :now - :window THEN 1 ELSE login_failures.failures + 1 END) >= :max
+            THEN :now + :lockout
+            ELSE login_failures.locked_until
+        END
+'''
+
+INSERT_ACTIVITY_SQL = '''
+    INSERT INTO {table} (performed_at, key_id, license_key, action, details, ip_address)
+    VALUES '''
+# 6 tham số/dòng, dưới giới hạn 999 biến của SQLite cũ
+ACTIVITY_INSERT_ROWS = 150
+
+# Gộp log của một partition thành số sự kiện theo (ngày, license_key, action)
+ROLLUP_ACTIVITY_SQL = '''
+    INSERT INTO activity_daily (day, license_key, action, events)
+    SELECT {day}, COALESCE(license_key, ''), action, COUNT(*)
+    FROM {table}
+    WHERE 1 = 1
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, license_key, action) DO UPDATE SET events = activity_daily.events + excluded.events
+'''
+
+# Advisory lock (PostgreSQL) cho tạo/gộp/xóa partition audit log
+ACTIVITY_MAINTENANCE_LOCK = 0x41554454
+
+# Kỳ vừa đóng chưa được gộp ngay: chờ writer ghi nốt sự kiện trễ của kỳ đó
+ROLLUP_GRACE = timedelta(hours=1)
+
+_NAMED_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def to_pyformat(sql):
+    """'?' / ':name' (sqlite3) -> '%s' / '%(name)s' (psycopg)"""
+    sql = sql.replace('%', '%%').replace('?', '%s')
+    return _NAMED_PARAM.sub(r'%(\1)s', sql)
+
+
+def is_postgres_url(url):
+    return bool(url) and url.startswith(('postgres://', 'postgresql://'))
+
+
+class BaseRepository:
+    backend = None
+    like_op = 'LIKE'
+    lock_rows_sql = ''
+
+    # ============== PRIMITIVES ==============
+    @contextmanager
+    def connection(self):
+        """Kết nối cho các câu đọc"""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Kết nối trong một transaction: commit khi thoát, rollback khi lỗi.
+
+        immediate=True: giữ write lock ngay từ đầu (SQLite BEGIN IMMEDIATE).
+        """
+        raise NotImplementedError
+
+    def _sql(self, sql):
+        return sql
+
+    def _key_set(self, keys):
+        """(điều kiện `IN tập key` dùng tham số :keys, giá trị tham số)"""
+        raise NotImplementedError
+
+    def _one(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(self._sql(sql), params).fetchone()
+
+    def _all(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(self._sql(sql), params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self.transaction() as conn:
+            return conn.execute(self._sql(sql), params).rowcount
+
+    def _license_cursor(self, conn, name=None):
+        """Cursor trả về LicenseRecord thay cho dict (name: server-side cursor nếu backend hỗ trợ)"""
+        raise NotImplementedError
+
+    def _tuple_cursor(self, conn, name=None):
+        """Cursor trả về tuple thô, dùng cho danh sách lớn cần serialize thẳng"""
+        raise NotImplementedError
+
+    def _one_license(self, sql, params=()):
+        with self.connection() as conn:
+            return self._license_cursor(conn).execute(self._sql(sql), params).fetchone()
+
+    def _all_licenses(self, sql, params=()):
+        with self.connection() as conn:
+            return self._license_cursor(conn).execute(self._sql(sql), params).fetchall()
+
+    def release(self):
+        """Gọi cuối mỗi request"""
+
+    def close(self):
+        """Đóng kết nối của process hiện tại (master gunicorn trước khi fork worker)"""
+
+    def init_schema(self):
+        raise NotImplementedError
+
+    def table_names(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.backend}
+
+    def schema_version(self):
+        row = self._one("SELECT MAX(version) AS version FROM schema_version")
+        return row['version'] or 0
+
+    # ============== LICENSES ==============
+    def get_license(self, license_key):
+        """LicenseRecord hoặc None"""
+        return self._one_license(SELECT_LICENSE_SQL, (license_key,))
+
+    def check_license(self, license_key, hwid):
+        return self._one_license(CHECK_LICENSE_SQL, (license_key, hwid))
+
+    def get_licenses(self, license_keys):
+        """{license_key: LicenseRecord} cho các key tồn tại, một query IN"""
+        condition, keys = self._key_set(license_keys)
+        return {
+            record.license_key: record for record in self._all_licenses(
+                f"SELECT {LICENSE_COLUMNS} FROM licenses WHERE license_key {condition}", {'keys': keys}
+            )
+        }
+
+    def activate_license(self, license_key, hwid, device_info, activated_at):
+        """Bind HWID nếu license chưa được bind; False nếu đã bị bind ở nơi khác"""
+        return self._write(ACTIVATE_LICENSE_SQL, (hwid, device_info, activated_at, license_key)) > 0
+
+    def record_validations(self, activations, checks, now):
+        """Ghi kết quả một lô validate trong một transaction.
+
+        activations: [(license_key, hwid, device_info)] bind HWID nếu license chưa bind;
+        checks: [(license_key, hwid)] cập nhật last_check nếu license đang bind đúng HWID đó.
+        Trả về (tập key đã bind, {key: LicenseRecord} đọc lại cho các key bind không thành công).
+        """
+        activated = set()
+        reloaded = {}
+        with self.transaction() as conn:
+            for license_key, hwid, device_info in activations:
+                if conn.execute(self._sql(ACTIVATE_LICENSE_SQL), (hwid, device_info, now, license_key)).rowcount > 0:
+                    activated.add(license_key)
+            if checks:
+                conn.cursor().executemany(
+                    self._sql(TOUCH_LICENSE_SQL), [(now, license_key, hwid) for license_key, hwid in checks]
+                )
+            # Bị worker khác bind trước (hoặc đã bị xóa): đọc lại trong cùng transaction
+            failed = [license_key for license_key, _, _ in activations if license_key not in activated]
+            if failed:
+                condition, keys = self._key_set(failed)
+                reloaded = {
+                    record.license_key: record for record in self._license_cursor(conn).execute(
+                        self._sql(f"SELECT {LICENSE_COLUMNS} FROM licenses WHERE license_key {condition}"),
+                        {'keys': keys}
+                    )
+                }
+        return activated, reloaded
+
+    def create_license(self, license_key, expires_at, note):
+        self._write(INSERT_LICENSE_SQL, (license_key, expires_at, note))
+
+    def insert_new_licenses(self, rows):
+        """Insert các (license_key, expires_at epoch, note) trong một transaction, bỏ qua key
+        đã tồn tại; trả về các dòng đã ghi"""
+        condition, keys = self._key_set([row[0] for row in rows])
+        # immediate: không ai chen insert giữa bước kiểm tra trùng và insert
+        with self.transaction(immediate=True) as conn:
+            existing = {
+                row['license_key'] for row in conn.execute(
+                    self._sql(f"SELECT license_key FROM licenses WHERE license_key {condition}"),
+                    {'keys': keys}
+                )
+            }
+            rows = [row for row in rows if row[0] not in existing]
+            conn.cursor().executemany(self._sql(INSERT_LICENSE_SQL), rows)
+        return rows
+
+    def apply_license_action(self, action, license_key, reason=None):
+        """reset / lock / revoke / delete một license; False nếu không tìm thấy"""
+        sql = LICENSE_ACTIONS[action] + ' WHERE license_key = :key'
+        return self._write(sql, {'key': license_key, 'reason': reason}) > 0
+
+    def bulk_license_action(self, action, max_rows, license_keys=None, filters=None, reason=None):
+        """Áp dụng action lên tập key hoặc các license khớp filter trong một transaction.
+
+        Trả về danh sách key bị ảnh hưởng, hoặc None nếu khớp quá max_rows.
+        """
+        if license_keys is not None:
+            condition, keys = self._key_set(license_keys)
+            where, params = f"license_key {condition}", {'keys': keys}
+        else:
+            where = ' AND '.join(BULK_FILTER_FIELDS[field] for field in filters)
+            params = dict(filters)
+        params['limit'] = max_rows + 1
+
+        # Tập key đọc được chính là tập key bị thay đổi (SQLite: write lock, PG: FOR UPDATE)
+        with self.transaction(immediate=True) as conn:
+            matched = [
+                row['license_key'] for row in conn.execute(
+                    self._sql(f"SELECT license_key FROM licenses WHERE {where} LIMIT :limit{self.lock_rows_sql}"),
+                    params
+                )
+            ]
+            if len(matched) > max_rows:
+                return None
+            condition, keys = self._key_set(matched)
+            conn.execute(
+                self._sql(LICENSE_ACTIONS[action] + f" WHERE license_key {condition}"),
+                {'keys': keys, 'reason': reason}
+            )
+        return matched
+
+    def _license_filters(self, filters, after=None):
+        """Điều kiện WHERE cho danh sách license: status, locked, expired, q"""
+        where = []
+        params = {}
+
+        if after is not None:
+            where.append('(created_at, id) < (:after_created, :after_id)')
+            params['after_created'], params['after_id'] = after
+
+        if filters.get('status'):
+            # Tên status không hợp lệ -> -1, không khớp license nào
+            where.append('status = :status')
+            params['status'] = STATUS_CODES.get(filters['status'], -1)
+
+        if filters.get('locked') in ('0', '1'):
+            locked = ', '.join(str(code) for code in LOCKED_STATUSES)
+            where.append(f"status {'IN' if filters['locked'] == '1' else 'NOT IN'} ({locked})")
+
+        if filters.get('expired') in ('0', '1'):
+            if filters['expired'] == '1':
+                where.append('expires_at < :now')
+            else:
+                where.append('(expires_at IS NULL OR expires_at >= :now)')
+            params['now'] = int(time.time())
+
+        search = (filters.get('q') or '').strip()
+        if search:
+            params['pattern'] = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where.append('(' + ' OR '.join(
+                f"{column} {self.like_op} :pattern ESCAPE '\\'" for column in ('license_key', 'note', 'hwid')
+            ) + ')')
+
+        sql = f'SELECT {LICENSE_COLUMNS} FROM licenses'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return sql + ' ORDER BY created_at DESC, id DESC', params
+
+    def list_licenses(self, filters, after=None, limit=100):
+        """Một trang license theo keyset (created_at, id) giảm dần, tuple theo LICENSE_COLUMNS"""
+        sql, params = self._license_filters(filters, after)
+        params['limit'] = limit
+        with self.connection() as conn:
+            return self._tuple_cursor(conn).execute(self._sql(sql + ' LIMIT :limit'), params).fetchall()
+
+    def iter_licenses(self, filters, batch_size=500):
+        """Duyệt toàn bộ license khớp filter theo lô tuple, bộ nhớ không phụ thuộc kích thước bảng"""
+        sql, params = self._license_filters(filters)
+        with self.connection() as conn:
+            cursor = self._tuple_cursor(conn, name='licenses_export').execute(self._sql(sql), params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def license_stats(self, now, day, week, month):
+        """Bộ đếm do trigger duy trì + một range scan trên index (status, expires_at).
+
+        now/day/week/month là epoch giây. Giữ nghĩa cũ của thống kê: expired là
+        mọi license có expires_at < now (kể cả đang bị khóa, hoặc còn 'active'
+        vì sweeper chưa kịp chuyển), sắp hết hạn tính cả license bị khóa;
+        locked là mọi license locked / revoked. active không gồm license quá hạn.
+        """
+        counters = {row['name']: row['value'] for row in self._all("SELECT name, value FROM license_counters")}
+
+        # License 'expired' đã có bộ đếm; chỉ đọc phần index của các status còn lại hết hạn trong 30 ngày tới
+        statuses = ', '.join(str(code) for code in (STATUS_ACTIVE, *LOCKED_STATUSES))
+        row = self._one(f"""
+            SELECT
+                SUM(CASE WHEN expires_at < :now THEN 1 ELSE 0 END) AS overdue,
+                SUM(CASE WHEN expires_at < :now AND status = {STATUS_ACTIVE} THEN 1 ELSE 0 END) AS overdue_active,
+                SUM(CASE WHEN expires_at >= :now AND expires_at < :day THEN 1 ELSE 0 END) AS expiring_1d,
+                SUM(CASE WHEN expires_at >= :now AND expires_at < :week THEN 1 ELSE 0 END) AS expiring_7d,
+                SUM(CASE WHEN expires_at >= :now THEN 1 ELSE 0 END) AS expiring_30d
+            FROM licenses
+            WHERE status IN ({statuses}) AND expires_at < :month
+        """, {'now': now, 'day': day, 'week': week, 'month': month})
+
+        return {
+            'total_licenses': int(counters.get('total', 0)),
+            'active_licenses': int(counters.get('active', 0)) - int(row['overdue_active'] or 0),
+            'locked_licenses': int(counters.get('locked', 0)),
+            'expired_licenses': int(counters.get('expired', 0)) + int(row['overdue'] or 0),
+            'expiring_licenses': {
+                '1d': int(row['expiring_1d'] or 0),
+                '7d': int(row['expiring_7d'] or 0),
+                '30d': int(row['expiring_30d'] or 0)
+            }
+        }
+
+    def expire_licenses(self, now, limit):
+        """Chuyển tối đa `limit` license 'active' có expires_at <= now sang 'expired'; trả về các key"""
+        with self.transaction(immediate=True) as conn:
+            return [
+                row['license_key'] for row in
+                conn.execute(self._sql(EXPIRE_LICENSES_SQL), {'now': now, 'limit': limit}).fetchall()
+            ]
+
+    def update_last_checks(self, rows):
+        """rows: [(checked_at epoch, license_key)], ghi bằng một executemany trong một transaction"""
+        with self.transaction() as conn:
+            conn.cursor().executemany(self._sql('UPDATE licenses SET last_check = ? WHERE license_key = ?'), rows)
+
+    def count_licenses(self):
+        return self._one("SELECT COUNT(*) AS n FROM licenses")['n']
+
+    # ============== LEASES ==============
+    def acquire_lease(self, name, holder, ttl, now):
+        """Lấy/gia hạn lease `name` tới now + ttl; False nếu process khác đang giữ"""
+        return self._write(ACQUIRE_LEASE_SQL, {'name': name, 'holder': holder, 'until': now + ttl, 'now': now}) > 0
+
+    def release_lease(self, name, holder):
+        self._write("DELETE FROM app_leases WHERE name = ? AND holder = ?", (name, holder))
+
+    # ============== REVOCATIONS ==============
+    def revocation_version(self):
+        return self._one("SELECT COALESCE(MAX(version), 0) AS version FROM license_revocations")['version']
+
+    def revocations_since(self, since, limit):
+        return self._all(
+            "SELECT version, license_key FROM license_revocations WHERE version > ? ORDER BY version LIMIT ?",
+            (since, limit)
+        )
+
+    def prune_revocations(self, before):
+        return self._write("DELETE FROM license_revocations WHERE created_at < ?", (before,))
+
+    # ============== ADMIN USERS ==============
+    def count_admin_users(self):
+        return self._one("SELECT COUNT(*) AS n FROM admin_users")['n']
+
+    def get_admin_user(self, username):
+        return self._one("SELECT * FROM admin_users WHERE username = ?", (username,))
+
+    def set_admin_password(self, user_id, password_hash):
+        self._write("UPDATE admin_users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
+    def upsert_admin_user(self, username, password_hash):
+        self._write('''
+            INSERT INTO admin_users (username, password_hash) VALUES (?, ?)
+            ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash
+        ''', (username, password_hash))
+
+    # ============== API KEYS ==============
+    def count_api_keys(self):
+        return self._one("SELECT COUNT(*) AS n FROM api_keys")['n']
+
+    def first_api_key(self):
+        return self._one("SELECT key_masked, name FROM api_keys ORDER BY id LIMIT 1")
+
+    def list_api_keys(self, status=None, search=''):
+        where = []
+        params = {}
+        if status:
+            where.append('status = :status')
+            params['status'] = status
+        if search:
+            where.append(f"name {self.like_op} :search")
+            params['search'] = f'%{search}%'
+        sql = f"SELECT {', '.join(API_KEY_LIST_COLUMNS)} FROM api_keys"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        with self.connection() as conn:
+            rows = self._tuple_cursor(conn).execute(self._sql(sql + ' ORDER BY created_at DESC'), params).fetchall()
+        return [dict(zip(API_KEY_LIST_COLUMNS, row)) for row in rows]
+
+    def get_api_key(self, key_id):
+        row = self._one(
+            "SELECT id, name, permissions, created_at, key_masked, status, notes FROM api_keys WHERE id = ?",
+            (key_id,)
+        )
+        return dict(row) if row else None
+
+    def insert_api_key(self, digest, masked, name, permissions='all', notes=None):
+        """Lưu API key (digest), trả về id"""
+        with self.transaction() as conn:
+            return conn.execute(
+                self._sql("INSERT INTO api_keys (key, name, permissions, key_masked, notes) VALUES (?, ?, ?, ?, ?) RETURNING id"),
+                (digest, name, permissions, masked, notes)
+            ).fetchone()['id']
+
+    def delete_api_keys_before(self, notes, created_before):
+        """Xóa các key có notes cho trước tạo trước created_before ('YYYY-MM-DD HH:MM:SS' UTC); trả về số key"""
+        return self._write(
+            "DELETE FROM api_keys WHERE notes = ? AND created_at < ?", (notes, created_before)
+        )
+
+    def api_keys_generation(self):
+        row = self._one("SELECT value FROM app_meta WHERE name = 'api_keys_generation'")
+        return row['value'] if row else 0
+
+    def load_active_api_keys(self):
+        return self._all(
+            "SELECT id, key, name, permissions FROM api_keys WHERE COALESCE(status, 'active') = 'active'"
+        )
+
+    # ============== LOGIN FAILURES ==============
+    def login_locked_until(self, keys):
+        condition, keys = self._key_set(keys)
+        row = self._one(
+            f"SELECT MAX(locked_until) AS locked_until FROM login_failures WHERE key {condition}",
+            {'keys': keys}
+        )
+        return row['locked_until'] or 0
+
+    def record_login_failures(self, limits, now, window, lockout):
+        """limits: {key: số lần sai tối đa trong window trước khi khóa lockout giây}"""
+        with self.transaction() as conn:
+            conn.cursor().executemany(self._sql(RECORD_LOGIN_FAILURE_SQL), [
+                {'key': key, 'now': now, 'window': window, 'max': max_failures, 'lockout': lockout}
+                for key, max_failures in limits.items()
+            ])
+
+    def clear_login_failures(self, keys):
+        condition, keys = self._key_set(keys)
+        self._write(f"DELETE FROM login_failures WHERE key {condition}", {'keys': keys})
+
+    # ============== ACTIVITY LOGS ==============
+    def insert_activity_logs(self, rows):
+        """rows: [(performed_at, key_id, license_key, action, details, ip_address)]"""
+        with self.transaction() as conn:
+            self._insert_activity_rows(conn, 'activity_logs', rows)
+
+    def _insert_activity_rows(self, conn, table, rows):
+        # INSERT nhiều dòng, tối đa ACTIVITY_INSERT_ROWS dòng mỗi câu
+        for start in range(0, len(rows), ACTIVITY_INSERT_ROWS):
+            chunk = rows[start:start + ACTIVITY_INSERT_ROWS]
+            conn.execute(
+                self._sql(INSERT_ACTIVITY_SQL.format(table=table) + ', '.join(['(?, ?, ?, ?, ?, ?)'] * len(chunk))),
+                [value for row in chunk for value in row]
+            )
+
+    def recent_activity(self, limit=50, before=None):
+        """Log mới nhất trước, phân trang theo keyset (performed_at, id) giảm dần"""
+        return self._activity_page('activity_logs', limit, before)
+
+    def _activity_page(self, table, limit, before):
+        where = ''
+        params = {'limit': limit}
+        if before is not None:
+            where = 'WHERE (al.performed_at, al.id) < (:before_at, :before_id)'
+            params['before_at'], params['before_id'] = before
+        return [dict(row) for row in self._all(f'''
+            SELECT al.*, ak.name AS key_name
+            FROM {table} al
+            LEFT JOIN api_keys ak ON al.key_id = ak.id
+            {where}
+            ORDER BY al.performed_at DESC, al.id DESC
+            LIMIT :limit
+        ''', params)]
+
+    def daily_activity(self, since, license_key=None):
+        """Số sự kiện theo (ngày, license_key, action) từ ngày `since` (YYYY-MM-DD)"""
+        sql = "SELECT day, license_key, action, events FROM activity_daily WHERE day >= :since"
+        params = {'since': since}
+        if license_key is not None:
+            sql += " AND license_key = :license_key"
+            params['license_key'] = license_key
+        return [dict(row) for row in self._all(sql + " ORDER BY day DESC, license_key, action", params)]
+
+    # ============== AUDIT LOG PARTITIONS ==============
+    activity_day_sql = 'substr(performed_at, 1, 10)'
+
+    def maintain_activity_logs(self, retention_days, rollup_retention_days, now=None):
+        """Gộp các kỳ đã đóng vào activity_daily, xóa cả partition quá retention_days.
+
+        retention_days / rollup_retention_days <= 0: giữ vô hạn. Chạy lại nhiều lần
+        (nhiều worker) vẫn an toàn: mỗi kỳ chỉ được gộp một lần (activity_rollups).
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        self._prepare_activity_partitions(now)
+        expire_before = (now - timedelta(days=retention_days)).date()
+        rolled_up, dropped = [], []
+        for period in self._activity_periods():
+            start, end = period_bounds(period)
+            if datetime.combine(end, datetime.min.time()) + ROLLUP_GRACE > now:
+                continue
+            if self._rollup_activity_partition(period):
+                rolled_up.append(period)
+            if retention_days > 0 and end <= expire_before:
+                self._drop_activity_partition(period)
+                dropped.append(period)
+
+        daily_deleted = 0
+        if rollup_retention_days > 0:
+            # activity_daily nhỏ (một dòng / license / action / ngày) nên DELETE theo index day là đủ
+            daily_deleted = self._write(
+                "DELETE FROM activity_daily WHERE day < ?",
+                ((now - timedelta(days=rollup_retention_days)).date().isoformat(),)
+            )
+        return {'rolled_up': rolled_up, 'dropped': dropped, 'daily_deleted': daily_deleted}
+
+    def _rollup_activity_partition(self, period):
+        table = self._activity_partition_table(period)
+        if table is None:
+            return False
+        with self.transaction(immediate=True) as conn:
+            self._lock_activity_maintenance(conn)
+            if conn.execute(self._sql("SELECT 1 FROM activity_rollups WHERE period = ?"), (period,)).fetchone():
+                return False
+            events = conn.execute(
+                self._sql(ROLLUP_ACTIVITY_SQL.format(day=self.activity_day_sql, table=table))
+            ).rowcount
+            conn.execute(
+                self._sql("INSERT INTO activity_rollups (period, daily_rows) VALUES (?, ?)"),
+                (period, events)
+            )
+        return True
+
+    def _lock_activity_maintenance(self, conn):
+        """Khóa giữa các worker trong transaction gộp (SQLite: BEGIN IMMEDIATE là đủ)"""
+
+    def _prepare_activity_partitions(self, now):
+        """Tạo trước partition cho kỳ hiện tại và kỳ sau nếu backend cần"""
+
+    def _activity_periods(self):
+        raise NotImplementedError
+
+    def _activity_partition_table(self, period):
+        raise NotImplementedError
+
+    def _drop_activity_partition(self, period):
+        raise NotImplementedError
+
+
+class SQLiteRepository(BaseRepository):
+    backend = 'sqlite'
+
+    def __init__(self, connections, audit_partition='month'):
+        self.connections = connections
+        self.partitions = SQLitePartitions(connections.path, audit_partition)
+
+    @contextmanager
+    def connection(self):
+        yield self.connections.get()
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        conn = self.connections.get()
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _one(self, sql, params=()):
+        # Hot path (validate/check): bỏ qua context manager
+        return self.connections.get().execute(sql, params).fetchone()
+
+    def _license_cursor(self, conn, name=None):
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite_license_row
+        return cursor
+
+    def _tuple_cursor(self, conn, name=None):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor
+
+    def _one_license(self, sql, params=()):
+        return self._license_cursor(self.connections.get()).execute(sql, params).fetchone()
+
+    def _key_set(self, keys):
+        return 'IN (SELECT value FROM json_each(:keys))', json.dumps(list(keys))
+
+    def release(self):
+        self.connections.release()
+
+    def close(self):
+        self.connections.close()
+
+    def stats(self):
+        return dict(self.connections.stats(), backend=self.backend)
+
+    def table_names(self):
+        return [row['name'] for row in self._all("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    def init_schema(self):
+        conn = self.connections.get()
+        cursor = conn.cursor()
+
+        # Tạo bảng licenses (dạng gốc; migration 10 chuyển sang dạng gọn của license_record.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS licenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                license_key TEXT UNIQUE NOT NULL,
+                hwid TEXT,
+                status TEXT DEFAULT 'active',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at INTEGER,
+                last_check TIMESTAMP,
+                device_info TEXT,
+                note TEXT,
+                is_locked INTEGER DEFAULT 0,
+                lock_reason TEXT
+            )
+        ''')
+
+        # Tạo bảng admin_users
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS admin_users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Tạo bảng api_keys
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_keys (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                permissions TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        conn.commit()
+
+        # Chạy các migration schema (index, hash API key, ...) còn thiếu
+        run_sqlite_migrations(conn)
+        self._move_legacy_activity_logs(conn)
+
+    # ============== AUDIT LOG PARTITIONS ==============
+    def insert_activity_logs(self, rows):
+        """Ghi vào file partition của kỳ tương ứng (thường chỉ kỳ hiện tại)"""
+        groups = {}
+        for row in rows:
+            groups.setdefault(period_of(row[0], self.partitions.granularity), []).append(row)
+        conn = self.connections.get()
+        # ATTACH không chạy được trong transaction -> attach trước
+        schemas = {period: self.partitions.attach(conn, period) for period in groups}
+        with self.transaction() as conn:
+            for period, group in groups.items():
+                self._insert_activity_rows(conn, f'{schemas[period]}.activity_logs', group)
+
+    def recent_activity(self, limit=50, before=None):
+        """Duyệt các file partition từ mới tới cũ cho tới khi đủ `limit` dòng"""
+        conn = self.connections.get()
+        logs = []
+        for period in self.partitions.periods():
+            if before is not None and period_bounds(period)[0].isoformat() > before[0]:
+                continue  # Cả kỳ nằm sau cursor
+            schema = self.partitions.attach(conn, period, create=False)
+            if schema is None:
+                continue
+            logs.extend(self._activity_page(f'{schema}.activity_logs', limit - len(logs), before))
+            if len(logs) >= limit:
+                break
+        return logs
+
+    def _activity_periods(self):
+        return self.partitions.periods()
+
+    def _activity_partition_table(self, period):
+        schema = self.partitions.attach(self.connections.get(), period, create=False)
+        return f'{schema}.activity_logs' if schema else None
+
+    def _drop_activity_partition(self, period):
+        self.partitions.detach(self.connections.get(), period)
+        self.partitions.remove(period)
+
+    def _move_legacy_activity_logs(self, conn):
+        """Chuyển log cũ trong bảng activity_logs của DB chính sang file partition (một lần)"""
+        if not conn.execute("SELECT 1 FROM activity_logs LIMIT 1").fetchone():
+            return
+        length = 10 if self.partitions.granularity == 'day' else 7
+        days = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT substr(COALESCE(performed_at, CURRENT_TIMESTAMP), 1, {length}) FROM activity_logs"
+        )]
+        periods = {period_of(day + '-01', self.partitions.granularity) for day in days}
+        for period in periods:
+            self.partitions.attach(conn, period)
+        with self.transaction(immediate=True) as conn:
+            rows = [tuple(row) for row in conn.execute('''
+                SELECT COALESCE(performed_at, CURRENT_TIMESTAMP), key_id, license_key, action, details, ip_address
+                FROM activity_logs ORDER BY id
+            ''')]
+            groups = {}
+            for row in rows:
+                groups.setdefault(period_of(row[0], self.partitions.granularity), []).append(row)
+            for period, group in groups.items():
+                self._insert_activity_rows(conn, f'audit_{period}.activity_logs', group)
+            conn.execute("DELETE FROM activity_logs")
+        if rows:
+            print(f"✅ Moved {len(rows)} activity logs into {len(groups)} partition file(s)")
+
+
+class PostgresRepository(BaseRepository):
+    backend = 'postgres'
+    like_op = 'ILIKE'
+    lock_rows_sql = ' FOR UPDATE'
+
+    activity_day_sql = 'CAST(performed_at AS DATE)'
+
+    def __init__(self, audit_partition='month'):
+        import database  # psycopg chỉ cần khi dùng PostgreSQL
+        self._database = database
+        self._statements = {}
+        self.audit_partition = audit_partition
+        self._partitions = set()
+
+    def _pool(self):
+        pool = self._database.get_pool()
+        if pool is None:
+            raise RuntimeError("DATABASE_URL is not configured")
+        return pool
+
+    @contextmanager
+    def connection(self):
+        with self._pool().connection() as conn:
+            yield conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # pool.connection() commit khi thoát bình thường, rollback khi có exception
+        with self._pool().connection() as conn:
+            yield conn
+
+    def _sql(self, sql):
+        converted = self._statements.get(sql)
+        if converted is None:
+            converted = self._statements[sql] = to_pyformat(sql)
+        return converted
+
+    def _key_set(self, keys):
+        return '= ANY(:keys)', list(keys)
+
+    def _license_cursor(self, conn, name=None):
+        return conn.cursor(name=name, row_factory=postgres_license_row)
+
+    def _tuple_cursor(self, conn, name=None):
+        return conn.cursor(name=name, row_factory=self._database.text_tuple_row)
+
+    def close(self):
+        self._database.close_db()
+
+    def stats(self):
+        return {'backend': self.backend, 'pool': self._database.pool_stats()}
+
+    def table_names(self):
+        return [row['table_name'] for row in self._all(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema()"
+        )]
+
+    def init_schema(self):
+        with self._pool().connection() as conn:
+            for ddl in POSTGRES_TABLES:
+                conn.execute(ddl)
+            conn.commit()
+            run_postgres_migrations(conn)
+
+    def insert_new_licenses(self, rows):
+        # ON CONFLICT thay cho bước kiểm tra trùng: không cần khóa cả bảng
+        if not rows:
+            return []
+        keys, expires, notes = zip(*rows)
+        with self.transaction() as conn:
+            inserted = {
+                row['license_key'] for row in conn.execute('''
+                    INSERT INTO licenses (license_key, expires_at, note, status)
+                    SELECT key, expires_at, note, %s
+                    FROM unnest(%s::text[], %s::bigint[], %s::text[]) AS t(key, expires_at, note)
+                    ON CONFLICT (license_key) DO NOTHING
+                    RETURNING license_key
+                ''', (STATUS_ACTIVE, list(keys), list(expires), list(notes)))
+            }
+        return [row for row in rows if row[0] in inserted]
+
+    # ============== AUDIT LOG PARTITIONS ==============
+    def insert_activity_logs(self, rows):
+        # Bảng cha không có partition DEFAULT: bảo đảm partition của kỳ tồn tại trước
+        for period in {period_of(row[0], self.audit_partition) for row in rows}:
+            self._ensure_activity_partition(period)
+        super().insert_activity_logs(rows)
+
+    def _ensure_activity_partition(self, period):
+        if period in self._partitions:
+            return
+        with self.transaction() as conn:
+            self._lock_activity_maintenance(conn)
+            conn.execute(postgres_partition_ddl(period))
+        self._partitions.add(period)
+
+    def _lock_activity_maintenance(self, conn):
+        conn.execute("SELECT pg_advisory_xact_lock(%s)", (ACTIVITY_MAINTENANCE_LOCK,))
+
+    def _prepare_activity_partitions(self, now):
+        current = period_for_date(now.date(), self.audit_partition)
+        self._ensure_activity_partition(current)
+        self._ensure_activity_partition(period_for_date(period_bounds(current)[1], self.audit_partition))
+
+    def _activity_periods(self):
+        rows = self._all('''
+            SELECT child.relname AS name
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = 'activity_logs'
+        ''')
+        return sorted(
+            (row['name'][len('activity_logs_p'):] for row in rows if row['name'].startswith('activity_logs_p')),
+            key=lambda period: period_bounds(period)[0]
+        )
+
+    def _activity_partition_table(self, period):
+        return f'activity_logs_p{period}'
+
+    def _drop_activity_partition(self, period):
+        with self.transaction() as conn:
+            self._lock_activity_maintenance(conn)
+            conn.execute(f"DROP TABLE IF EXISTS activity_logs_p{period}")
+        self._partitions.discard(period)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def create_repository(connections=None):
+    """PostgreSQL nếu Config.DATABASE_URL là postgres://..., ngược lại SQLite"""
+    if is_postgres_url(Config.DATABASE_URL):
+        return PostgresRepository(Config.AUDIT_LOG_PARTITION)
+    if connections is None:
+        from sqlite_db import SQLiteConnections
+        connections = SQLiteConnections(
+            Config.SQLITE_DATABASE,
+            journal_mode=Config.SQLITE_JOURNAL_MODE,
+            synchronous=Config.SQLITE_SYNCHRONOUS,
+            mmap_size=Config.SQLITE_MMAP_SIZE,
+            cache_size=Config.SQLITE_CACHE_SIZE,
+            busy_timeout=Config.SQLITE_BUSY_TIMEOUT,
+            cached_statements=Config.SQLITE_CACHED_STATEMENTS
+        )
+    return SQLiteRepository(connections, Config.AUDIT_LOG_PARTITION)
+
+
+def get_repository():
+    """Repository dùng chung trong process (models.py, init_db.py)"""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = create_repository()
+    return _repository
+
+
+def set_repository(repository):
+    """app.py đăng ký repository của nó để models.py dùng chung kết nối/pool"""
+    global _repository
+    _repository = repository
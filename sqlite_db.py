@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteConnections:
+    """Giữ một kết nối SQLite lâu dài cho mỗi thread của mỗi worker.
+
+    Kết nối được cấu hình một lần (WAL, synchronous, mmap, cache, busy_timeout)
+    rồi dùng lại cho mọi request; sqlite3 tự cache các câu lệnh đã biên dịch
+    theo từng kết nối nên các query cố định chỉ phải prepare một lần.
+    """
+
+    def __init__(self, path, journal_mode='WAL', synchronous='NORMAL',
+                 mmap_size=0, cache_size=-2000, busy_timeout=5000,
+                 cached_statements=256, factory=sqlite3.Connection):
+        self.path = path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.opened = 0
+        self.reused = 0
+
+    def connect(self, check_same_thread=True):
+        """Mở một kết nối mới đã được cấu hình pragma"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=check_same_thread,
+            cached_statements=self.cached_statements,
+            factory=self.factory
+        )
+        conn.row_factory = sqlite3.Row
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        if self.mmap_size:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def get(self):
+        """Lấy kết nối của thread hiện tại, tạo mới nếu chưa có"""
+        if self._pid != os.getpid():
+            # Sau khi fork không được dùng lại kết nối của process cha
+            self.reset()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        else:
+            self.reused += 1
+        return conn
+
+    def release(self):
+        """Gọi cuối mỗi request: bỏ transaction dở dang nhưng giữ kết nối"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def reset(self):
+        """Bỏ kết nối của process hiện tại (dùng sau fork)"""
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self.opened = 0
+        self.reused = 0
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'opened': self.opened,
+            'reused': self.reused,
+            'journal_mode': self.journal_mode,
+            'synchronous': self.synchronous
+        }
@@ -0,0 +1,95 @@
+"""Phục vụ asset đã build bởi build_assets.py.
+
+Chọn bản .br / .gz / gốc theo Accept-Encoding, trả bằng send_file (gunicorn
+dùng os.sendfile qua wsgi.file_wrapper, không chép file qua Python). File
+đã fingerprint (/assets/<tên>.<hash>.<ext>) được cache immutable một năm;
+URL cố định (/, /style.css, /script.js) trả no-cache + ETag theo hash để
+trình duyệt hỏi lại và nhận 304.
+
+Chưa build, hoặc file nguồn mới hơn bản build (đang sửa khi dev), thì phục
+vụ thẳng file nguồn như trước.
+"""
+import json
+import mimetypes
+import os
+
+from flask import send_file
+
+from build_assets import ASSET_SOURCES, BASE_DIR, MANIFEST, build_dir
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class StaticAssets:
+    def __init__(self, directory=None):
+        self.directory = directory or build_dir()
+        self.files = {}
+        self._fingerprinted = {}
+        self.load()
+
+    def load(self):
+        """Đọc manifest; bỏ bản build nếu thiếu hoặc cũ hơn file nguồn"""
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            with open(path) as f:
+                files = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            files = {}
+        if files:
+            built_at = os.path.getmtime(path)
+            sources = {name: os.path.join(BASE_DIR, name) for name in files}
+            stale = [
+                name for name, source in sources.items()
+                if os.path.isfile(source) and os.path.getmtime(source) > built_at
+            ]
+            if stale:
+                print(f"⚠️  Asset build cũ hơn {', '.join(stale)}, phục vụ file nguồn (chạy lại build_assets.py)")
+                files = {}
+        self.files = files
+        self._fingerprinted = {entry['file']: name for name, entry in files.items()}
+        return bool(files)
+
+    def send(self, name, accept_encodings):
+        """Asset theo tên gốc (URL cố định); None nếu không có"""
+        if name not in ASSET_SOURCES:
+            return None
+        entry = self.files.get(name)
+        if entry is None:
+            path = os.path.join(BASE_DIR, name)
+            if not os.path.isfile(path):
+                return None
+            response = send_file(path, conditional=True, max_age=0)
+            response.headers['Cache-Control'] = REVALIDATE
+            return response
+        return self._send_built(name, entry, accept_encodings, REVALIDATE)
+
+    def send_fingerprinted(self, filename, accept_encodings):
+        """Asset theo tên đã fingerprint (/assets/...); None nếu không có"""
+        name = self._fingerprinted.get(filename)
+        if name is None:
+            return None
+        return self._send_built(name, self.files[name], accept_encodings, IMMUTABLE)
+
+    def _send_built(self, name, entry, accept_encodings, cache_control):
+        path = os.path.join(self.directory, entry['file'])
+        encoding = next((e for e in entry['encodings'] if accept_encodings[e]), None)
+        etag = entry['hash']
+        if encoding is not None:
+            path += _SUFFIXES[encoding]
+            etag = f'{etag}-{encoding}'
+        response = send_file(
+            path, mimetype=mimetypes.guess_type(name)[0], conditional=True, etag=etag
+        )
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'built': sorted(self.files)
+        }
@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Module của app nằm phẳng ở thư mục gốc repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py đọc Config lúc import: DB, shared memory và key của phiên test nằm trong thư mục tạm.
+# Đặt trước khi module test nào import config.
+TEST_DIR = tempfile.mkdtemp(prefix='license-admin-tests-')
+os.environ.update({
+    'FLASK_ENV': 'development',
+    'SQLITE_DATABASE': os.path.join(TEST_DIR, 'licenses.db'),
+    'DATA_VERSION_SHM_PATH': os.path.join(TEST_DIR, 'data-version'),
+    'RATE_LIMIT_ENABLED': '0',
+    'RATE_LIMIT_SQLITE_PATH': os.path.join(TEST_DIR, 'ratelimit.db'),
+    'LICENSE_TOKEN_KEY_FILE': os.path.join(TEST_DIR, 'license_token_key.pem'),
+    'ASSET_BUILD_DIR': os.path.join(TEST_DIR, 'static_build'),
+    # Argon2 rẻ cho test đăng nhập
+    'ARGON2_TIME_COST': '1',
+    'ARGON2_MEMORY_COST': '1024',
+    'ARGON2_PARALLELISM': '1',
+})
+
+
+def pytest_sessionfinish(session):
+    app = sys.modules.get('app')
+    if app is not None:
+        app.last_check_writer.close()
+        app.audit_log.close()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def api_key(app_module):
+    return app_module.create_api_key_record('Test key')
+
+
+@pytest.fixture
+def make_license(client, api_key):
+    """Tạo license qua API admin, trả về license_key"""
+    def make(days_valid=30, note='test'):
+        response = client.post(
+            '/api/admin/licenses/create', json={'days_valid': days_valid, 'note': note},
+            headers={'X-API-Key': api_key}
+        )
+        assert response.status_code == 200
+        return response.get_json()['license_key']
+    return make
@@ -0,0 +1,43 @@
+"""Đăng nhập admin: mỗi lần login một API key riêng, khóa tạm theo (IP, username) khi sai nhiều lần"""
+from api_key_index import hash_api_key
+
+
+def login(client, password='admin123', ip='127.0.0.1'):
+    return client.post(
+        '/api/admin/login', json={'username': 'admin', 'password': password},
+        environ_base={'REMOTE_ADDR': ip}
+    )
+
+
+def can_list(client, api_key):
+    return client.get('/api/admin/apikeys', headers={'X-API-Key': api_key}).status_code == 200
+
+
+def test_each_login_gets_its_own_key(client):
+    first = login(client, ip='10.0.1.1').get_json()['api_key']
+    second = login(client, ip='10.0.1.2').get_json()['api_key']
+    assert first != second
+    assert can_list(client, first)
+    assert can_list(client, second)
+
+
+def test_old_login_keys_are_pruned_on_next_login(app_module, client):
+    old = login(client, ip='10.0.2.1').get_json()['api_key']
+    with app_module.repository.transaction() as conn:
+        conn.execute(
+            "UPDATE api_keys SET created_at = '2000-01-01 00:00:00' WHERE key = ?", (hash_api_key(old),)
+        )
+    new = login(client, ip='10.0.2.1').get_json()['api_key']
+    assert not can_list(client, old)
+    assert can_list(client, new)
+
+
+def test_lockout_after_repeated_failures_is_per_ip(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.login_guard, 'max_failures', 3)
+    for _ in range(3):
+        assert login(client, 'wrong', ip='10.0.3.1').status_code == 401
+    response = login(client, ip='10.0.3.1')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    # IP khác vẫn đăng nhập được với cùng username
+    assert login(client, ip='10.0.3.2').status_code == 200
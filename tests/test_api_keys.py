@@ -0,0 +1,88 @@
+"""API key: chỉ lưu digest, bảng trong bộ nhớ nạp lại khi api_keys đổi ở worker khác"""
+import threading
+
+import api_key_index
+from api_key_index import APIKeyIndex, generate_api_key, hash_api_key, mask_api_key
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_created_key_works_at_once_and_is_stored_hashed(app_module, client, api_key):
+    response = client.post('/api/admin/apikeys/create', json={'name': 'CI'}, headers={'X-API-Key': api_key})
+    new_key = response.get_json()['api_key']
+    assert client.get('/api/admin/apikeys', headers={'X-API-Key': new_key}).status_code == 200
+
+    with app_module.repository.connection() as conn:
+        stored = [row['key'] for row in conn.execute("SELECT key FROM api_keys WHERE name = 'CI'")]
+    assert hash_api_key(new_key) in stored
+    assert new_key not in stored
+    listed = client.get('/api/admin/apikeys', headers={'X-API-Key': new_key}).get_json()['api_keys']
+    assert new_key not in str(listed)
+
+
+def test_unknown_key_is_rejected(client):
+    assert client.get('/api/admin/apikeys', headers={'X-API-Key': 'sk_' + '0' * 32}).status_code == 401
+
+
+def test_index_follows_changes_made_by_another_worker(app_module, monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(api_key_index, 'time', clock)
+    repo = app_module.repository
+    index = APIKeyIndex(check_interval=2)
+    key = generate_api_key()
+    assert index.lookup(repo, key) is None
+
+    repo.insert_api_key(hash_api_key(key), mask_api_key(key), 'Other worker')
+    clock.now += 0.5
+    assert index.lookup(repo, key) is None  # digest lạ: kiểm tra lại tối đa mỗi giây
+    clock.now += 1
+    assert index.lookup(repo, key).name == 'Other worker'
+
+    # Thu hồi ở worker khác: trigger tăng api_keys_generation, có hiệu lực sau check_interval
+    with repo.transaction() as conn:
+        conn.execute("UPDATE api_keys SET status = 'revoked' WHERE key = ?", (hash_api_key(key),))
+    assert index.lookup(repo, key) is not None
+    clock.now += 2
+    assert index.lookup(repo, key) is None
+    assert index.stats()['reloads'] == 3
+
+
+class SlowRepository:
+    """Lần nạp bảng API key bị chặn cho tới khi test cho phép"""
+
+    def __init__(self, api_key):
+        self.rows = [{'key': hash_api_key(api_key), 'id': 1, 'name': 'Login', 'permissions': 'all'}]
+        self.loading = threading.Event()
+        self.release = threading.Event()
+
+    def api_keys_generation(self):
+        return 1
+
+    def load_active_api_keys(self):
+        self.loading.set()
+        self.release.wait(5)
+        return self.rows
+
+
+def test_lookup_waits_for_a_reload_in_progress():
+    key = generate_api_key()
+    repo = SlowRepository(key)
+    index = APIKeyIndex(check_interval=60)
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault('first', index.lookup(repo, key)))
+    first.start()
+    assert repo.loading.wait(5)
+    # Thread thứ hai thấy lần nạp vừa bắt đầu (_checked_at mới) nhưng bảng chưa có key
+    second = threading.Thread(target=lambda: results.setdefault('second', index.lookup(repo, key)))
+    second.start()
+    second.join(0.2)
+    repo.release.set()
+    first.join(5)
+    second.join(5)
+    assert results['first'].name == results['second'].name == 'Login'
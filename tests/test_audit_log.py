@@ -0,0 +1,44 @@
+"""Audit log ghi qua hàng đợi: request không chờ DB, writer ghi theo lô"""
+from audit_log import AuditLog
+
+
+def test_flush_writes_in_batches_and_drops_when_full():
+    batches = []
+    log = AuditLog(batches.append, batch_size=2, max_queue=3)
+    log._ensure_thread = lambda: None  # không chạy thread writer: test tự gọi flush()
+    assert log.record_many('LICENSE_LOCK', ['LIC-1', 'LIC-2', 'LIC-3', 'LIC-4']) is True
+    assert log.record('LICENSE_RESET', license_key='LIC-5') is False
+    assert log.stats()['dropped'] == {'LICENSE_LOCK': 1, 'LICENSE_RESET': 1}
+
+    assert log.flush() == 3
+    assert [[row[2] for row in batch] for batch in batches] == [['LIC-1', 'LIC-2'], ['LIC-3']]
+    assert log.stats()['pending'] == 0
+
+
+def test_failed_write_keeps_rows_queued():
+    calls = []
+
+    def write(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise RuntimeError('database is locked')
+
+    log = AuditLog(write)
+    log._ensure_thread = lambda: None
+    log.record('LICENSE_LOCK', license_key='LIC-1')
+    assert log.flush() == 0
+    assert log.stats()['pending'] == 1 and log.failures == 1
+    assert log.flush() == 1
+    assert calls == [1, 1]
+
+
+def test_admin_actions_appear_in_activity_after_flush(app_module, client, api_key, make_license):
+    license_key = make_license()
+    client.post('/api/admin/licenses/lock', json={'license_key': license_key, 'reason': 'audit test'},
+                headers={'X-API-Key': api_key})
+    app_module.audit_log.flush()
+
+    logs = client.get('/api/admin/activity?limit=50', headers={'X-API-Key': api_key}).get_json()['logs']
+    actions = [log['action'] for log in logs if log['license_key'] == license_key]
+    assert actions[:2] == ['LICENSE_LOCK', 'LICENSE_CREATE']
+    assert app_module.audit_log.stats()['pending'] == 0
@@ -0,0 +1,27 @@
+"""benchmark.py chạy trọn một vòng ngắn với --requests (Flask test client, DB riêng)"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_benchmark_smoke_run(tmp_path):
+    env = dict(
+        os.environ,
+        DATA_VERSION_SHM_PATH=str(tmp_path / 'data-version'),
+        RATE_LIMIT_SQLITE_PATH=str(tmp_path / 'rate-limit.db'),
+        LICENSE_TOKEN_KEY_FILE=str(tmp_path / 'token-key.pem'),
+    )
+    output = tmp_path / 'result.json'
+    subprocess.run(
+        [sys.executable, 'benchmark.py', '--db', str(tmp_path / 'bench.db'), '--licenses', '200',
+         '--requests', '20', '--concurrency', '2', '--sample', '50', '--output', str(output)],
+        cwd=ROOT, env=env, check=True, capture_output=True, timeout=300
+    )
+    result = json.loads(output.read_text())
+    assert result['config']['requests'] == 20
+    assert set(result['results']) == {'validate', 'check', 'admin_licenses', 'admin_stats'}
+    for endpoint, stats in result['results'].items():
+        assert (endpoint, stats['requests'], stats['errors']) == (endpoint, 20, 0)
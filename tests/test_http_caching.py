@@ -0,0 +1,86 @@
+"""ETag / 304 cho danh sách license, thống kê, API key và nén response theo Accept-Encoding"""
+import gzip
+
+import pytest
+
+from config import Config
+
+
+@pytest.fixture(autouse=True)
+def long_etag_windows(monkeypatch):
+    # ETag licenses / stats còn gắn với khung thời gian: test không được chạy qua ranh giới khung
+    monkeypatch.setattr(Config, 'LICENSE_ETAG_WINDOW', 10 ** 9)
+    monkeypatch.setattr(Config, 'STATS_ETAG_WINDOW', 10 ** 9)
+
+
+@pytest.mark.parametrize('path', ['/api/admin/licenses', '/api/admin/stats', '/api/admin/apikeys'])
+def test_unchanged_data_is_not_modified(client, api_key, path):
+    headers = {'X-API-Key': api_key}
+    first = client.get(path, headers=headers)
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    cached = client.get(path, headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+    assert cached.headers['ETag'] == etag
+
+
+def test_admin_change_gives_a_new_etag(client, api_key, make_license):
+    headers = {'X-API-Key': api_key}
+    for path, change in (
+        ('/api/admin/licenses', make_license),
+        ('/api/admin/stats', make_license),
+        ('/api/admin/apikeys', lambda: client.post('/api/admin/apikeys/create', json={'name': 'ETag'}, headers=headers)),
+    ):
+        etag = client.get(path, headers=headers).headers['ETag']
+        change()
+        response = client.get(path, headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+
+def test_large_json_is_gzipped(client, api_key, make_license, monkeypatch):
+    monkeypatch.setattr(Config, 'COMPRESS_MIN_SIZE', 1)
+    make_license()
+    headers = {'X-API-Key': api_key}
+    plain = client.get('/api/admin/licenses', headers=headers)
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    zipped = client.get('/api/admin/licenses', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()) == plain.get_data()
+    assert zipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    # ETag của bản nén cũng được nhận trong If-None-Match
+    cached = client.get('/api/admin/licenses', headers={
+        **headers, 'Accept-Encoding': 'gzip', 'If-None-Match': zipped.headers['ETag']
+    })
+    assert cached.status_code == 304
+
+
+def test_small_body_is_not_compressed(client, monkeypatch):
+    monkeypatch.setattr(Config, 'COMPRESS_MIN_SIZE', 10 ** 6)
+    response = client.post('/api/client/validate', json={}, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_ndjson_export_is_compressed_per_chunk(client, api_key, make_license):
+    make_license()
+    headers = {'X-API-Key': api_key}
+    plain = client.get('/api/admin/licenses?format=ndjson', headers=headers).get_data()
+    zipped = client.get('/api/admin/licenses?format=ndjson', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in zipped.headers
+    assert gzip.decompress(zipped.get_data()) == plain
+
+
+def test_brotli_is_preferred_when_installed(client, api_key, monkeypatch):
+    brotli = pytest.importorskip('brotli')
+    monkeypatch.setattr(Config, 'COMPRESS_MIN_SIZE', 1)
+    headers = {'X-API-Key': api_key}
+    plain = client.get('/api/admin/licenses', headers=headers).get_data()
+    response = client.get('/api/admin/licenses', headers={**headers, 'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.get_data()) == plain
@@ -0,0 +1,50 @@
+"""JSON của API đi qua json_codec (orjson nếu có): jsonify, request.json và bytes encode sẵn"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import jsonify, request
+
+import json_codec
+
+
+@pytest.mark.skipif(json_codec.BACKEND != 'orjson', reason='orjson chưa cài')
+def test_orjson_backend_is_used(app_module, client, api_key):
+    info = client.get('/api/admin/debug', headers={'X-API-Key': api_key}).get_json()
+    assert info['json_backend'] == 'orjson'
+    assert isinstance(app_module.app.json, json_codec.FastJSONProvider)
+
+
+def test_dumps_is_compact_and_keeps_flask_types():
+    payload = {'b': 1, 'a': 'Tiếng Việt', 'when': datetime(2026, 1, 2, 3, 4, 5), 'day': date(2026, 1, 2),
+               'price': Decimal('1.50'), 1: None}
+    encoded = json_codec.dumps(payload)
+    assert encoded.startswith('{"b":1,"a":"Tiếng Việt",'.encode('utf-8'))
+    # Như jsonify trước đây: datetime / date theo HTTP date, Decimal thành chuỗi
+    assert json.loads(encoded) == {
+        'b': 1, 'a': 'Tiếng Việt', 'when': 'Fri, 02 Jan 2026 03:04:05 GMT',
+        'day': 'Fri, 02 Jan 2026 00:00:00 GMT', 'price': '1.50', '1': None
+    }
+
+
+def test_jsonify_and_request_json_round_trip(app_module):
+    flask_app = app_module.app
+    with flask_app.test_request_context('/', method='POST', data='{"license_key":"LIC-Ä","n":[1,2]}',
+                                        content_type='application/json'):
+        assert request.json == {'license_key': 'LIC-Ä', 'n': [1, 2]}
+        response = jsonify(request.json)
+    assert response.mimetype == 'application/json'
+    assert response.get_data() == json_codec.dumps({'license_key': 'LIC-Ä', 'n': [1, 2]})
+    with flask_app.app_context():
+        assert jsonify(1, 2).get_json() == [1, 2]
+        assert jsonify(a=1).get_json() == {'a': 1}
+
+
+def test_prebuilt_validate_responses_decode(client):
+    response = client.post('/api/client/validate', json={'license_key': 'LIC-NOPE', 'hwid': 'HW'})
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {'valid': False, 'message': 'Invalid license key'}
+    assert client.post('/api/client/validate', json={}).get_json() == {
+        'valid': False, 'message': 'License key and HWID are required'
+    }
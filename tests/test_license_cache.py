@@ -0,0 +1,57 @@
+"""Cache license của /api/client/validate: thay đổi của admin có hiệu lực ngay, kể cả ở worker khác"""
+from data_version import DataVersion
+from license_cache import LicenseCache
+
+
+def validate(client, license_key, hwid='HW-1'):
+    return client.post('/api/client/validate', json={'license_key': license_key, 'hwid': hwid}).get_json()
+
+
+def admin(client, api_key, action, license_key):
+    return client.post(
+        f'/api/admin/licenses/{action}', json={'license_key': license_key}, headers={'X-API-Key': api_key}
+    )
+
+
+def test_lock_revoke_and_delete_take_effect_immediately(client, api_key, make_license):
+    for action in ('lock', 'revoke', 'delete'):
+        license_key = make_license()
+        assert validate(client, license_key)['valid']  # bind HWID
+        assert validate(client, license_key)['valid']  # đọc DB, đưa vào cache
+        assert admin(client, api_key, action, license_key).status_code == 200
+        assert validate(client, license_key) == {'valid': False, 'message': 'Invalid license key'}
+
+
+def test_reset_releases_cached_hwid(client, api_key, make_license):
+    license_key = make_license()
+    assert validate(client, license_key, 'HW-OLD')['message'] == 'License activated successfully'
+    assert not validate(client, license_key, 'HW-NEW')['valid']
+    admin(client, api_key, 'reset', license_key)
+    assert validate(client, license_key, 'HW-NEW')['message'] == 'License activated successfully'
+
+
+def test_change_from_another_worker_drops_cache(app_module, client, make_license):
+    license_key = make_license()
+    assert validate(client, license_key)['valid']
+    assert validate(client, license_key)['valid']
+
+    # Worker khác: ghi DB rồi bump bộ đếm trong shared memory (file mmap mở riêng)
+    app_module.repository.apply_license_action('lock', license_key)
+    assert validate(client, license_key)['valid']  # vẫn là bản cache
+    other_worker = DataVersion(app_module.data_version.path)
+    other_worker.bump('license_cache')
+    assert validate(client, license_key) == {'valid': False, 'message': 'Invalid license key'}
+
+
+def test_record_read_before_a_bump_is_not_cached():
+    version = [0]
+    cache = LicenseCache(version=lambda: version[0])
+    seen = cache.current_version()
+    version[0] += 1  # admin đổi dữ liệu trong lúc đang đọc DB
+    cache.put('LIC-A', 'stale', seen)
+    assert cache.get('LIC-A') is None
+    cache.put('LIC-A', 'fresh', cache.current_version())
+    assert cache.get('LIC-A') == 'fresh'
+    version[0] += 1
+    assert cache.get('LIC-A') is None
+    assert cache.stats()['resets'] == 1
@@ -0,0 +1,89 @@
+"""Định dạng thời gian của license trên API (giữ nguyên khi đổi sang epoch giây)"""
+from datetime import datetime
+
+from config import Config
+from license_record import (
+    STATUS_ACTIVE, STATUS_LOCKED, LicenseRecord, epoch_to_iso, epoch_to_utc_iso, legacy_zone,
+    license_row_dict, utc_iso_to_epoch
+)
+from migrations import legacy_epoch
+
+# 2026-01-02 03:04:05 UTC
+EPOCH = 1767323045
+
+
+def test_expires_at_keeps_naive_legacy_format():
+    # Như datetime.now() cũ lưu trong SQLite: không múi giờ, cách bằng dấu cách, micro giây
+    assert epoch_to_iso(EPOCH) == '2026-01-02 03:04:05.000000'
+    assert epoch_to_iso(EPOCH, 'T') == '2026-01-02T03:04:05.000000'
+    assert epoch_to_iso(None) is None
+
+
+def test_expires_at_follows_legacy_timezone(monkeypatch):
+    monkeypatch.setattr(Config, 'LEGACY_TIMEZONE', 'Asia/Ho_Chi_Minh')
+    legacy_zone.cache_clear()
+    epoch_to_iso.cache_clear()
+    try:
+        assert epoch_to_iso(EPOCH) == '2026-01-02 10:04:05.000000'
+    finally:
+        monkeypatch.undo()
+        legacy_zone.cache_clear()
+        epoch_to_iso.cache_clear()
+
+
+def test_created_at_keeps_current_timestamp_format():
+    assert epoch_to_utc_iso(EPOCH) == '2026-01-02 03:04:05'
+    assert utc_iso_to_epoch(epoch_to_utc_iso(EPOCH)) == EPOCH
+
+
+def test_license_row_dict_wire_format():
+    row = (7, 'LIC-A', 'HW', STATUS_LOCKED, EPOCH, EPOCH + 86400, EPOCH + 60, 'pc', 'note', 'bad')
+    assert license_row_dict(row) == {
+        'id': 7,
+        'license_key': 'LIC-A',
+        'hwid': 'HW',
+        'status': 'locked',
+        'created_at': '2026-01-02 03:04:05',
+        'expires_at': '2026-01-03 03:04:05.000000',
+        'last_check': '2026-01-02 03:05:05.000000',
+        'device_info': 'pc',
+        'note': 'note',
+        'is_locked': 1,
+        'lock_reason': 'bad'
+    }
+    assert LicenseRecord(*row).to_dict() == license_row_dict(row)
+
+
+def test_wire_format_does_not_depend_on_server_timezone(monkeypatch):
+    import time
+    monkeypatch.setenv('TZ', 'Asia/Ho_Chi_Minh')
+    time.tzset()
+    try:
+        epoch_to_iso.cache_clear()
+        row = (1, 'LIC-B', None, STATUS_ACTIVE, EPOCH, EPOCH, None, None, None, None)
+        assert license_row_dict(row)['expires_at'] == '2026-01-02 03:04:05.000000'
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+        epoch_to_iso.cache_clear()
+
+
+def test_legacy_epoch_uses_stated_zone():
+    assert legacy_epoch('2026-01-02 03:04:05', 'UTC') == EPOCH
+    assert legacy_epoch('2026-01-02T03:04:05.999999', 'UTC') == EPOCH
+    assert legacy_epoch('2026-01-02 10:04:05', 'Asia/Ho_Chi_Minh') == EPOCH
+    assert legacy_epoch(EPOCH, 'UTC') == EPOCH
+    assert legacy_epoch(None, 'UTC') is None
+    assert legacy_epoch('not a date', 'UTC') is None
+
+
+def test_client_can_compare_expires_at_with_naive_now(client, api_key):
+    created = client.post(
+        '/api/admin/licenses/create', json={'days_valid': 30}, headers={'X-API-Key': api_key}
+    ).get_json()
+    assert 'T' in created['expires_at']  # như isoformat() của endpoint tạo license trước đây
+    license_key = created['license_key']
+    for path in ('/api/client/validate', '/api/client/check'):
+        expires_at = client.post(path, json={'license_key': license_key, 'hwid': 'HW-TIME'}).get_json()['expires_at']
+        assert ' ' in expires_at
+        assert datetime.fromisoformat(expires_at) > datetime.now()
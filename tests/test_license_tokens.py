@@ -0,0 +1,51 @@
+"""Offline license token: tắt mặc định, khi bật thì ký Ed25519 và thu hồi qua /api/client/revocations"""
+import jwt
+import pytest
+
+from auth import verify_license_token
+from config import Config
+
+
+def validate(client, license_key, hwid='HW-TOKEN'):
+    return client.post(
+        '/api/client/validate', json={'license_key': license_key, 'hwid': hwid, 'token': True}
+    ).get_json()
+
+
+@pytest.fixture
+def tokens_enabled(monkeypatch):
+    monkeypatch.setattr(Config, 'LICENSE_TOKEN_TTL', 3600)
+
+
+def test_tokens_are_disabled_by_default(client, make_license):
+    assert Config.LICENSE_TOKEN_TTL == 0
+    assert 'token' not in validate(client, make_license())
+    assert client.get('/api/client/token_key').status_code == 404
+
+
+def test_token_verifies_with_published_key(client, make_license, tokens_enabled):
+    license_key = make_license()
+    result = validate(client, license_key)
+    claims = verify_license_token(result['token'])
+    assert (claims['sub'], claims['hwid'], claims['rv']) == (license_key, 'HW-TOKEN', result['revocation_version'])
+    assert claims['exp'] - claims['iat'] <= 3600
+
+    published = client.get('/api/client/token_key').get_json()
+    assert published['token_ttl'] == 3600
+    assert jwt.get_unverified_header(result['token'])['kid'] == published['kid']
+    assert jwt.decode(result['token'], published['public_key'], algorithms=['EdDSA'])['sub'] == license_key
+    assert verify_license_token(result['token'][:-4] + 'AAAA') is None
+
+
+def test_lock_and_reset_are_published_as_revocations(client, api_key, make_license, tokens_enabled):
+    license_key = make_license()
+    since = validate(client, license_key)['revocation_version']
+    for action in ('reset', 'lock'):
+        client.post(f'/api/admin/licenses/{action}', json={'license_key': license_key}, headers={'X-API-Key': api_key})
+
+    page = client.get(f'/api/client/revocations?since={since}').get_json()
+    versions = [version for key, version in page['revoked'] if key == license_key]
+    assert len(versions) == 2 and all(version > since for version in versions)
+    assert page['version'] >= max(versions)
+    assert client.get(f"/api/client/revocations?since={page['version']}").get_json()['revoked'] == []
+    assert client.get('/api/client/revocations?since=x').status_code == 400
@@ -0,0 +1,112 @@
+"""API admin cho license: danh sách phân trang theo cursor, tạo và thao tác hàng loạt"""
+import json
+import uuid
+
+
+def list_page(client, api_key, **params):
+    response = client.get('/api/admin/licenses', query_string=params, headers={'X-API-Key': api_key})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_cursor_walks_every_license_once(client, api_key, make_license):
+    note = f'page-{uuid.uuid4().hex}'
+    created = {make_license(note=note) for _ in range(7)}
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'q': note, 'limit': 3}
+        if cursor:
+            params['cursor'] = cursor
+        page = list_page(client, api_key, **params)
+        seen += [row['license_key'] for row in page['licenses']]
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert pages == 3
+    assert sorted(seen) == sorted(created)
+
+
+def test_invalid_cursor_and_limit_are_rejected(client, api_key):
+    headers = {'X-API-Key': api_key}
+    assert client.get('/api/admin/licenses?cursor=@@@', headers=headers).status_code == 400
+    assert client.get('/api/admin/licenses?limit=x', headers=headers).status_code == 400
+    assert client.get('/api/admin/licenses').status_code == 401
+
+
+def test_ndjson_export_streams_matching_rows(client, api_key, make_license):
+    note = f'export-{uuid.uuid4().hex}'
+    created = {make_license(note=note) for _ in range(3)}
+    response = client.get(
+        '/api/admin/licenses', query_string={'q': note, 'format': 'ndjson'}, headers={'X-API-Key': api_key}
+    )
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert {row['license_key'] for row in rows} == created
+
+
+def bulk_create(client, api_key, **body):
+    return client.post('/api/admin/licenses/bulk_create', json=body, headers={'X-API-Key': api_key})
+
+
+def test_bulk_create_streams_csv_of_inserted_keys(app_module, client, api_key):
+    note = f'bulk-{uuid.uuid4().hex}'
+    response = bulk_create(client, api_key, count=5, days_valid=10, note=note + '-{n}')
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'license_key,expires_at,note'
+    rows = [line.split(',') for line in lines[1:]]
+    assert sorted(row[2] for row in rows) == [f'{note}-{n}' for n in range(1, 6)]
+    stored = app_module.repository.get_licenses([row[0] for row in rows])
+    assert len(stored) == 5
+    assert {record.expires_at for record in stored.values()} == {stored[rows[0][0]].expires_at}
+
+
+def test_bulk_create_ndjson_and_validation(client, api_key):
+    response = bulk_create(client, api_key, count=3, format='ndjson')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len({row['license_key'] for row in rows}) == 3
+    assert bulk_create(client, api_key, count=0).status_code == 400
+    assert bulk_create(client, api_key, count=2, format='xml').status_code == 400
+
+
+def bulk_action(client, api_key, **body):
+    return client.post('/api/admin/licenses/bulk', json=body, headers={'X-API-Key': api_key})
+
+
+def test_bulk_action_by_keys_reports_each_key(app_module, client, api_key, make_license):
+    keys = [make_license(), make_license()]
+    response = bulk_action(client, api_key, action='lock', license_keys=keys + ['LIC-MISSING'], reason='abuse')
+    assert response.get_json() == {
+        'success': True,
+        'action': 'lock',
+        'affected': 2,
+        'results': {keys[0]: 'updated', keys[1]: 'updated', 'LIC-MISSING': 'not_found'}
+    }
+    for key in keys:
+        record = app_module.repository.get_license(key)
+        assert record.status_name == 'locked' and record.lock_reason == 'abuse'
+        validated = client.post('/api/client/validate', json={'license_key': key, 'hwid': 'HW'}).get_json()
+        assert not validated['valid']
+
+
+def test_bulk_action_by_filter(app_module, client, api_key, make_license):
+    note = f'filter-{uuid.uuid4().hex}'
+    keys = {make_license(note=note) for _ in range(3)}
+    response = bulk_action(client, api_key, action='delete', filter={'note': note})
+    assert response.get_json()['results'] == dict.fromkeys(keys, 'deleted')
+    assert app_module.repository.get_licenses(keys) == {}
+
+
+def test_bulk_action_limits_and_validation(app_module, client, api_key, make_license, monkeypatch):
+    note = f'limit-{uuid.uuid4().hex}'
+    keys = [make_license(note=note) for _ in range(2)]
+    monkeypatch.setattr(app_module.Config, 'BULK_OPERATION_MAX', 1)
+    response = bulk_action(client, api_key, action='revoke', filter={'note': note})
+    assert response.status_code == 400
+    assert {r.status_name for r in app_module.repository.get_licenses(keys).values()} == {'active'}
+
+    assert bulk_action(client, api_key, action='explode', license_keys=keys).status_code == 400
+    assert bulk_action(client, api_key, action='lock', license_keys='LIC-A').status_code == 400
+    assert bulk_action(client, api_key, action='lock', filter={'unknown': 1}).status_code == 400
+    assert bulk_action(client, api_key, action='lock').status_code == 400
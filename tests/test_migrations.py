@@ -0,0 +1,209 @@
+"""Nâng DB dạng gốc (schema của bản đầu tiên) lên schema mới nhất"""
+import os
+import sqlite3
+
+import pytest
+
+from license_record import STATUS_ACTIVE, STATUS_EXPIRED, STATUS_LOCKED, STATUS_REVOKED
+from migrations import POSTGRES_MIGRATIONS, SQLITE_MIGRATIONS
+from repository import SQLiteRepository
+from sqlite_db import SQLiteConnections
+
+# 2026-01-02 03:04:05 UTC
+EPOCH = 1767323045
+
+# Schema SQLite của bản đầu tiên (app.py init_db): status chuỗi, is_locked, TIMESTAMP dạng chuỗi
+BASELINE_SQLITE_SCHEMA = [
+    '''
+    CREATE TABLE licenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        license_key TEXT UNIQUE NOT NULL,
+        hwid TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        last_check TIMESTAMP,
+        device_info TEXT,
+        note TEXT,
+        is_locked INTEGER DEFAULT 0,
+        lock_reason TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE admin_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE api_keys (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        permissions TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+# (license_key, status, is_locked, expires_at, last_check, status mong đợi sau migration)
+BASELINE_LICENSES = [
+    ('LIC-ACTIVE', 'active', 0, '2026-01-02 03:04:05.000000', '2026-01-02 03:05:05', STATUS_ACTIVE),
+    ('LIC-LOCKFLAG', 'active', 1, '2026-01-02 03:04:05', None, STATUS_LOCKED),
+    ('LIC-LOCKED', 'locked', 0, '2026-01-02T03:04:05', None, STATUS_LOCKED),
+    ('LIC-REVOKED', 'revoked', 1, None, None, STATUS_REVOKED),
+    ('LIC-EXPIRED', 'expired', 0, '2025-12-31 00:00:00', None, STATUS_EXPIRED),
+    ('LIC-ODD', 'suspended', 0, '2026-01-02 03:04:05', None, STATUS_LOCKED),
+]
+
+
+def baseline_sqlite(path):
+    conn = sqlite3.connect(path)
+    for ddl in BASELINE_SQLITE_SCHEMA:
+        conn.execute(ddl)
+    conn.executemany(
+        "INSERT INTO licenses (license_key, status, is_locked, expires_at, last_check, created_at) "
+        "VALUES (?, ?, ?, ?, ?, '2026-01-02 03:04:05')",
+        [row[:5] for row in BASELINE_LICENSES]
+    )
+    conn.execute("INSERT INTO api_keys (key, name, permissions) VALUES ('sk_plaintext', 'Default API Key', 'all')")
+    conn.commit()
+    conn.close()
+
+
+def counters(conn):
+    return {row[0]: row[1] for row in conn.execute("SELECT name, value FROM license_counters")}
+
+
+def recount(conn):
+    return {
+        'total': conn.execute("SELECT COUNT(*) FROM licenses").fetchone()[0],
+        'active': conn.execute("SELECT COUNT(*) FROM licenses WHERE status = 0").fetchone()[0],
+        'locked': conn.execute("SELECT COUNT(*) FROM licenses WHERE status IN (1, 2)").fetchone()[0],
+        'expired': conn.execute("SELECT COUNT(*) FROM licenses WHERE status = 3").fetchone()[0],
+    }
+
+
+@pytest.fixture
+def migrated(tmp_path):
+    path = str(tmp_path / 'licenses.db')
+    baseline_sqlite(path)
+    repo = SQLiteRepository(SQLiteConnections(path))
+    repo.init_schema()
+    yield repo
+    repo.close()
+
+
+def test_baseline_sqlite_reaches_latest_version(migrated):
+    assert migrated.schema_version() == SQLITE_MIGRATIONS[-1][0]
+    conn = migrated.connections.get()
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(licenses)")]
+    assert 'is_locked' not in columns
+    assert conn.execute("SELECT COUNT(*) FROM licenses WHERE typeof(expires_at) = 'text'").fetchone()[0] == 0
+
+
+def test_baseline_licenses_keep_status_and_time(migrated):
+    conn = migrated.connections.get()
+    rows = {row['license_key']: row for row in conn.execute("SELECT * FROM licenses")}
+    assert {key: rows[key]['status'] for key, *_ in BASELINE_LICENSES} == {
+        key: expected for key, *_, expected in BASELINE_LICENSES
+    }
+    assert rows['LIC-ACTIVE']['created_at'] == EPOCH
+    assert rows['LIC-ACTIVE']['expires_at'] == EPOCH
+    assert rows['LIC-ACTIVE']['last_check'] == EPOCH + 60
+    assert rows['LIC-LOCKED']['expires_at'] == EPOCH
+    assert rows['LIC-REVOKED']['expires_at'] is None
+
+
+def test_counters_match_licenses_after_migration(migrated):
+    conn = migrated.connections.get()
+    assert counters(conn) == recount(conn) == {'total': 6, 'active': 1, 'locked': 4, 'expired': 1}
+
+
+def test_triggers_keep_counters_in_sync(migrated):
+    migrated.create_license('LIC-NEW', EPOCH, None)
+    migrated.apply_license_action('lock', 'LIC-ACTIVE', 'test')
+    migrated.apply_license_action('reset', 'LIC-LOCKED')
+    migrated.apply_license_action('delete', 'LIC-EXPIRED')
+    migrated.expire_licenses(EPOCH + 1, 100)
+    conn = migrated.connections.get()
+    assert counters(conn) == recount(conn)
+
+
+def test_plaintext_api_keys_are_hashed(migrated):
+    conn = migrated.connections.get()
+    row = conn.execute("SELECT key, key_masked FROM api_keys WHERE name = 'Default API Key'").fetchone()
+    assert row['key'] != 'sk_plaintext'
+    assert row['key_masked'] is not None
+
+
+def test_rerun_is_a_no_op(migrated):
+    conn = migrated.connections.get()
+    before = counters(conn)
+    migrated.init_schema()
+    assert migrated.schema_version() == SQLITE_MIGRATIONS[-1][0]
+    assert counters(conn) == before
+
+
+# PostgreSQL: chỉ chạy khi có TEST_DATABASE_URL (database rỗng, sẽ bị xóa schema public)
+BASELINE_POSTGRES_LICENSES = '''
+    CREATE TABLE licenses (
+        id SERIAL PRIMARY KEY,
+        license_key VARCHAR(255) UNIQUE NOT NULL,
+        hwid VARCHAR(255),
+        status VARCHAR(50) DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        last_check TIMESTAMP,
+        device_info TEXT,
+        note TEXT,
+        is_locked INTEGER DEFAULT 0,
+        lock_reason TEXT
+    )
+'''
+
+
+@pytest.fixture
+def postgres_url():
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL chưa được đặt')
+    psycopg = pytest.importorskip('psycopg')
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+        conn.execute(BASELINE_POSTGRES_LICENSES)
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO licenses (license_key, status, is_locked, expires_at, last_check, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, '2026-01-02 03:04:05')",
+                [row[:5] for row in BASELINE_LICENSES]
+            )
+    return url
+
+
+def test_baseline_postgres_reaches_latest_version(postgres_url, monkeypatch):
+    import psycopg
+    from config import Config
+    from repository import PostgresRepository
+    monkeypatch.setattr(Config, 'DATABASE_URL', postgres_url)
+    repo = PostgresRepository()
+    try:
+        repo.init_schema()
+        assert repo.schema_version() == POSTGRES_MIGRATIONS[-1][0]
+    finally:
+        repo.close()
+
+    with psycopg.connect(postgres_url) as conn:
+        rows = {row[0]: row[1:] for row in conn.execute(
+            "SELECT license_key, status, created_at, expires_at, last_check FROM licenses"
+        )}
+        assert rows['LIC-ACTIVE'] == (STATUS_ACTIVE, EPOCH, EPOCH, EPOCH + 60)
+        assert {key: rows[key][0] for key, *_ in BASELINE_LICENSES} == {
+            key: expected for key, *_, expected in BASELINE_LICENSES
+        }
+        assert dict(conn.execute("SELECT name, value FROM license_counters").fetchall()) == {
+            'total': 6, 'active': 1, 'locked': 4, 'expired': 1
+        }
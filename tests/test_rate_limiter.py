@@ -0,0 +1,86 @@
+"""Token bucket dùng chung: burst, nạp lại theo thời gian, chia sẻ giữa các process"""
+import pytest
+
+import rate_limiter
+from rate_limiter import SQLiteRateLimiter, SharedMemoryRateLimiter, client_ip
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['mmap', 'sqlite'])
+def make_limiter(request, tmp_path):
+    opened = []
+
+    def make():
+        if request.param == 'mmap':
+            limiter = SharedMemoryRateLimiter(str(tmp_path / 'ratelimit'), slots=64)
+        else:
+            limiter = SQLiteRateLimiter(str(tmp_path / 'ratelimit.db'))
+        opened.append(limiter)
+        return limiter
+
+    yield make
+    for limiter in opened:
+        limiter.close()
+
+
+def test_burst_then_refill(make_limiter, clock):
+    limiter = make_limiter()
+    assert [limiter.hit('ip:1', 2, 3)[0] for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit('ip:1', 2, 3) == (False, 1)
+    clock.now += 0.5  # nạp lại 1 token
+    assert limiter.hit('ip:1', 2, 3) == (True, 0)
+    assert not limiter.hit('ip:1', 2, 3)[0]
+    clock.now += 60  # đầy lại nhưng không vượt burst
+    assert [limiter.hit('ip:1', 2, 3)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_keys_have_separate_buckets(make_limiter, clock):
+    limiter = make_limiter()
+    assert limiter.hit('ip:1', 1, 1)[0]
+    assert not limiter.hit('ip:1', 1, 1)[0]
+    assert limiter.hit('ip:2', 1, 1)[0]
+
+
+def test_bucket_is_shared_through_the_file(make_limiter, clock):
+    # Hai instance mở cùng file = hai worker gunicorn
+    first, second = make_limiter(), make_limiter()
+    assert first.hit('license:A', 1, 2)[0]
+    assert second.hit('license:A', 1, 2)[0]
+    assert not first.hit('license:A', 1, 2)[0]
+    assert second.hit('license:A', 1, 2) == (False, 1)
+
+
+def test_full_group_evicts_least_recently_used(tmp_path, clock):
+    limiter = SharedMemoryRateLimiter(str(tmp_path / 'ratelimit'), slots=8)  # một nhóm 8 slot
+    try:
+        for i in range(8):
+            clock.now += 1
+            assert limiter.hit(f'ip:{i}', 0.001, 1)[0]
+        clock.now += 1
+        assert limiter.hit('ip:new', 0.001, 1)[0]  # đẩy ip:0 ra
+        assert limiter.hit('ip:0', 0.001, 1)[0]  # bucket mới, đầy
+        assert not limiter.hit('ip:7', 0.001, 1)[0]  # vẫn còn trong bảng
+    finally:
+        limiter.close()
+
+
+def test_client_ip_trusts_only_configured_hops():
+    assert client_ip('1.1.1.1, 10.0.0.1', '10.0.0.2', 0) == '10.0.0.2'
+    assert client_ip('1.1.1.1, 10.0.0.1', '10.0.0.2', 1) == '10.0.0.1'
+    assert client_ip('1.1.1.1, 10.0.0.1', '10.0.0.2', 2) == '1.1.1.1'
+    assert client_ip('1.1.1.1', '10.0.0.2', 5) == '1.1.1.1'
+    assert client_ip(None, '10.0.0.2', 1) == '10.0.0.2'
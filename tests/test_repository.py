@@ -0,0 +1,111 @@
+"""SQLiteRepository: phân trang keyset, lease, sweeper, gộp audit log theo partition"""
+from datetime import datetime
+
+import pytest
+
+from license_record import STATUS_ACTIVE, STATUS_EXPIRED, STATUS_LOCKED
+from repository import SQLiteRepository
+from sqlite_db import SQLiteConnections
+
+EPOCH = 1767323045
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = SQLiteRepository(SQLiteConnections(str(tmp_path / 'licenses.db')))
+    repo.init_schema()
+    yield repo
+    repo.close()
+
+
+def add_licenses(repo, rows):
+    """rows: [(license_key, created_at, status, expires_at)]"""
+    with repo.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO licenses (license_key, created_at, status, expires_at) VALUES (?, ?, ?, ?)", rows
+        )
+
+
+def all_pages(repo, filters, limit):
+    pages, after = [], None
+    while True:
+        page = repo.list_licenses(filters, after, limit)
+        if not page:
+            return pages
+        pages.append(page)
+        after = (page[-1][4], page[-1][0])
+
+
+def test_pagination_returns_every_row_once_with_created_at_ties(repo):
+    # 3 license mỗi giây: trang cắt ngang nhóm cùng created_at
+    add_licenses(repo, [(f'LIC-{i:02d}', EPOCH + i // 3, STATUS_ACTIVE, None) for i in range(20)])
+    pages = all_pages(repo, {}, 4)
+    rows = [row for page in pages for row in page]
+    assert [len(page) for page in pages] == [4, 4, 4, 4, 4]
+    assert sorted(row[1] for row in rows) == [f'LIC-{i:02d}' for i in range(20)]
+    assert [(row[4], row[0]) for row in rows] == sorted(((row[4], row[0]) for row in rows), reverse=True)
+
+
+def test_pagination_applies_filters(repo):
+    add_licenses(repo, [
+        (f'LIC-{i:02d}', EPOCH, STATUS_LOCKED if i % 2 else STATUS_ACTIVE, None) for i in range(9)
+    ])
+    locked = [row[1] for page in all_pages(repo, {'status': 'locked'}, 2) for row in page]
+    assert sorted(locked) == ['LIC-01', 'LIC-03', 'LIC-05', 'LIC-07']
+    assert repo.list_licenses({'status': 'bogus'}) == []
+    assert [row[1] for row in repo.list_licenses({'q': 'LIC-0_'})] == []
+
+
+def test_lease_has_one_holder_until_it_expires(repo):
+    assert repo.acquire_lease('sweeper', 'a', 30, EPOCH)
+    assert not repo.acquire_lease('sweeper', 'b', 30, EPOCH + 10)
+    assert repo.acquire_lease('sweeper', 'a', 30, EPOCH + 10)  # gia hạn
+    assert repo.acquire_lease('sweeper', 'b', 30, EPOCH + 41)  # a hết hạn
+    repo.release_lease('sweeper', 'a')  # không còn giữ -> không xóa lease của b
+    assert not repo.acquire_lease('sweeper', 'a', 30, EPOCH + 42)
+    repo.release_lease('sweeper', 'b')
+    assert repo.acquire_lease('sweeper', 'a', 30, EPOCH + 42)
+
+
+def test_expire_licenses_moves_overdue_active_in_batches(repo):
+    add_licenses(repo, [
+        ('LIC-OLD-1', EPOCH, STATUS_ACTIVE, EPOCH - 10),
+        ('LIC-OLD-2', EPOCH, STATUS_ACTIVE, EPOCH),
+        ('LIC-LOCKED', EPOCH, STATUS_LOCKED, EPOCH - 10),
+        ('LIC-LATER', EPOCH, STATUS_ACTIVE, EPOCH + 10),
+    ])
+    assert repo.expire_licenses(EPOCH, 1) == ['LIC-OLD-1']
+    assert repo.expire_licenses(EPOCH, 10) == ['LIC-OLD-2']
+    assert repo.expire_licenses(EPOCH, 10) == []
+    assert repo.get_license('LIC-OLD-2').status == STATUS_EXPIRED
+    assert repo.get_license('LIC-LOCKED').status == STATUS_LOCKED
+
+    stats = repo.license_stats(EPOCH, EPOCH + 86400, EPOCH + 7 * 86400, EPOCH + 30 * 86400)
+    assert stats['total_licenses'] == 4
+    assert stats['active_licenses'] == 1
+    assert stats['expired_licenses'] == 3  # 2 đã chuyển + LIC-LOCKED quá hạn
+    assert stats['expiring_licenses'] == {'1d': 1, '7d': 1, '30d': 1}
+
+
+def test_closed_partitions_are_rolled_up_once_and_dropped(repo):
+    repo.insert_activity_logs([
+        ('2026-01-05 10:00:00.000000', None, 'LIC-A', 'validate', None, '1.1.1.1'),
+        ('2026-01-05 11:00:00.000000', None, 'LIC-A', 'validate', None, '1.1.1.1'),
+        ('2026-01-06 09:00:00.000000', None, None, 'login', None, '1.1.1.1'),
+        ('2026-03-01 09:00:00.000000', None, 'LIC-B', 'validate', None, '1.1.1.1'),
+    ])
+    assert repo.partitions.periods()[:2] == ['202603', '202601']
+    assert [log['performed_at'] for log in repo.recent_activity(limit=2)] == [
+        '2026-03-01 09:00:00.000000', '2026-01-06 09:00:00.000000'
+    ]
+
+    now = datetime(2026, 3, 15)
+    result = repo.maintain_activity_logs(retention_days=30, rollup_retention_days=0, now=now)
+    assert result['rolled_up'] == ['202601']
+    assert result['dropped'] == ['202601']
+    assert repo.daily_activity('2026-01-01') == [
+        {'day': '2026-01-06', 'license_key': '', 'action': 'login', 'events': 1},
+        {'day': '2026-01-05', 'license_key': 'LIC-A', 'action': 'validate', 'events': 2},
+    ]
+    assert repo.maintain_activity_logs(retention_days=30, rollup_retention_days=0, now=now)['rolled_up'] == []
+    assert [log['license_key'] for log in repo.recent_activity()] == ['LIC-B']
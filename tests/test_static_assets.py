@@ -0,0 +1,48 @@
+"""Asset build sẵn: URL cố định no-cache + ETag, URL fingerprint cache immutable, bản nén sẵn"""
+import gzip
+import shutil
+
+import pytest
+
+import build_assets
+
+
+@pytest.fixture
+def built(app_module):
+    files = build_assets.build(app_module.static_assets.directory)
+    app_module.static_assets.load()
+    yield files
+    shutil.rmtree(app_module.static_assets.directory, ignore_errors=True)
+    app_module.static_assets.load()
+
+
+def test_index_revalidates_with_etag(client, built):
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['ETag'] == f'"{built["admin.html"]["hash"]}"'
+    assert client.get('/', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_fingerprinted_assets_are_immutable(client, built):
+    for url in (f"/assets/{entry['file']}" for entry in built.values()):
+        plain = client.get(url)
+        assert plain.status_code == 200
+        assert plain.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+        assert 'Accept-Encoding' in plain.headers['Vary']
+        zipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert zipped.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(zipped.get_data()) == plain.get_data()
+        plain.close()
+        zipped.close()
+
+
+def test_unknown_asset_is_404(client, built):
+    assert client.get('/assets/script.000000000000.js').status_code == 404
+    assert client.get('/assets/manifest.json').status_code == 404
+
+
+def test_source_files_are_served_without_a_build(client):
+    response = client.get('/style.css')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    response.close()
@@ -0,0 +1,82 @@
+"""/api/client/validate_batch cho cùng kết quả (và audit) như gọi /validate lần lượt"""
+import time
+
+import pytest
+
+
+def unbound(app_module, client, api_key, license_key):
+    return [(license_key, 'HW-A')]
+
+
+def bound_match(app_module, client, api_key, license_key):
+    app_module.repository.activate_license(license_key, 'HW-A', '', int(time.time()))
+    return [(license_key, 'HW-A')]
+
+
+def mismatch(app_module, client, api_key, license_key):
+    app_module.repository.activate_license(license_key, 'HW-A', '', int(time.time()))
+    return [(license_key, 'HW-B')]
+
+
+def locked(app_module, client, api_key, license_key):
+    client.post('/api/admin/licenses/lock', json={'license_key': license_key}, headers={'X-API-Key': api_key})
+    return [(license_key, 'HW-A')]
+
+
+def expired(app_module, client, api_key, license_key):
+    # Quá hạn nhưng expiry_sweeper chưa chuyển sang 'expired'
+    with app_module.repository.transaction() as conn:
+        conn.execute("UPDATE licenses SET expires_at = ? WHERE license_key = ?", (int(time.time()) - 60, license_key))
+    app_module.license_cache.invalidate(license_key)
+    return [(license_key, 'HW-A')]
+
+
+def unknown(app_module, client, api_key, license_key):
+    return [(license_key + '-UNKNOWN', 'HW-A')]
+
+
+def duplicates(app_module, client, api_key, license_key):
+    return [(license_key, 'HW-A'), (license_key, 'HW-B'), (license_key, 'HW-A')]
+
+
+def bound_elsewhere(app_module, client, api_key, license_key):
+    # Cache giữ bản chưa bind trong khi worker khác đã bind license trong DB
+    stale = app_module.repository.get_license(license_key)
+    app_module.repository.activate_license(license_key, 'HW-OTHER', '', int(time.time()))
+    app_module.license_cache.put(license_key, stale, app_module.license_cache.current_version())
+    return [(license_key, 'HW-A'), (license_key, 'HW-OTHER')]
+
+
+def run_single(client, items):
+    return [
+        client.post('/api/client/validate', json={'license_key': key, 'hwid': hwid}).get_json()
+        for key, hwid in items
+    ]
+
+
+def run_batch(client, items):
+    response = client.post('/api/client/validate_batch', json=[[key, hwid] for key, hwid in items])
+    return response.get_json()['results']
+
+
+@pytest.mark.parametrize('scenario', [
+    unbound, bound_match, mismatch, locked, expired, unknown, duplicates, bound_elsewhere
+])
+def test_batch_matches_single_validate(app_module, client, api_key, make_license, monkeypatch, scenario):
+    audits = []
+    monkeypatch.setattr(
+        app_module, 'audit_validate',
+        lambda outcome, license_key, ip_address, details=None: audits.append((outcome, details))
+    )
+    outcomes = {}
+    for name, run in (('single', run_single), ('batch', run_batch)):
+        items = scenario(app_module, client, api_key, make_license())
+        audits.clear()
+        outcomes[name] = (run(client, items), list(audits))
+    assert outcomes['single'][1]  # mỗi phần tử đều được ghi audit
+    assert outcomes['batch'] == outcomes['single']
+
+
+def test_bound_elsewhere_answers_from_the_database(app_module, client, api_key, make_license):
+    items = bound_elsewhere(app_module, client, api_key, make_license())
+    assert [result['valid'] for result in run_batch(client, items)] == [False, True]